@@ -0,0 +1,556 @@
+"""
+End-to-end throughput benchmark for batch_analyze_websites, fully offline.
+
+A synthetic corpus is served from a local HTTP server:
+
+    static   server-rendered article pages
+    spa      empty SPA shells that render their content with JavaScript
+    lazy     pages that load more content with fetch() after a delay
+    large    multi-MB server-rendered pages
+
+The batch runs against either real headless Chrome or a stub driver that
+returns the pre-rendered version of each page (so the Python side of the
+pipeline can be measured without a browser):
+
+    python benchmarks/run_benchmarks.py --driver stub --output bench.json
+    python benchmarks/run_benchmarks.py --driver both --baseline bench.json
+
+The report shows URLs/sec, per-stage p50/p99 latency (from result["timings"])
+and peak RSS. Each driver mode runs in its own interpreter. Its peak is split into
+the fixture corpus held before the batch and the analyzer's share above it,
+plus the summed peak of the browser processes (chromedriver and Chrome). With --baseline, every metric is compared against a previous
+--output file and the script exits with status 1 when one regressed by more
+than --tolerance.
+
+CLI startup is measured as well (--startup-repeats, 0 to skip): the median
+wall time of fresh interpreters importing selenium_test, printing the CLI help
+and running a static-only analysis, plus a check that none of them had to load
+Selenium.
+"""
+import argparse
+import contextlib
+import http.server
+import io
+import json
+import math
+import os
+import resource
+import socketserver
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import selenium_test as analyzer
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "selenium_test.py")
+
+PARAGRAPH = ("<p>Benchmark paragraph with enough ordinary words to look like real "
+             "article text for the content comparison.</p>")
+
+SPA_SCRIPT = """
+window.React = {version: "bench"};
+document.getElementById("root").innerHTML =
+    "<h1>Rendered app</h1>" + new Array(80).join("<p>Client rendered paragraph text.</p>");
+"""
+
+LAZY_SCRIPT = """
+setTimeout(function () {
+    fetch("/api/items").then(function (r) { return r.json(); }).then(function (items) {
+        var list = document.getElementById("feed");
+        items.forEach(function (item) {
+            var li = document.createElement("li");
+            li.textContent = item;
+            list.appendChild(li);
+        });
+    });
+}, 300);
+"""
+
+API_ITEMS = [f"Lazy loaded item number {i} with some descriptive text" for i in range(60)]
+
+def build_corpus(pages_per_kind=20, large_mb=3):
+    """Return {path: {"html", "rendered", "content_type"}} for the fixture server and stub driver."""
+    corpus = {
+        "/static/app.js": {"html": SPA_SCRIPT, "rendered": None, "content_type": "application/javascript"},
+        "/static/lazy.js": {"html": LAZY_SCRIPT, "rendered": None, "content_type": "application/javascript"},
+        "/api/items": {"html": json.dumps(API_ITEMS), "rendered": None, "content_type": "application/json"}
+    }
+
+    large_paragraphs = PARAGRAPH * max(1, int(large_mb * 1024 * 1024 / len(PARAGRAPH)))
+    lazy_items = "".join(f"<li>{item}</li>" for item in API_ITEMS)
+
+    for i in range(pages_per_kind):
+        static = (f"<html><head><title>Article {i}</title></head><body><h1>Article {i}</h1>"
+                  + PARAGRAPH * 40 + "</body></html>")
+        corpus[f"/pages/static/{i}"] = {"html": static, "rendered": static}
+
+        shell = ('<html><head><title>App</title></head><body><div id="root"></div>'
+                 '<script src="/static/app.js"></script></body></html>')
+        rendered = ('<html><head><title>App</title></head><body><div id="root"><h1>Rendered app</h1>'
+                    + "<p>Client rendered paragraph text.</p>" * 79
+                    + '</div><script src="/static/app.js"></script></body></html>')
+        corpus[f"/pages/spa/{i}"] = {"html": shell, "rendered": rendered}
+
+        lazy = (f"<html><head><title>Feed {i}</title></head><body><h1>Feed</h1>" + PARAGRAPH * 5
+                + '<ul id="feed"></ul><script src="/static/lazy.js"></script></body></html>')
+        corpus[f"/pages/lazy/{i}"] = {"html": lazy, "rendered": lazy.replace('<ul id="feed"></ul>',
+                                                                               f'<ul id="feed">{lazy_items}</ul>')}
+
+        large = (f"<html><head><title>Large {i}</title></head><body><h1>Large page</h1>"
+                 + large_paragraphs + "</body></html>")
+        corpus[f"/pages/large/{i}"] = {"html": large, "rendered": large}
+    return corpus
+
+def serve_corpus(corpus):
+    """Serve the corpus on 127.0.0.1 from a background thread. Returns (server, base_url)."""
+    encoded = {path: (page["html"].encode("utf-8"), page.get("content_type", "text/html; charset=utf-8"))
+               for path, page in corpus.items()}
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            page = encoded.get(self.path.split("?", 1)[0])
+            if page is None:
+                self.send_response(404)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            body, content_type = page
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+class StubDriver:
+    """
+    Stand-in for a Chrome WebDriver: get() "renders" a page by looking up its
+    pre-rendered HTML after render_ms, and scripts report a settled page.
+    """
+
+    def __init__(self, corpus, render_ms=50):
+        self.corpus = corpus
+        self.render_ms = render_ms
+        self.page_source = "<html></html>"
+        self.current_url = "about:blank"
+        self._frameworks = {}
+
+    def get(self, url):
+        self.current_url = url
+        if url == "about:blank":
+            self.page_source = "<html></html>"
+            self._frameworks = {}
+            return
+        time.sleep(self.render_ms / 1000)
+        path = "/" + url.split("://", 1)[-1].split("/", 1)[-1]
+        page = self.corpus.get(path.split("?", 1)[0])
+        self.page_source = page["rendered"] if page and page["rendered"] else "<html><body></body></html>"
+        self._frameworks = {"React": True} if "/pages/spa/" in path else {}
+
+    def execute_script(self, script, *args):
+        if "document.readyState" in script:
+            return "complete"
+        if "__sdaQuiescence" in script and "Date.now() - state.last" in script:
+            return [0, 60000]
+        if "var detected = {}" in script:
+            return {"detected": dict(self._frameworks), "errors": {}}
+        return None
+
+    def execute_cdp_cmd(self, command, params):
+        return {}
+
+    def delete_all_cookies(self):
+        pass
+
+    def quit(self):
+        pass
+
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+def process_rss_mb(pid):
+    """Current RSS of one process in MB, or None when neither psutil nor /proc is available."""
+    if psutil is not None:
+        try:
+            return psutil.Process(pid).memory_info().rss / (1024 * 1024)
+        except psutil.Error:
+            return None
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        return None
+
+def descendant_pids(pid):
+    """PIDs of every live descendant of pid (chromedriver and the Chrome processes under it)."""
+    if psutil is not None:
+        try:
+            return [child.pid for child in psutil.Process(pid).children(recursive=True)]
+        except psutil.Error:
+            return []
+    children = {}
+    if os.path.isdir("/proc"):
+        for entry in os.listdir("/proc"):
+            if not entry.isdigit():
+                continue
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    parent = int(f.read().rsplit(")", 1)[1].split()[1])
+            except (OSError, ValueError, IndexError):
+                continue
+            children.setdefault(parent, []).append(int(entry))
+    found, stack = [], [pid]
+    while stack:
+        for child in children.get(stack.pop(), []):
+            found.append(child)
+            stack.append(child)
+    return found
+
+class RssSampler:
+    """
+    Samples the RSS of this process and the summed RSS of its descendants in a background thread.
+
+    ru_maxrss only knows the lifetime peak of this process, and RUSAGE_CHILDREN only covers reaped
+    children, so Chrome processes under a live chromedriver never show up there.
+    """
+
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.peak_mb = None
+        self.children_peak_mb = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def sample(self):
+        pid = os.getpid()
+        own = process_rss_mb(pid)
+        if own is None:
+            return
+        children = sum(process_rss_mb(child) or 0 for child in descendant_pids(pid))
+        self.peak_mb = max(self.peak_mb or 0, own)
+        self.children_peak_mb = max(self.children_peak_mb or 0, children)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def __enter__(self):
+        self.sample()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.sample()
+
+def rounded(value):
+    return None if value is None else round(value, 1)
+
+def run_benchmark(urls, driver_mode, corpus, workers=4, engine="threads", render_ms=50,
+                  analysis_options=None):
+    """Run one batch and return its report."""
+    if driver_mode == "stub":
+        pool = analyzer.DriverPool(max_size=workers, driver_factory=lambda: StubDriver(corpus, render_ms))
+    else:
+        pool = analyzer.DriverPool(max_size=workers,
+                                   performance_log=bool((analysis_options or {}).get("block_resources")))
+
+    # Whatever the process holds before the batch (interpreter, imports, the fixture corpus and its
+    # server) is not the analyzer's memory; the peak above it is
+    fixture_mb = process_rss_mb(os.getpid())
+    started = time.perf_counter()
+    with RssSampler() as sampler:
+        try:
+            # The batch prints a line per URL; keep the benchmark output readable
+            with contextlib.redirect_stdout(io.StringIO()):
+                results = analyzer.batch_analyze_websites(
+                    urls, max_workers=workers, driver_pool=pool, engine=engine,
+                    progress_callback=lambda *args: None, analysis_options=analysis_options
+                )
+        finally:
+            pool.close()
+    elapsed = time.perf_counter() - started
+    # Without psutil or /proc, fall back to the lifetime peak (per mode, since each mode runs in its
+    # own process)
+    peak_mb = sampler.peak_mb if sampler.peak_mb is not None else peak_rss_mb()
+
+    stage_times = {}
+    for result in results:
+        timings = result.get("timings") or {}
+        for stage, ms in timings.items():
+            stage_times.setdefault(stage, []).append(ms)
+        if timings:
+            stage_times.setdefault("total", []).append(sum(timings.values()))
+
+    return {
+        "driver": driver_mode,
+        "engine": engine,
+        "urls": len(urls),
+        "errors": sum(1 for result in results if result.get("error")),
+        "elapsed_s": round(elapsed, 3),
+        "urls_per_sec": round(len(urls) / elapsed, 3) if elapsed else 0,
+        "stages": {stage: {"p50_ms": round(percentile(values, 0.5), 3),
+                           "p99_ms": round(percentile(values, 0.99), 3),
+                           "count": len(values)}
+                   for stage, values in sorted(stage_times.items())},
+        "peak_rss_mb": round(peak_mb, 1),
+        "fixture_rss_mb": rounded(fixture_mb),
+        "analyzer_rss_mb": rounded(None if fixture_mb is None else max(0.0, peak_mb - fixture_mb)),
+        "browser_peak_rss_mb": rounded(sampler.children_peak_mb)
+    }
+
+def compare_to_baseline(report, baseline, tolerance=0.15, min_delta_ms=1.0):
+    """Return a list of regression messages for report against a baseline report of the same driver."""
+    regressions = []
+
+    if baseline["urls_per_sec"] and report["urls_per_sec"] < baseline["urls_per_sec"] * (1 - tolerance):
+        regressions.append(f"urls_per_sec {baseline['urls_per_sec']} -> {report['urls_per_sec']}")
+
+    for stage, before in baseline.get("stages", {}).items():
+        after = report["stages"].get(stage)
+        if after is None:
+            continue
+        for key in ("p50_ms", "p99_ms"):
+            # Sub-millisecond stages are too noisy for a relative comparison
+            if after[key] - before[key] >= min_delta_ms and after[key] > before[key] * (1 + tolerance):
+                regressions.append(f"{stage} {key} {before[key]} -> {after[key]}")
+
+    # The fixture corpus scales with --large-mb, so compare the analyzer's share when both runs have it
+    memory_keys = ["analyzer_rss_mb" if report.get("analyzer_rss_mb") is not None
+                   and baseline.get("analyzer_rss_mb") is not None else "peak_rss_mb", "browser_peak_rss_mb"]
+    for key in memory_keys:
+        before, after = baseline.get(key), report.get(key)
+        # A few MB either way is allocator noise
+        if before is not None and after is not None and after - before >= 5 and after > before * (1 + tolerance):
+            regressions.append(f"{key} {before} -> {after}")
+    return regressions
+
+def measure_startup(static_urls, repeats=5):
+    """Time fresh interpreters running the CLI entry points and return the startup report."""
+    with tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False) as f:
+        f.write("\n".join(static_urls) + "\n")
+        url_file = f.name
+
+    package_dir = os.path.dirname(SCRIPT)
+    commands = {
+        "interpreter": [sys.executable, "-c", "pass"],
+        "import": [sys.executable, "-c", "import selenium_test"],
+        "cli_help": [sys.executable, SCRIPT, "--help"],
+        "static_cli": [sys.executable, SCRIPT, "static", url_file, "--workers", "4"]
+    }
+    probe = ("import sys, runpy; sys.argv = {argv!r}; "
+             "sys.stdout = open(__import__('os').devnull, 'w')\n"
+             "try:\n    runpy.run_path({script!r}, run_name='__main__')\n"
+             "except SystemExit:\n    pass\n"
+             "sys.__stdout__.write(str('selenium' in sys.modules))")
+
+    try:
+        timings = {}
+        for name, command in commands.items():
+            samples = []
+            for _ in range(repeats):
+                started = time.perf_counter()
+                subprocess.run(command, cwd=package_dir, stdout=subprocess.DEVNULL,
+                               stderr=subprocess.DEVNULL, check=False)
+                samples.append((time.perf_counter() - started) * 1000)
+            timings[name] = {"median_ms": round(statistics.median(samples), 1),
+                             "min_ms": round(min(samples), 1)}
+
+        argv = [SCRIPT, "static", url_file, "--workers", "4"]
+        loaded = subprocess.run([sys.executable, "-c", probe.format(argv=argv, script=SCRIPT)],
+                                cwd=package_dir, capture_output=True, text=True)
+        selenium_loaded = loaded.stdout.strip().endswith("True")
+    finally:
+        os.unlink(url_file)
+
+    return {"driver": "startup", "repeats": repeats, "commands": timings, "selenium_loaded": selenium_loaded}
+
+def compare_startup(report, baseline, tolerance=0.15, min_delta_ms=20.0):
+    """Return a list of regression messages for a startup report against a baseline startup report."""
+    regressions = []
+    for name, before in baseline["commands"].items():
+        after = report["commands"].get(name)
+        if after is None:
+            continue
+        # Process start-up jitters by tens of milliseconds on a loaded machine
+        if (after["median_ms"] - before["median_ms"] >= min_delta_ms
+                and after["median_ms"] > before["median_ms"] * (1 + tolerance)):
+            regressions.append(f"{name} median_ms {before['median_ms']} -> {after['median_ms']}")
+    if report["selenium_loaded"] and not baseline["selenium_loaded"]:
+        regressions.append("static CLI run now imports selenium")
+    return regressions
+
+def print_startup_report(report):
+    print(f"\n🚀 CLI startup (median of {report['repeats']} runs)")
+    print(f"{'command':<22} {'median ms':>10} {'min ms':>10}")
+    for name, row in report["commands"].items():
+        print(f"{name:<22} {row['median_ms']:10.1f} {row['min_ms']:10.1f}")
+    print(f"Selenium loaded by a static run: {'yes ⚠️' if report['selenium_loaded'] else 'no'}")
+
+def print_report(report):
+    print(f"\n📊 {report['driver'].upper()} driver, {report['engine']} engine: "
+          f"{report['urls']} URLs in {report['elapsed_s']:.2f}s "
+          f"({report['urls_per_sec']:.2f} URLs/sec, {report['errors']} errors)")
+    memory = f"💾 Peak RSS: {report['peak_rss_mb']:.1f} MB"
+    if report.get("analyzer_rss_mb") is not None:
+        memory += f" ({report['fixture_rss_mb']:.1f} MB fixtures + {report['analyzer_rss_mb']:.1f} MB analyzer)"
+    if report.get("browser_peak_rss_mb") is not None:
+        memory += f", browser processes: {report['browser_peak_rss_mb']:.1f} MB"
+    print(memory)
+    print(f"{'stage':<22} {'p50 ms':>10} {'p99 ms':>10} {'count':>7}")
+    for stage, row in report["stages"].items():
+        print(f"{stage:<22} {row['p50_ms']:10.2f} {row['p99_ms']:10.2f} {row['count']:7d}")
+
+def run_isolated(args, driver_mode):
+    """
+    Run one driver mode in a fresh interpreter and return its report.
+
+    Each mode gets its own process so its peak RSS is not the high-water mark left by the previous
+    mode or by building the other modes' fixtures.
+    """
+    with tempfile.NamedTemporaryFile(suffix='.json', delete=False) as f:
+        report_path = f.name
+
+    command = [sys.executable, os.path.abspath(__file__), '--report-to', report_path,
+               '--driver', driver_mode, '--engine', args.engine, '--workers', str(args.workers),
+               '--pages-per-kind', str(args.pages_per_kind), '--large-mb', str(args.large_mb),
+               '--render-ms', str(args.render_ms), '--wait-strategy', args.wait_strategy,
+               '--wait-time', str(args.wait_time), '--similarity', args.similarity,
+               '--similarity-max-chars', str(args.similarity_max_chars)]
+    if args.tiered:
+        command.append('--tiered')
+    if args.max_bytes is not None:
+        command += ['--max-bytes', str(args.max_bytes)]
+    if args.block_resources:
+        command += ['--block-resources', args.block_resources]
+
+    try:
+        subprocess.run(command, check=True)
+        with open(report_path) as f:
+            return json.load(f)
+    finally:
+        os.unlink(report_path)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--driver', choices=['stub', 'chrome', 'both'], default='stub',
+                        help='Browser stage backend (default: stub)')
+    parser.add_argument('--engine', choices=['threads', 'pipeline', 'hosts'], default='threads',
+                        help='batch_analyze_websites engine')
+    parser.add_argument('--workers', type=int, default=4, help='Browser workers / pool size')
+    parser.add_argument('--pages-per-kind', type=int, default=20,
+                        help='Pages of each kind (static, spa, lazy, large) in the corpus')
+    parser.add_argument('--large-mb', type=float, default=3, help='Size of the large pages in MB')
+    parser.add_argument('--render-ms', type=int, default=50, help='Simulated render time of the stub driver')
+    parser.add_argument('--wait-strategy', choices=['fixed', 'adaptive'], default='adaptive')
+    parser.add_argument('--wait-time', type=float, default=2, help='wait_time passed to analyze_website')
+    parser.add_argument('--tiered', action='store_true', help='Run with tiered=True')
+    parser.add_argument('--similarity', default='sequence', choices=list(analyzer.SIMILARITY_BACKENDS),
+                        help='Text similarity backend')
+    parser.add_argument('--similarity-max-chars', type=int, default=20000,
+                        help='Similarity size bound (0 = unbounded; the unbounded "sequence" '
+                             'backend takes minutes on the large pages)')
+    parser.add_argument('--max-bytes', type=int, default=None,
+                        help='Bounded mode: cap the HTTP body and rendered page size')
+    parser.add_argument('--block-resources', choices=list(analyzer.BLOCKING_PROFILES),
+                        help='Resource-blocking profile for the browser stage')
+    parser.add_argument('--output', help='Write the reports to this JSON file')
+    parser.add_argument('--baseline', help='Compare against reports from a previous --output file')
+    parser.add_argument('--tolerance', type=float, default=0.15,
+                        help='Allowed relative regression against the baseline (default: 0.15)')
+    parser.add_argument('--startup-repeats', type=int, default=5,
+                        help='Runs per CLI startup measurement (0 = skip, default: 5)')
+    # Internal: run a single driver mode and write its report here (see run_isolated)
+    parser.add_argument('--report-to', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.report_to:
+        corpus = build_corpus(args.pages_per_kind, args.large_mb)
+        server, base_url = serve_corpus(corpus)
+        urls = [base_url + path for path in corpus if path.startswith("/pages/")]
+        analysis_options = {"wait_strategy": args.wait_strategy, "wait_time": args.wait_time,
+                            "tiered": args.tiered, "similarity": args.similarity,
+                            "similarity_max_chars": args.similarity_max_chars or None,
+                            "block_resources": args.block_resources, "max_bytes": args.max_bytes}
+        try:
+            report = run_benchmark(urls, args.driver, corpus, workers=args.workers, engine=args.engine,
+                                   render_ms=args.render_ms, analysis_options=analysis_options)
+        finally:
+            server.shutdown()
+        with open(args.report_to, 'w') as f:
+            json.dump(report, f)
+        return 0
+
+    drivers = ['stub', 'chrome'] if args.driver == 'both' else [args.driver]
+    reports = []
+    for driver_mode in drivers:
+        report = run_isolated(args, driver_mode)
+        print_report(report)
+        reports.append(report)
+    if args.startup_repeats > 0:
+        # Only the first few static pages are needed here
+        corpus = build_corpus(min(args.pages_per_kind, 4), 0)
+        server, base_url = serve_corpus(corpus)
+        try:
+            static_urls = [base_url + path for path in corpus if path.startswith("/pages/static/")][:4]
+            report = measure_startup(static_urls, args.startup_repeats)
+        finally:
+            server.shutdown()
+        print_startup_report(report)
+        reports.append(report)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(reports, f, indent=2)
+        print(f"\n💾 Reports saved to: {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baselines = {report["driver"]: report for report in json.load(f)}
+        regressed = False
+        for report in reports:
+            baseline = baselines.get(report["driver"])
+            if baseline is None:
+                continue
+            compare = compare_startup if report["driver"] == "startup" else compare_to_baseline
+            regressions = compare(report, baseline, args.tolerance)
+            if regressions:
+                regressed = True
+                print(f"\n⚠️  {report['driver']} regressions vs baseline:")
+                for regression in regressions:
+                    print(f"   • {regression}")
+            else:
+                print(f"\n✅ {report['driver']}: no regressions vs baseline")
+        return 1 if regressed else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,184 @@
+"""
+Compare the single-pass SignatureScanner against the per-pattern regexes it replaced.
+
+The baseline is the original analyze_html_indicators regexes plus the text
+fallback of detect_js_frameworks, i.e. the work the static stage used to do
+on every page. Both are run on large synthetic pages:
+
+    article      server-rendered article text
+    attributes   attribute-heavy inline markup
+    listing      tens of thousands of <div> rows
+    bundle       SPA shell with a multi-MB inline script on one line
+    anchors      one common anchor word repeated ("app app app ...")
+    lines        an anchor on every line without its partner word
+    backtrack    a long line that makes the old lazy.*load pattern backtrack
+
+    python benchmarks/signature_benchmark.py --size-mb 3 --repeats 5
+
+For every page the report shows the median time of both sides and checks that
+they find the same indicators and frameworks. The script exits with status 1
+on a mismatch, or when the scanner is slower than the baseline by more than
+--tolerance on any page except "backtrack" (whose baseline is sized down to
+finish at all).
+"""
+import argparse
+import os
+import re
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import selenium_test as analyzer
+
+BASELINE_SPA_PATTERNS = [
+    r'<div[^>]*id=["\']root["\']',
+    r'<div[^>]*id=["\']app["\']',
+    r'<div[^>]*id=["\']main["\']',
+    r'<div[^>]*class=["\'][^"\']*app[^"\']*["\']'
+]
+
+BASELINE_AJAX_PATTERNS = [
+    r'\.fetch\s*\(',
+    r'XMLHttpRequest',
+    r'axios\.',
+    r'jquery.*ajax',
+    r'api/.*endpoint'
+]
+
+BASELINE_FRAMEWORK_PATTERNS = {
+    'React': [r'react', r'reactdom', r'jsx', r'data-reactroot'],
+    'Angular': [r'angular', r'@angular', r'ng-app', r'app-root'],
+    'Vue': [r'vue\.js', r'vuejs', r'v-if', r'v-for'],
+    'jQuery': [r'jquery', r'\$\('],
+    'Next.js': [r'next\.js', r'_next'],
+    'Nuxt': [r'nuxt', r'__nuxt'],
+    'Svelte': [r'svelte'],
+    'Ember': [r'ember']
+}
+
+def baseline_indicators(html):
+    """The analyze_html_indicators regexes from before the single-pass scanner."""
+    indicators = []
+    html_lower = html.lower()
+
+    for pattern in BASELINE_SPA_PATTERNS:
+        if re.search(pattern, html_lower):
+            indicators.append("SPA root element detected")
+            break
+
+    if any(term in html_lower for term in ['loading...', 'please wait', 'spinner', 'skeleton']):
+        indicators.append("Loading indicators found")
+
+    for pattern in BASELINE_AJAX_PATTERNS:
+        if re.search(pattern, html_lower):
+            indicators.append("AJAX/API calls detected")
+            break
+
+    if re.search(r'data-src|lazy.*load|intersection.*observer', html_lower):
+        indicators.append("Lazy loading detected")
+
+    if re.search(r'virtual.*scroll|infinite.*scroll', html_lower):
+        indicators.append("Virtual/infinite scrolling detected")
+
+    return set(indicators)
+
+def baseline_frameworks(html):
+    """The text fallback of detect_js_frameworks from before the single-pass scanner."""
+    frameworks = set()
+    html_lower = html.lower()
+    for framework, patterns in BASELINE_FRAMEWORK_PATTERNS.items():
+        for pattern in patterns:
+            if re.search(pattern, html_lower):
+                frameworks.add(framework)
+                break
+    return frameworks
+
+def baseline_scan(html):
+    return baseline_indicators(html), baseline_frameworks(html)
+
+def scanner_scan(html):
+    scan = analyzer.scan_page_signatures(html)
+    return set(scan["indicators"]), set(scan["frameworks"])
+
+def _repeat_to(unit, size):
+    return unit * max(1, size // len(unit))
+
+def build_pages(size_mb=2.5, backtrack_kb=64):
+    """Return {name: html} for the benchmark pages."""
+    size = int(size_mb * 1024 * 1024)
+    paragraph = ("<p>Ordinary article paragraph with words about applications, lazy afternoons "
+                 "and the loading docks down by the river.</p>\n")
+    rows = "".join(f'<div class="row item-{i % 97}" data-id="{i}" data-kind="card">'
+                   f'<a href="/item/{i}" title="Item {i}">Item {i}</a></div>\n' for i in range(200))
+    spans = "".join(f'<span class="wrapper c{i}" data-x="{i}" data-y=\'{i}\' title="t{i}">x</span>'
+                    for i in range(200)) + "\n"
+    bundle_code = ("function c(e){return e.map(function(t){return t.id+1})}var a=document.createElement('div');"
+                   "a.setAttribute('data-state','ready');window.__state={items:[],page:1};")
+    return {
+        "article": "<html><body>" + _repeat_to(paragraph, size) + "</body></html>",
+        "attributes": "<html><body>" + _repeat_to(spans, size) + "</body></html>",
+        "listing": "<html><body>" + _repeat_to(rows, size) + "</body></html>",
+        "bundle": ('<html><body><div id="root"></div><script>' + _repeat_to(bundle_code, size)
+                   + "</script></body></html>"),
+        "anchors": _repeat_to("app ", size),
+        "lines": _repeat_to("<li>lazy item</li>\n", size),
+        "backtrack": "<script>" + _repeat_to("lazy ", backtrack_kb * 1024) + "</script>"
+    }
+
+def time_median(func, html, repeats):
+    samples = []
+    value = None
+    for _ in range(repeats):
+        started = time.perf_counter()
+        value = func(html)
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples), value
+
+def run_benchmark(pages, repeats=3):
+    """Time both sides on every page and return per-page rows."""
+    rows = {}
+    for name, html in pages.items():
+        baseline_ms, expected = time_median(baseline_scan, html, repeats)
+        scanner_ms, actual = time_median(scanner_scan, html, repeats)
+        rows[name] = {
+            "bytes": len(html),
+            "baseline_ms": baseline_ms,
+            "scanner_ms": scanner_ms,
+            "ratio": scanner_ms / baseline_ms if baseline_ms else 0,
+            "matches": expected == actual
+        }
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size-mb', type=float, default=2.5, help='Size of the large pages in MB')
+    parser.add_argument('--backtrack-kb', type=int, default=64,
+                        help='Size of the backtracking page in KB (the baseline is quadratic on it)')
+    parser.add_argument('--repeats', type=int, default=3, help='Runs per page and side (median is reported)')
+    parser.add_argument('--tolerance', type=float, default=0.15,
+                        help='Allowed relative slowdown of the scanner (default: 0.15)')
+    args = parser.parse_args()
+
+    rows = run_benchmark(build_pages(args.size_mb, args.backtrack_kb), args.repeats)
+
+    print(f"\n📊 SIGNATURE SCAN BENCHMARK (median of {args.repeats} runs)")
+    print("=" * 80)
+    print(f"{'page':<12} {'MB':>6} {'baseline ms':>12} {'scanner ms':>11} {'ratio':>7} {'match':>6}")
+    failed = False
+    for name, row in rows.items():
+        regressed = name != "backtrack" and row["ratio"] > 1 + args.tolerance
+        failed = failed or regressed or not row["matches"]
+        print(f"{name:<12} {row['bytes'] / (1024 * 1024):6.2f} {row['baseline_ms']:12.1f} "
+              f"{row['scanner_ms']:11.1f} {row['ratio']:6.2f}x {'yes' if row['matches'] else 'NO':>6}"
+              f"{'  ⚠️ slower' if regressed else ''}")
+
+    if failed:
+        print("\n❌ Scanner regressed or disagreed with the baseline patterns")
+        return 1
+    print("\n✅ Scanner matches the baseline patterns and is not slower")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
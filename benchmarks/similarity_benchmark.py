@@ -0,0 +1,151 @@
+"""
+Compare the text similarity backends against the original difflib ratio.
+
+Page pairs are the requests HTML and the rendered (Selenium) HTML of the same
+page. They are read from a directory of saved pairs:
+
+    <name>.requests.html
+    <name>.selenium.html
+
+or fetched live from a URL list (Chrome required) and optionally saved for
+later runs:
+
+    python benchmarks/similarity_benchmark.py --pairs-dir pairs/
+    python benchmarks/similarity_benchmark.py --urls websites.txt --save-pairs pairs/
+
+For every backend the report shows the mean/max absolute error against the
+unbounded "sequence" ratio, how often it agrees with it on the 30% text
+difference threshold used by calculate_selenium_need_score, and its timing.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bs4 import BeautifulSoup
+
+import selenium_test as analyzer
+
+DIFF_THRESHOLD = 0.3
+
+def load_pairs(pairs_dir):
+    """Load (name, requests_html, selenium_html) tuples from a pairs directory."""
+    pairs = []
+    for filename in sorted(os.listdir(pairs_dir)):
+        if not filename.endswith('.requests.html'):
+            continue
+        name = filename[:-len('.requests.html')]
+        selenium_path = os.path.join(pairs_dir, name + '.selenium.html')
+        if not os.path.isfile(selenium_path):
+            continue
+        with open(os.path.join(pairs_dir, filename), encoding='utf-8') as f:
+            requests_html = f.read()
+        with open(selenium_path, encoding='utf-8') as f:
+            selenium_html = f.read()
+        pairs.append((name, requests_html, selenium_html))
+    return pairs
+
+def fetch_pairs(url_file, wait_time=8, save_dir=None):
+    """Fetch live page pairs for every URL in url_file."""
+    import re
+
+    with open(url_file) as f:
+        urls = [line.strip() for line in f if line.strip()]
+
+    pairs = []
+    driver = analyzer.launch_chrome_driver()
+    try:
+        for url in urls:
+            if not url.startswith(('http://', 'https://')):
+                url = 'https://' + url
+            try:
+                response = analyzer.requests.get(url, timeout=15, headers=analyzer.DEFAULT_HEADERS)
+                response.raise_for_status()
+                driver.get(url)
+                time.sleep(wait_time)
+                name = re.sub(r'[^a-zA-Z0-9]+', '_', url.split('://', 1)[1]).strip('_')
+                pairs.append((name, response.text, driver.page_source))
+                print(f"📥 {url}")
+            except Exception as e:
+                print(f"❌ {url} - {e}")
+    finally:
+        driver.quit()
+
+    if save_dir:
+        os.makedirs(save_dir, exist_ok=True)
+        for name, requests_html, selenium_html in pairs:
+            with open(os.path.join(save_dir, name + '.requests.html'), 'w', encoding='utf-8') as f:
+                f.write(requests_html)
+            with open(os.path.join(save_dir, name + '.selenium.html'), 'w', encoding='utf-8') as f:
+                f.write(selenium_html)
+    return pairs
+
+def run_benchmark(pairs, backends, max_chars=None):
+    """Score every pair with every backend and return per-backend statistics."""
+    texts = []
+    for name, requests_html, selenium_html in pairs:
+        requests_text = analyzer.extract_meaningful_content(BeautifulSoup(requests_html, 'html.parser'))
+        selenium_text = analyzer.extract_meaningful_content(BeautifulSoup(selenium_html, 'html.parser'))
+        texts.append((name, requests_text, selenium_text))
+
+    reference = {}
+    for name, requests_text, selenium_text in texts:
+        reference[name] = analyzer.text_similarity(requests_text, selenium_text, "sequence")
+
+    stats = {}
+    for backend in backends:
+        errors = []
+        agreements = 0
+        timings = []
+        for name, requests_text, selenium_text in texts:
+            started = time.perf_counter()
+            value = analyzer.text_similarity(requests_text, selenium_text, backend, max_chars)
+            timings.append(time.perf_counter() - started)
+            errors.append(abs(value - reference[name]))
+            if (1 - value > DIFF_THRESHOLD) == (1 - reference[name] > DIFF_THRESHOLD):
+                agreements += 1
+        stats[backend] = {
+            "mean_abs_error": sum(errors) / len(errors),
+            "max_abs_error": max(errors),
+            "threshold_agreement": agreements / len(texts),
+            "mean_ms": sum(timings) / len(timings) * 1000,
+            "max_ms": max(timings) * 1000
+        }
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--pairs-dir', help='Directory of saved <name>.requests.html/<name>.selenium.html pairs')
+    source.add_argument('--urls', help='File with one URL per line to fetch live (needs Chrome)')
+    parser.add_argument('--save-pairs', help='Directory to save live-fetched pairs to')
+    parser.add_argument('--max-chars', type=int, default=None,
+                        help='Size bound passed to every backend (default: unbounded)')
+    parser.add_argument('--backends', default=','.join(analyzer.SIMILARITY_BACKENDS),
+                        help='Comma-separated backends to compare')
+    args = parser.parse_args()
+
+    if args.pairs_dir:
+        pairs = load_pairs(args.pairs_dir)
+    else:
+        pairs = fetch_pairs(args.urls, save_dir=args.save_pairs)
+
+    if not pairs:
+        print("❌ No page pairs found!")
+        return 1
+
+    backends = [backend.strip() for backend in args.backends.split(',') if backend.strip()]
+    stats = run_benchmark(pairs, backends, args.max_chars)
+
+    print(f"\n📊 SIMILARITY BENCHMARK ({len(pairs)} page pairs, max_chars={args.max_chars})")
+    print("=" * 80)
+    print(f"{'backend':<10} {'mean err':>9} {'max err':>9} {'agree@0.3':>10} {'mean ms':>9} {'max ms':>9}")
+    for backend, row in stats.items():
+        print(f"{backend:<10} {row['mean_abs_error']:9.3f} {row['max_abs_error']:9.3f} "
+              f"{row['threshold_agreement']*100:9.1f}% {row['mean_ms']:9.2f} {row['max_ms']:9.2f}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,21 +1,246 @@
-import requests
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from bs4 import BeautifulSoup
+import sys
 import time
 import re
 import json
-from urllib.parse import urljoin, urlparse
+import threading
+import hashlib
+from urllib.parse import urljoin, urlparse, urlunparse, parse_qsl, urlencode
 import difflib
 
-def analyze_website(url, headless=True, wait_time=8):
+# Third-party modules are imported where they are used, so static-only and
+# cache-hit runs never load Selenium. The old module-level names still resolve
+# through __getattr__ (e.g. selenium_test.requests, selenium_test.webdriver).
+_LAZY_IMPORTS = {
+    "requests": ("requests", None),
+    "webdriver": ("selenium.webdriver", None),
+    "Options": ("selenium.webdriver.chrome.options", "Options"),
+    "By": ("selenium.webdriver.common.by", "By"),
+    "WebDriverWait": ("selenium.webdriver.support.ui", "WebDriverWait"),
+    "EC": ("selenium.webdriver.support.expected_conditions", None),
+    "TimeoutException": ("selenium.common.exceptions", "TimeoutException"),
+    "BeautifulSoup": ("bs4", "BeautifulSoup"),
+}
+
+def __getattr__(name):
+    if name not in _LAZY_IMPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    import importlib
+    
+    module_name, attribute = _LAZY_IMPORTS[name]
+    value = importlib.import_module(module_name)
+    if attribute is not None:
+        value = getattr(value, attribute)
+    globals()[name] = value
+    return value
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+
+# Callables invoked as hook(url, stage, seconds) whenever a timed stage finishes
+SPAN_HOOKS = []
+
+def register_span_hook(hook):
+    """Forward every stage timing to hook(url, stage, seconds), e.g. to a tracing system."""
+    SPAN_HOOKS.append(hook)
+    return hook
+
+def unregister_span_hook(hook):
+    if hook in SPAN_HOOKS:
+        SPAN_HOOKS.remove(hook)
+
+class TimedSpan:
+    """
+    Context manager that adds the time spent in a stage to timings[stage]
+    (milliseconds) and reports it to the registered span hooks.
+    """
+    
+    def __init__(self, timings, stage, url=None):
+        self.timings = timings
+        self.stage = stage
+        self.url = url
+    
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.started
+        self.timings[self.stage] = round(self.timings.get(self.stage, 0) + elapsed * 1000, 3)
+        for hook in list(SPAN_HOOKS):
+            try:
+                hook(self.url, self.stage, elapsed)
+            except Exception:
+                pass
+        return False
+
+# Shares of a per-URL time budget, in stage order. A stage gets its share of
+# whatever is left, so time an earlier stage did not use flows to later ones;
+# "processing" is kept back for parsing and scoring.
+TIME_BUDGET_SHARES = {
+    "http_fetch": 0.25,
+    "page_load": 0.35,
+    "ready_state": 0.1,
+    "dynamic_wait": 0.2,
+    "processing": 0.1
+}
+
+# Seconds past a URL's deadline before the watchdog kills its browser
+WATCHDOG_GRACE = 5
+
+class UrlTimeout(Exception):
+    """A per-URL time budget ran out in the given stage."""
+    
+    def __init__(self, stage):
+        super().__init__(f"Time budget exhausted during {stage}")
+        self.stage = stage
+
+class UrlDeadline:
+    """
+    Total time budget of one URL, split across the stages in TIME_BUDGET_SHARES.
+    
+    The clock can be paused while the URL only waits in a queue between the
+    static and the browser stage (run_pipeline), so queueing is not charged.
+    """
+    
+    def __init__(self, budget):
+        self.budget = budget
+        self.expires_at = time.monotonic() + budget
+        self._paused_at = None
+    
+    def remaining(self):
+        now = self._paused_at if self._paused_at is not None else time.monotonic()
+        return max(0.0, self.expires_at - now)
+    
+    def elapsed(self):
+        return self.budget - self.remaining()
+    
+    def expired(self):
+        return self.remaining() <= 0
+    
+    def allot(self, stage, default=None):
+        """
+        Seconds stage may take: its share of the remaining budget, capped at default.
+        
+        :raises UrlTimeout: When nothing is left
+        """
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise UrlTimeout(stage)
+        stages = list(TIME_BUDGET_SHARES)
+        later = sum(TIME_BUDGET_SHARES[name] for name in stages[stages.index(stage):])
+        seconds = remaining * TIME_BUDGET_SHARES[stage] / later
+        return min(seconds, default) if default is not None else seconds
+    
+    def pause(self):
+        if self._paused_at is None:
+            self._paused_at = time.monotonic()
+    
+    def resume(self):
+        if self._paused_at is not None:
+            self.expires_at += time.monotonic() - self._paused_at
+            self._paused_at = None
+
+def analyze_website(url, headless=True, wait_time=8, driver_pool=None,
+                    wait_strategy="fixed", quiet_window=1.0, tiered=False, tier_thresholds=None,
+                    session=None, similarity="sequence", similarity_max_chars=None,
+                    dom_backend="soup", cache=None, force_refresh=False, revalidate=False,
+                    block_resources=None, early_exit=False, max_bytes=None,
+                    classifier=None, classifier_confidence=0.9, time_budget=None,
+                    capture_network=False, static_early_exit=False):
     """
     Advanced analysis to determine if Selenium is needed for web scraping.
     Uses multiple detection methods for higher accuracy.
+    
+    :param wait_time: Seconds to wait for dynamic content after readyState is
+                      complete; the hard ceiling when wait_strategy is "adaptive"
+    :param driver_pool: Optional DriverPool to lease a warm Chrome driver from
+                        instead of launching (and quitting) one for this URL
+    :param wait_strategy: "fixed" sleeps for wait_time, "adaptive" returns as soon
+                          as the DOM and network have been quiet for quiet_window
+    :param quiet_window: Seconds of DOM/network silence required by the adaptive wait
+    :param tiered: Decide from the static HTML alone when it is conclusive and only
+                   launch the browser otherwise; result["decided_by"] records the tier
+    :param tier_thresholds: Optional overrides for STATIC_TIER_THRESHOLDS
+    :param session: Optional requests.Session used for the static fetch
+    :param similarity: Text similarity backend for the content comparison
+                       ("sequence", "jaccard", "minhash" or "ngram")
+    :param similarity_max_chars: Optional bound on the characters the similarity compares
+    :param dom_backend: HTML parsing backend for the DOM statistics ("soup", "stream",
+                        "lxml" or "auto"; see extract_dom_stats)
+    :param cache: Optional VerdictCache consulted before fetching and updated afterwards
+    :param force_refresh: Ignore cached verdicts (the fresh result is still stored)
+    :param revalidate: For expired cache entries, send a conditional GET with the stored
+                       ETag/Last-Modified and reuse the verdict on a 304 or an unchanged body
+    :param block_resources: Resource-blocking profile for the browser ("lean", "minimal"
+                            or a list of URL patterns); see BLOCKING_PROFILES
+    :param early_exit: Run the scoring stages cheapest first and skip the rest once they
+                       can no longer change the verdict (result["skipped_stages"]); the
+                       confidence is then the conservative end of result["score_bounds"].
+                       Leave off for full diagnostics.
+    :param static_early_exit: Skip the browser when the indicators plus the frameworks named
+                              in the served HTML already score above 50. This is an estimate
+                              (result["estimated"]), since it assumes the rendered page keeps
+                              those framework markers.
+    :param max_bytes: Bounded mode: stream the HTTP body and stop after max_bytes bytes,
+                      and process at most max_bytes characters of the rendered page
+    :param classifier: Optional trained SeleniumClassifier; pages it scores with at least
+                       classifier_confidence are decided without the browser
+                       (result["decided_by"] == "classifier")
+    :param classifier_confidence: Probability (0.5-1) the pre-screen needs to decide a page
+    :param time_budget: Hard limit in seconds for the whole URL, split across the stages
+                        (TIME_BUDGET_SHARES) and enforced with HTTP and page-load timeouts
+                        and a watchdog that kills a hung browser. A URL that runs out gets
+                        a partial result with result["timed_out"] set.
+    :param capture_network: Record the browser's network traffic during the page load and
+                            wait, and report the XHR/fetch calls it made (JSON APIs, GraphQL,
+                            HTML fragments) in result["network"]; see classify_network_traffic
+    """
+    options = dict(locals())
+    del options["url"]
+    
+    result, pending = analyze_static_stage(url, **stage_kwargs(analyze_static_stage, options))
+    if pending is None:
+        return result
+    
+    return analyze_browser_stage(result, pending, **stage_kwargs(analyze_browser_stage, options))
+
+def analyze_static_stage(url, tiered=False, tier_thresholds=None, session=None, dom_backend="soup",
+                         cache=None, force_refresh=False, revalidate=False, early_exit=False,
+                         max_bytes=None, classifier=None, classifier_confidence=0.9, time_budget=None,
+                         static_early_exit=False):
+    """
+    First half of analyze_website: fetch the page with requests and analyze the static HTML.
+    
+    :return: Tuple of (result, pending). pending is None when the result is final,
+             otherwise it carries the static HTML state for analyze_browser_stage.
     """
+    timings = {}
+    deadline = UrlDeadline(time_budget) if time_budget else None
+    
+    # --- Step 0: A fresh cached verdict skips both the fetch and the browser ---
+    previous = None
+    headers = DEFAULT_HEADERS
+    # Verdicts reached by a shortcut this run does not allow are not reused
+    accept = accepted_analysis_modes(tiered, early_exit, classifier, static_early_exit)
+    if cache is not None and not force_refresh:
+        with TimedSpan(timings, "cache_lookup", url):
+            cached = cache.get(url, accept)
+        if cached is not None:
+            cached["timings"] = timings
+            return cached, None
+        
+        # An expired verdict can still be reused if the server says the page is unchanged
+        if revalidate:
+            with TimedSpan(timings, "cache_lookup", url):
+                previous = cache.lookup(url, accept)
+            if previous is not None:
+                headers = dict(DEFAULT_HEADERS)
+                if previous["etag"]:
+                    headers['If-None-Match'] = previous["etag"]
+                if previous["last_modified"]:
+                    headers['If-Modified-Since'] = previous["last_modified"]
+    
     result = {
         "url": url,
         "needs_selenium": False,
@@ -25,31 +250,95 @@ def analyze_website(url, headless=True, wait_time=8):
         "frameworks_detected": [],
         "reasons": [],
         "content_analysis": {},
-        "dynamic_indicators": []
+        "dynamic_indicators": [],
+        "timings": timings
     }
     
     # --- Step 1: Load with Requests ---
+    import requests
+    
     try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-        response = requests.get(url, timeout=15, headers=headers)
-        response.raise_for_status()
-        html_requests = response.text
+        http = session if session is not None else requests
+        with TimedSpan(timings, "http_fetch", url):
+            # With a budget the body is streamed, so a server trickling bytes cannot outlast it
+            timeout = deadline.allot("http_fetch", 15) if deadline else 15
+            response = http.get(url, timeout=timeout, headers=headers, stream=bool(max_bytes or deadline))
+            if response.status_code == 304 and previous is not None:
+                response.close()
+                revalidated = cache.revalidated(url, previous["result"])
+                revalidated["timings"] = timings
+                return revalidated, None
+            response.raise_for_status()
+            if max_bytes or deadline:
+                html_requests, truncated = read_capped_body(response, max_bytes, deadline=deadline)
+                if max_bytes:
+                    result["requests_truncated"] = truncated
+            else:
+                html_requests = response.text
         result["requests_len"] = len(html_requests)
+        track_page_memory(result, html_requests)
         
-        # Parse with BeautifulSoup for better analysis
-        soup_requests = BeautifulSoup(html_requests, 'html.parser')
+        # Parse once and keep only the statistics the analysis needs
+        with TimedSpan(timings, "static_parse", url):
+            requests_stats = extract_dom_stats(html_requests, dom_backend)
+        track_page_memory(result, html_requests, requests_stats["text"])
         
     except Exception as e:
         result["needs_selenium"] = True
         result["reasons"].append(f"Requests failed: {e}")
         result["confidence"] = 90
-        return result
+        result["error"] = f"Requests failed: {e}"
+        if deadline is not None and (isinstance(e, (UrlTimeout, requests.exceptions.Timeout)) or deadline.expired()):
+            result["timed_out"] = True
+            result["timeout_stage"] = "http_fetch"
+        
+        # Keep rate-limit responses visible so a scheduler can back off and retry
+        failed = getattr(e, 'response', None)
+        if failed is not None:
+            failed.close()
+        if failed is not None and failed.status_code in RATE_LIMIT_STATUSES:
+            result["http_status"] = failed.status_code
+            retry_after = parse_retry_after(failed.headers.get('Retry-After'))
+            if retry_after is not None:
+                result["retry_after"] = retry_after
+        return result, None
+    
+    # Unchanged static HTML gets the verdict it had before, even under another URL
+    result["content_hash"] = hashlib.sha256(html_requests.encode('utf-8')).hexdigest()
+    validators = {"etag": response.headers.get('ETag'),
+                  "last_modified": response.headers.get('Last-Modified')}
+    if any(validators.values()):
+        result["http_validators"] = validators
+    
+    if previous is not None and previous["content_hash"] == result["content_hash"]:
+        reused = dict(previous["result"])
+        if "http_validators" in result:
+            reused["http_validators"] = result["http_validators"]
+        reused["timings"] = timings
+        return cache.revalidated(url, reused), None
+    
+    if cache is not None and not force_refresh:
+        with TimedSpan(timings, "cache_lookup", url):
+            cached = cache.get_by_content_hash(result["content_hash"], accept)
+        if cached is not None:
+            cached["url"] = url
+            cached["timings"] = timings
+            cache.put(url, cached, result["content_hash"])
+            return cached, None
     
     # --- Step 2: Pre-analysis of HTML content ---
-    dynamic_indicators = analyze_html_indicators(html_requests)
+    # Both passes work on the lowercased page; lower the multi-MB string only once
+    with TimedSpan(timings, "signature_scan", url):
+        html_lower = html_requests.lower()
+        signatures = scan_page_signatures(html_requests, html_lower)
+    dynamic_indicators = list(signatures["indicators"])
     result["dynamic_indicators"] = dynamic_indicators
+    result["signature_scan"] = signatures
+    
+    with TimedSpan(timings, "feature_extract", url):
+        result["static_features"] = extract_static_features(html_requests, requests_stats, dynamic_indicators,
+                                                            html_lower)
+    html_lower = None
     
     # If strong indicators of dynamic content, likely needs Selenium
     if len(dynamic_indicators) >= 3:
@@ -57,52 +346,235 @@ def analyze_website(url, headless=True, wait_time=8):
         result["reasons"].append("Multiple dynamic content indicators found")
         result["confidence"] = 85
     
+    # Opt-in estimate: the served HTML's framework markers usually survive into the rendered
+    # page, whose scan would count them again, and the other browser stages only add points.
+    # Points before rendering alone never settle the score (indicators top out at 40)
+    if static_early_exit:
+        static_frameworks = list(signatures["frameworks"])
+        low, high = score_bounds(0, 0, static_frameworks, dynamic_indicators, {},
+                                 ["framework_detection", "dom_comparison", "text_similarity"])
+        if verdict_settled(low, high):
+            result["needs_selenium"] = True
+            result["confidence"] = low
+            result["frameworks_detected"] = static_frameworks
+            result["reasons"] = generate_reasons_for_selenium(static_frameworks, dynamic_indicators, {})
+            result["score_bounds"] = [low, high]
+            result["skipped_stages"] = ["browser"]
+            result["decided_by"] = "static"
+            result["estimated"] = True
+            if cache is not None:
+                cache.put(url, result, result["content_hash"])
+            return result, None
+    
+    # --- Step 2b: Static tier, escalate to the browser only when undecided ---
+    if tiered:
+        with TimedSpan(timings, "static_tier", url):
+            tier = evaluate_static_tier(html_requests, requests_stats, dynamic_indicators, tier_thresholds,
+                                        frameworks=list(signatures["frameworks"]))
+        result["static_tier"] = {"score": tier["score"], "text_len": tier["text_len"]}
+        if tier["needs_selenium"] is not None:
+            result["needs_selenium"] = tier["needs_selenium"]
+            result["confidence"] = tier["confidence"]
+            result["frameworks_detected"] = tier["frameworks"]
+            result["reasons"] = [tier["reason"]]
+            result["decided_by"] = "static"
+            if cache is not None:
+                cache.put(url, result, result["content_hash"])
+            return result, None
+    
+    # --- Step 2c: Learned pre-screen, escalate only low-confidence pages ---
+    if classifier is not None:
+        with TimedSpan(timings, "classifier", url):
+            probability = float(classifier.predict_proba([result["static_features"]])[0])
+        result["classifier_probability"] = round(probability, 4)
+        if max(probability, 1 - probability) >= classifier_confidence:
+            result["needs_selenium"] = probability >= 0.5
+            result["confidence"] = min(99, round(max(probability, 1 - probability) * 100))
+            result["frameworks_detected"] = list(signatures["frameworks"])
+            result["reasons"] = [f"Learned pre-screen: {probability:.1%} probability that the page needs Selenium"]
+            result["decided_by"] = "classifier"
+            if cache is not None:
+                cache.put(url, result, result["content_hash"])
+            return result, None
+    
+    # Only the statistics travel on to the browser stage, not the raw HTML
+    pending = {
+        "dom_stats": requests_stats,
+        "indicators": dynamic_indicators,
+        "deadline": deadline
+    }
+    if deadline is not None:
+        deadline.pause()
+    return result, pending
+
+def analyze_browser_stage(result, pending, headless=True, wait_time=8, driver_pool=None,
+                          wait_strategy="fixed", quiet_window=1.0, similarity="sequence",
+                          similarity_max_chars=None, dom_backend="soup", cache=None,
+                          block_resources=None, early_exit=False, max_bytes=None, time_budget=None,
+                          capture_network=False):
+    """Second half of analyze_website: render the page in Chrome and make the final decision."""
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.common.exceptions import TimeoutException
+    
+    url = result["url"]
+    requests_stats = pending["dom_stats"]
+    dynamic_indicators = pending["indicators"]
+    result["decided_by"] = "browser"
+    timings = result.setdefault("timings", {})
+    deadline = pending.get("deadline")
+    if deadline is None and time_budget:
+        deadline = UrlDeadline(time_budget)
+    if deadline is not None:
+        deadline.resume()
+    profile, blocked_patterns = resolve_blocking_profile(block_resources)
+    
+    # Scoring stages, cheapest first; with early_exit the rest is skipped once settled
+    stages_left = ["framework_detection", "dom_comparison", "text_similarity"]
+    frameworks = []
+    content_analysis = {}
+    selenium_stats = None
+    
+    def settled():
+        if not early_exit:
+            return False
+        return verdict_settled(*score_bounds(result["requests_len"], result["selenium_len"], frameworks,
+                                             dynamic_indicators, content_analysis, stages_left))
+    
     # --- Step 3: Load with Selenium ---
     driver = None
+    watch = None
+    failed = False
+    stage = "driver_acquire"
     try:
-        options = Options()
-        if headless:
-            options.add_argument("--headless")
-        options.add_argument("--disable-gpu")
-        options.add_argument("--no-sandbox")
-        options.add_argument("--disable-dev-shm-usage")
-        options.add_argument("--disable-blink-features=AutomationControlled")
-        options.add_experimental_option("excludeSwitches", ["enable-automation"])
-        options.add_experimental_option('useAutomationExtension', False)
+        with TimedSpan(timings, "driver_acquire", url):
+            if driver_pool is not None:
+                driver = driver_pool.acquire()
+            else:
+                driver = launch_chrome_driver(headless, performance_log=profile is not None or capture_network)
         
-        driver = webdriver.Chrome(options=options)
-        driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
+        # A browser still busy with this URL past its deadline is killed, which unblocks this thread
+        if deadline is not None:
+            watch = SESSION_WATCHDOG.watch(driver, deadline.remaining() + WATCHDOG_GRACE)
         
-        driver.get(url)
+        # Pooled drivers keep their blocking rules, so also clear them when none are wanted
+        if blocked_patterns or getattr(driver, "_sda_blocked_urls", None):
+            apply_resource_blocking(driver, blocked_patterns)
+        # Start from an empty log, so only this URL's traffic is counted
+        if profile is not None or capture_network:
+            drain_performance_log(driver)
+        if wait_strategy == "adaptive":
+            install_quiescence_monitor(driver)
+        
+        stage = "page_load"
+        with TimedSpan(timings, "page_load", url):
+            if deadline is not None and hasattr(driver, "set_page_load_timeout"):
+                driver.set_page_load_timeout(deadline.allot("page_load"))
+            driver.get(url)
         
         # Wait for page to load and check for dynamic content
-        WebDriverWait(driver, 10).until(
-            lambda driver: driver.execute_script("return document.readyState") == "complete"
-        )
+        stage = "ready_state"
+        with TimedSpan(timings, "ready_state", url):
+            WebDriverWait(driver, deadline.allot("ready_state", 10) if deadline else 10).until(
+                lambda driver: driver.execute_script("return document.readyState") == "complete"
+            )
         
         # Additional wait for dynamic content
-        time.sleep(wait_time)
+        stage = "dynamic_wait"
+        with TimedSpan(timings, "dynamic_wait", url):
+            if deadline is not None:
+                wait_time = min(wait_time, deadline.allot("dynamic_wait"))
+            if wait_strategy == "adaptive":
+                waited, ceiling_hit = wait_for_dom_quiescence(driver, quiet_window, max_wait=wait_time)
+                result["wait_time_actual"] = round(waited, 2)
+                result["wait_ceiling_hit"] = ceiling_hit
+            else:
+                time.sleep(wait_time)
+                result["wait_time_actual"] = wait_time
         
-        html_selenium = driver.page_source
+        stage = "processing"
+        
+        if max_bytes:
+            html_selenium, full_len = capped_page_source(driver, max_bytes)
+            result["selenium_truncated"] = full_len > len(html_selenium)
+            result["selenium_len_full"] = full_len
+        else:
+            html_selenium = driver.page_source
         result["selenium_len"] = len(html_selenium)
+        track_page_memory(result, html_selenium, requests_stats["text"])
         
-        # Parse selenium content
-        soup_selenium = BeautifulSoup(html_selenium, 'html.parser')
+        network_log = None
+        if profile is not None or capture_network:
+            network_log = drain_performance_log(driver)
+        if profile is not None:
+            blocking = {"profile": profile}
+            if network_log is not None:
+                blocking.update(summarize_network_log(network_log))
+            result["resource_blocking"] = blocking
+        if capture_network:
+            with TimedSpan(timings, "network_capture", url):
+                result["network"] = (classify_network_traffic(network_log, url) if network_log is not None
+                                     else {"error": "Performance log not enabled on this driver"})
+        network_log = None
         
         # --- Framework Detection ---
-        frameworks = detect_js_frameworks(driver, html_selenium)
-        result["frameworks_detected"] = frameworks
+        if not settled():
+            with TimedSpan(timings, "framework_detection", url):
+                probe = probe_js_frameworks(driver)
+                frameworks = detect_js_frameworks(driver, html_selenium, probe=probe)
+            result["frameworks_detected"] = frameworks
+            result["framework_probe"] = {"probe_ms": probe["probe_ms"], "errors": probe["errors"]}
+            stages_left.remove("framework_detection")
+        
+        # Parse selenium content
+        if not settled():
+            with TimedSpan(timings, "rendered_parse", url):
+                selenium_stats = extract_dom_stats(html_selenium, dom_backend)
+            track_page_memory(result, html_selenium, requests_stats["text"], selenium_stats["text"])
+        
+        # Everything below works from the statistics; drop the rendered HTML now
+        html_selenium = None
         
     except Exception as e:
-        if driver:
-            driver.quit()
-        result["needs_selenium"] = True
-        result["reasons"].append(f"Selenium failed: {e}")
-        result["confidence"] = 70
+        failed = True
+        killed = watch is not None and watch.killed
+        if deadline is not None and (killed or deadline.expired() or isinstance(e, (UrlTimeout, TimeoutException))):
+            timed_out_result(result, pending, getattr(e, "stage", stage), deadline, killed)
+        else:
+            result["needs_selenium"] = True
+            result["reasons"].append(f"Selenium failed: {e}")
+            result["confidence"] = 70
+            result["error"] = f"Selenium failed: {e}"
+    
+    finally:
+        # Every path gives the driver back (or quits it), so no Chrome outlives its URL
+        driver_failed = failed
+        if watch is not None and SESSION_WATCHDOG.cancel(watch):
+            driver_failed = True
+        if driver is not None:
+            with TimedSpan(timings, "driver_release", url):
+                if deadline is not None and hasattr(driver, "set_page_load_timeout") and not driver_failed:
+                    try:
+                        driver.set_page_load_timeout(DEFAULT_PAGE_LOAD_TIMEOUT)
+                    except Exception:
+                        driver_failed = True
+                release_driver(driver, driver_pool, failed=driver_failed)
+    
+    if failed:
         return result
     
     # --- Step 4: Advanced Content Analysis ---
-    content_analysis = compare_content_quality(soup_requests, soup_selenium, url)
+    if selenium_stats is not None:
+        with TimedSpan(timings, "content_compare", url):
+            content_analysis = compare_dom_stats(requests_stats, selenium_stats, similarity,
+                                                 similarity_max_chars, include_text=not early_exit)
+        stages_left.remove("dom_comparison")
+        if not early_exit:
+            stages_left.remove("text_similarity")
+        elif not settled():
+            with TimedSpan(timings, "content_compare", url):
+                compare_dom_text(content_analysis, requests_stats, selenium_stats, similarity,
+                                 similarity_max_chars)
+            stages_left.remove("text_similarity")
     result["content_analysis"] = content_analysis
     
     # --- Step 5: Decision Logic ---
@@ -114,6 +586,14 @@ def analyze_website(url, headless=True, wait_time=8):
         content_analysis
     )
     
+    # A settled early exit scores at the end of the possible range closest to 50
+    if stages_left:
+        low, high = score_bounds(result["requests_len"], result["selenium_len"], frameworks,
+                                 dynamic_indicators, content_analysis, stages_left)
+        decision_score = low if low > 50 else high
+        result["score_bounds"] = [low, high]
+        result["skipped_stages"] = list(stages_left)
+    
     result["needs_selenium"] = decision_score > 50
     result["confidence"] = abs(decision_score - 50) + 50  # Convert to confidence percentage
     
@@ -123,123 +603,524 @@ def analyze_website(url, headless=True, wait_time=8):
     else:
         result["reasons"] = ["Static HTML provides sufficient content for scraping"]
     
-    if driver:
-        driver.quit()
+    # Data that arrives from plain JSON endpoints can be fetched without a browser
+    replayable = (result.get("network") or {}).get("replayable_endpoints", 0)
+    if result["needs_selenium"] and replayable:
+        result["reasons"].append(f"Content is loaded from {replayable} JSON API endpoint(s) that plain "
+                                 f"HTTP requests can call directly (see network.api_calls)")
+    
+    if cache is not None:
+        cache.put(url, result, result.get("content_hash"))
     
     return result
 
-def analyze_html_indicators(html):
-    """Analyze HTML for indicators that suggest dynamic content loading."""
-    indicators = []
-    html_lower = html.lower()
-    
-    # Check for SPA indicators
-    spa_patterns = [
-        r'<div[^>]*id=["\']root["\']',
-        r'<div[^>]*id=["\']app["\']',
-        r'<div[^>]*id=["\']main["\']',
-        r'<div[^>]*class=["\'][^"\']*app[^"\']*["\']'
-    ]
+def timed_out_result(result, pending, stage, deadline, killed=False):
+    """
+    Turn a result whose browser stage ran out of time into a partial one.
     
-    for pattern in spa_patterns:
-        if re.search(pattern, html_lower):
-            indicators.append("SPA root element detected")
-            break
+    The verdict falls back to the static HTML signals, with a confidence halfway
+    between a coin flip and what those signals alone would give. Partial results
+    are not cached.
+    """
+    frameworks = list((result.get("signature_scan") or {}).get("frameworks", []))
+    score = calculate_selenium_need_score(result["requests_len"], result["requests_len"], frameworks,
+                                          pending["indicators"], {})
+    result["needs_selenium"] = score > 50
+    result["confidence"] = 50 + abs(score - 50) / 2
+    result["frameworks_detected"] = frameworks
+    note = "browser killed by the watchdog" if killed else "verdict from the static HTML only"
+    result["reasons"] = [f"Timed out during {stage} after {deadline.elapsed():.1f}s of a "
+                         f"{deadline.budget}s budget; {note}"]
+    if result["needs_selenium"]:
+        result["reasons"] += generate_reasons_for_selenium(frameworks, pending["indicators"], {})
+    result["decided_by"] = "timeout"
+    result["timed_out"] = True
+    result["partial"] = True
+    result["timeout_stage"] = stage
+    return result
+
+def read_capped_body(response, max_bytes, chunk_size=64 * 1024, deadline=None):
+    """
+    Read a streamed response body, stopping once more than max_bytes have arrived.
     
-    # Check for loading indicators
-    if any(term in html_lower for term in ['loading...', 'please wait', 'spinner', 'skeleton']):
-        indicators.append("Loading indicators found")
-    
-    # Check for AJAX/fetch calls
-    ajax_patterns = [
-        r'\.fetch\s*\(',
-        r'XMLHttpRequest',
-        r'axios\.',
-        r'jquery.*ajax',
-        r'api/.*endpoint'
-    ]
+    :param max_bytes: Size cap, or None to read the whole body
+    :param deadline: Optional UrlDeadline; UrlTimeout is raised when it passes mid-body
+    :return: Tuple of (decoded text of at most max_bytes bytes, whether it was truncated)
+    """
+    chunks = []
+    size = 0
+    raw = response.raw
+    if deadline is not None and hasattr(raw, "read1"):
+        # read1 returns whatever has arrived, so a server trickling bytes is checked against the deadline
+        body_chunks = iter(lambda: raw.read1(chunk_size, decode_content=True), b"")
+    else:
+        body_chunks = response.iter_content(chunk_size)
+    try:
+        for chunk in body_chunks:
+            chunks.append(chunk)
+            size += len(chunk)
+            if max_bytes and size > max_bytes:
+                break
+            if deadline is not None and deadline.expired():
+                raise UrlTimeout("http_fetch")
+    finally:
+        response.close()
     
-    for pattern in ajax_patterns:
-        if re.search(pattern, html_lower):
-            indicators.append("AJAX/API calls detected")
-            break
+    body = b"".join(chunks)
+    chunks = None
+    truncated = bool(max_bytes) and len(body) > max_bytes
+    if truncated:
+        body = body[:max_bytes]
+    
+    # Same encoding choice as response.text, minus the full-body detection pass
+    encoding = response.encoding
+    if encoding is None:
+        from requests.compat import chardet
+        encoding = chardet.detect(body)["encoding"] if chardet is not None else None
+    try:
+        return body.decode(encoding or "utf-8", errors="replace"), truncated
+    except LookupError:
+        return body.decode("utf-8", errors="replace"), truncated
+
+# Returns the rendered document length and at most arguments[0] characters of it,
+# so an oversized page is cut in the browser instead of after the transfer
+CAPPED_SOURCE_SCRIPT = """
+    var html = document.documentElement ? document.documentElement.outerHTML : "";
+    return [html.length, html.substring(0, arguments[0])];
+"""
+
+def capped_page_source(driver, max_chars):
+    """Return (at most max_chars of the rendered HTML, full length of the rendered HTML)."""
+    capped = driver.execute_script(CAPPED_SOURCE_SCRIPT, max_chars)
+    if capped:
+        full_len, html = capped
+        return html, full_len
+    html = driver.page_source
+    return html[:max_chars], len(html)
+
+def track_page_memory(result, *buffers):
+    """Record the largest combined size of page buffers held at once for this URL."""
+    held = sum(sys.getsizeof(buffer) for buffer in buffers if buffer is not None)
+    memory = result.setdefault("memory", {"peak_page_bytes": 0})
+    memory["peak_page_bytes"] = max(memory["peak_page_bytes"], held)
+
+# Installed into the page by the adaptive wait: records the time of the last DOM
+# mutation and counts in-flight fetch/XHR requests. Safe to run more than once.
+QUIESCENCE_MONITOR_SCRIPT = """
+    if (!window.__sdaQuiescence) {
+        var state = {inflight: 0, last: Date.now()};
+        window.__sdaQuiescence = state;
+        var touch = function () { state.last = Date.now(); };
+        var settle = function () { state.inflight = Math.max(0, state.inflight - 1); touch(); };
+        try {
+            new MutationObserver(touch).observe(document.documentElement || document,
+                {childList: true, subtree: true, characterData: true});
+        } catch (e) {}
+        if (window.fetch) {
+            var originalFetch = window.fetch;
+            window.fetch = function () {
+                state.inflight++;
+                touch();
+                try {
+                    var request = originalFetch.apply(this, arguments);
+                    request.then(settle, settle);
+                    return request;
+                } catch (e) {
+                    settle();
+                    throw e;
+                }
+            };
+        }
+        if (window.XMLHttpRequest) {
+            var originalSend = XMLHttpRequest.prototype.send;
+            XMLHttpRequest.prototype.send = function () {
+                state.inflight++;
+                touch();
+                this.addEventListener('loadend', settle);
+                return originalSend.apply(this, arguments);
+            };
+        }
+    }
+"""
+
+QUIESCENCE_PROBE_SCRIPT = """
+    var state = window.__sdaQuiescence;
+    return state ? [state.inflight, Date.now() - state.last] : null;
+"""
+
+def install_quiescence_monitor(driver):
+    """
+    Register the quiescence monitor to run in every new document before any page
+    script, so fetch/XHR requests started during page load are counted too.
+    
+    :return: False when the driver has no CDP access (the monitor is then injected after load)
+    """
+    if getattr(driver, "_sda_quiescence_monitor", False):
+        return True
+    try:
+        driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {"source": QUIESCENCE_MONITOR_SCRIPT})
+    except Exception:
+        return False
+    driver._sda_quiescence_monitor = True
+    return True
+
+def wait_for_dom_quiescence(driver, quiet_window=1.0, max_wait=8, poll_interval=0.2):
+    """
+    Wait until the DOM has not changed and no fetch/XHR request has been in
+    flight for quiet_window seconds, or until max_wait seconds have passed.
     
-    # Check for lazy loading
-    if re.search(r'data-src|lazy.*load|intersection.*observer', html_lower):
-        indicators.append("Lazy loading detected")
+    Requests are only counted from the moment the monitor is installed; call
+    install_quiescence_monitor before navigating to count them from the start.
     
-    # Check for virtual scrolling or infinite scroll
-    if re.search(r'virtual.*scroll|infinite.*scroll', html_lower):
-        indicators.append("Virtual/infinite scrolling detected")
+    :return: Tuple of (seconds waited, whether the max_wait ceiling was hit)
+    """
+    start = time.time()
+    driver.execute_script(QUIESCENCE_MONITOR_SCRIPT)
     
-    return list(set(indicators))
+    while True:
+        elapsed = time.time() - start
+        if elapsed >= max_wait:
+            return elapsed, True
+        
+        state = driver.execute_script(QUIESCENCE_PROBE_SCRIPT)
+        if state is None:
+            # A client-side navigation replaced the window; start monitoring again
+            driver.execute_script(QUIESCENCE_MONITOR_SCRIPT)
+        else:
+            inflight, idle_ms = state
+            if inflight == 0 and idle_ms >= quiet_window * 1000:
+                return elapsed, False
+        
+        time.sleep(max(0, min(poll_interval, max_wait - elapsed)))
 
-def detect_js_frameworks(driver, html):
-    """Enhanced framework detection."""
-    frameworks = []
-    html_lower = html.lower()
+# The former SPA root patterns, matched at a '<div' anchor: <div[^>]*id=["']root["'],
+# the same for app/main, and <div[^>]*class=["'][^"']*app[^"']*["']
+_SPA_ROOT_TAG = re.compile(r'''<div[^>]*(?:id=["'](?:root|app|main)["']|class=["'][^"']*app[^"']*["'])''')
+
+def _spa_root_tag(text, start, end):
+    """Confirm the SPA root patterns for the <div tag starting at the anchor."""
+    if _SPA_ROOT_TAG.match(text, start):
+        return True
+    # A later <div before this tag's '>' can only reach attributes this match already tried
+    tag_end = text.find('>', end)
+    return tag_end if tag_end != -1 else len(text)
+
+_CALL_PAREN = re.compile(r'\s*\(')
+
+def _followed_by_call(text, start, end):
+    """Confirm <anchor>\\s*\\(."""
+    return _CALL_PAREN.match(text, end) is not None
+
+def _later_on_line(word):
+    """Build a confirmation for <anchor>.*<word>, which cannot span a newline."""
+    def confirm(text, start, end):
+        found = text.find(word, end)
+        if found == -1:
+            # No later word anywhere, so no later anchor can be confirmed either
+            return len(text)
+        line_break = text.rfind('\n', end, found)
+        # Anchors before the word's line see the same next word, across a newline
+        return True if line_break == -1 else line_break + 1
+    return confirm
+
+# Dynamic content indicators as (label, anchor literals, confirmation). Anchors
+# are matched against the lowercased HTML; a confirmation checks the rest of the
+# original pattern around the anchor without rescanning the document.
+# Note: the former r'XMLHttpRequest' pattern was searched in lowercased HTML and
+# could never match, so it is intentionally absent.
+INDICATOR_SIGNATURES = [
+    ("SPA root element detected", ['<div'], _spa_root_tag),
+    ("Loading indicators found", ['loading...', 'please wait', 'spinner', 'skeleton'], None),
+    ("AJAX/API calls detected", ['.fetch'], _followed_by_call),
+    ("AJAX/API calls detected", ['axios.'], None),
+    ("AJAX/API calls detected", ['jquery'], _later_on_line('ajax')),
+    ("AJAX/API calls detected", ['api/'], _later_on_line('endpoint')),
+    ("Lazy loading detected", ['data-src'], None),
+    ("Lazy loading detected", ['lazy'], _later_on_line('load')),
+    ("Lazy loading detected", ['intersection'], _later_on_line('observer')),
+    ("Virtual/infinite scrolling detected", ['virtual', 'infinite'], _later_on_line('scroll'))
+]
+
+# Text fingerprints used when runtime framework detection is unavailable
+FRAMEWORK_SIGNATURES = [
+    ('React', ['react', 'reactdom', 'jsx', 'data-reactroot'], None),
+    ('Angular', ['angular', '@angular', 'ng-app', 'app-root'], None),
+    ('Vue', ['vue.js', 'vuejs', 'v-if', 'v-for'], None),
+    ('jQuery', ['jquery', '$('], None),
+    ('Next.js', ['next.js', '_next'], None),
+    ('Nuxt', ['nuxt', '__nuxt'], None),
+    ('Svelte', ['svelte'], None),
+    ('Ember', ['ember'], None)
+]
+
+class SignatureScanner:
+    """
+    Single-pass multi-pattern matcher for HTML signatures.
     
-    # Check via JavaScript execution
-    try:
-        # React detection
-        react_check = driver.execute_script("""
-            return !!(window.React || window.ReactDOM || 
-                     document.querySelector('[data-reactroot]') ||
-                     document.querySelector('[data-react-helmet]') ||
-                     !!document.querySelector('script').innerHTML.includes('React'));
-        """)
-        if react_check:
-            frameworks.append("React")
-        
-        # Angular detection
-        angular_check = driver.execute_script("""
-            return !!(window.ng || window.angular || window.Zone ||
-                     document.querySelector('[ng-app]') ||
-                     document.querySelector('[data-ng-app]') ||
-                     document.querySelector('app-root'));
-        """)
-        if angular_check:
-            frameworks.append("Angular")
+    Every anchor literal keeps a cursor at its next occurrence in the
+    lowercased text, and hits are handled in document order. Each hit is
+    confirmed with a bounded check, so patterns such as lazy.*load never
+    backtrack across the document. A failed check returns the offset before
+    which the same anchor cannot be confirmed, and the cursor jumps there.
+    Literals whose labels are all resolved are dropped.
+    """
+    
+    def __init__(self, signatures):
+        """:param signatures: List of (label, anchor literals, confirmation or None)"""
+        self.labels = []
+        self._entries = {}
+        for index, (label, literals, confirm) in enumerate(signatures):
+            if label not in self.labels:
+                self.labels.append(label)
+            for literal in literals:
+                self._entries.setdefault(literal, []).append((label, confirm, (index, literal)))
+    
+    def scan(self, text):
+        """
+        Find the first confirmed hit of every label in already-lowercased text.
         
-        # Vue detection
-        vue_check = driver.execute_script("""
-            return !!(window.Vue || document.querySelector('[data-v-]') ||
-                     document.querySelector('#app').__vue__);
-        """)
-        if vue_check:
-            frameworks.append("Vue")
+        :return: Tuple of (dict of label -> offset of the first hit, scan time in ms)
+        """
+        import heapq
         
-        # jQuery detection (often used with dynamic content)
-        jquery_check = driver.execute_script("return !!(window.jQuery || window.$);")
-        if jquery_check:
-            frameworks.append("jQuery")
+        started = time.perf_counter()
+        found = {}
+        blocked = {}
+        cursors = []
+        for literal in self._entries:
+            hit = text.find(literal)
+            if hit != -1:
+                cursors.append((hit, literal))
+        heapq.heapify(cursors)
+        
+        while cursors:
+            start, literal = heapq.heappop(cursors)
+            resume = None
             
-    except Exception:
-        pass
+            for label, confirm, key in self._entries[literal]:
+                if label in found:
+                    continue
+                until = blocked.get(key, start)
+                if until <= start:
+                    outcome = True if confirm is None else confirm(text, start, start + len(literal))
+                    if outcome is True:
+                        found[label] = start
+                        continue
+                    until = outcome or start + 1
+                    blocked[key] = until
+                if resume is None or until < resume:
+                    resume = until
+            
+            if resume is not None:
+                hit = text.find(literal, resume)
+                if hit != -1:
+                    heapq.heappush(cursors, (hit, literal))
+        
+        return found, (time.perf_counter() - started) * 1000
+
+_INDICATOR_SCANNER = SignatureScanner(INDICATOR_SIGNATURES)
+_FRAMEWORK_SCANNER = SignatureScanner(FRAMEWORK_SIGNATURES)
+_PAGE_SCANNER = SignatureScanner(INDICATOR_SIGNATURES + FRAMEWORK_SIGNATURES)
+
+def scan_page_signatures(html, html_lower=None):
+    """
+    Find dynamic content indicators and framework fingerprints in one pass.
     
-    # Fallback: text-based detection
-    framework_patterns = {
-        'React': [r'react', r'reactdom', r'jsx', r'data-reactroot'],
-        'Angular': [r'angular', r'@angular', r'ng-app', r'app-root'],
-        'Vue': [r'vue\.js', r'vuejs', r'v-if', r'v-for'],
-        'jQuery': [r'jquery', r'\$\('],
-        'Next.js': [r'next\.js', r'_next'],
-        'Nuxt': [r'nuxt', r'__nuxt'],
-        'Svelte': [r'svelte'],
-        'Ember': [r'ember']
+    :param html_lower: html.lower(), if the caller already has it
+    :return: Dict with "indicators" and "frameworks" (label -> offset of the first
+             hit in the lowercased HTML) and "scan_ms"
+    """
+    found, scan_ms = _PAGE_SCANNER.scan(html_lower if html_lower is not None else html.lower())
+    indicator_labels = set(_INDICATOR_SCANNER.labels)
+    return {
+        "indicators": {label: offset for label, offset in found.items() if label in indicator_labels},
+        "frameworks": {label: offset for label, offset in found.items() if label not in indicator_labels},
+        "scan_ms": round(scan_ms, 3)
     }
+
+def analyze_html_indicators(html):
+    """Analyze HTML for indicators that suggest dynamic content loading."""
+    found, _ = _INDICATOR_SCANNER.scan(html.lower())
+    return list(found)
+
+# Runtime fingerprints checked by the in-page framework probe. Each check is a
+# JavaScript expression; a framework is detected when any of its checks is truthy.
+FRAMEWORK_FINGERPRINTS = {
+    "React": [
+        "window.React", "window.ReactDOM",
+        "document.querySelector('[data-reactroot]')",
+        "document.querySelector('[data-react-helmet]')",
+        "document.querySelector('script').innerHTML.includes('React')"
+    ],
+    "Angular": [
+        "window.ng", "window.angular", "window.Zone",
+        "document.querySelector('[ng-app]')",
+        "document.querySelector('[data-ng-app]')",
+        "document.querySelector('app-root')"
+    ],
+    "Vue": [
+        "window.Vue", "document.querySelector('[data-v-]')",
+        "document.querySelector('#app').__vue__"
+    ],
+    # jQuery is often used with dynamic content
+    "jQuery": ["window.jQuery", "window.$"],
+    "Next.js": ["window.__NEXT_DATA__", "window.next", "document.getElementById('__next')"],
+    "Nuxt": ["window.__NUXT__", "window.$nuxt", "document.getElementById('__nuxt')"],
+    "Svelte": ["window.__svelte", "document.querySelector('[class*=\"svelte-\"]')"],
+    "Ember": ["window.Ember", "document.querySelector('.ember-view')"]
+}
+
+_probe_script_cache = {}
+
+def register_framework_fingerprint(name, checks):
+    """Add runtime checks (JavaScript expressions) for a framework to the probe registry."""
+    FRAMEWORK_FINGERPRINTS.setdefault(name, [])
+    FRAMEWORK_FINGERPRINTS[name].extend(checks)
+
+def build_framework_probe_script(fingerprints):
+    """
+    Build one script that evaluates every fingerprint check in the page.
+    
+    Every check runs in its own try block, so a check that throws (for example
+    a property lookup on a missing element) does not hide the others.
+    """
+    key = tuple((name, tuple(checks)) for name, checks in fingerprints.items())
+    script = _probe_script_cache.get(key)
+    if script is not None:
+        return script
+    
+    lines = ["var detected = {}, errors = {};"]
+    for name, checks in fingerprints.items():
+        name_js = json.dumps(name)
+        lines.append(f"detected[{name_js}] = false;")
+        for check in checks:
+            lines.append(
+                f"if (!detected[{name_js}]) {{ try {{ if ({check}) {{ detected[{name_js}] = true; }} }} "
+                f"catch (e) {{ errors[{name_js}] = String(e); }} }}"
+            )
+    lines.append("return {detected: detected, errors: errors};")
+    
+    script = "\n".join(lines)
+    _probe_script_cache[key] = script
+    return script
+
+def probe_js_frameworks(driver, fingerprints=None):
+    """
+    Check every framework fingerprint with a single execute_script round-trip.
+    
+    :return: Dict with "detected" (framework names), "errors" (framework -> last
+             check error, for frameworks that were not detected) and "probe_ms"
+    """
+    fingerprints = fingerprints if fingerprints is not None else FRAMEWORK_FINGERPRINTS
+    script = build_framework_probe_script(fingerprints)
+    
+    started = time.perf_counter()
+    try:
+        outcome = driver.execute_script(script) or {}
+    except Exception as e:
+        outcome = {"detected": {}, "errors": {"probe": str(e)}}
+    probe_ms = (time.perf_counter() - started) * 1000
+    
+    detected = [name for name, hit in (outcome.get("detected") or {}).items() if hit]
+    errors = {name: error for name, error in (outcome.get("errors") or {}).items()
+              if name not in detected}
+    return {"detected": detected, "errors": errors, "probe_ms": round(probe_ms, 2)}
+
+def detect_js_frameworks(driver, html, probe=None):
+    """
+    Enhanced framework detection.
+    
+    :param probe: Result of probe_js_frameworks, if the page was already probed
+    """
+    # Check via JavaScript execution
+    if probe is None:
+        probe = probe_js_frameworks(driver)
+    frameworks = list(probe["detected"])
     
-    for framework, patterns in framework_patterns.items():
+    # Fallback: text-based detection
+    for framework in detect_frameworks_in_html(html):
         if framework not in frameworks:
-            for pattern in patterns:
-                if re.search(pattern, html_lower):
-                    frameworks.append(framework)
-                    break
+            frameworks.append(framework)
     
     return list(set(frameworks))
 
-def compare_content_quality(soup_requests, soup_selenium, url):
-    """Compare the actual useful content between requests and selenium."""
+def detect_frameworks_in_html(html):
+    """Text-based framework detection that works on static HTML without a browser."""
+    found, _ = _FRAMEWORK_SCANNER.scan(html.lower())
+    return list(found)
+
+# Thresholds for the static (requests-only) tier of a tiered analysis. The
+# browser is only launched when the static evidence falls between the verdicts.
+STATIC_TIER_THRESHOLDS = {
+    "min_static_text": 500,      # Visible chars needed to call a signal-free page static
+    "max_static_score": 15,      # Highest static-only score still treated as "no signals"
+    "max_shell_text": 200,       # Visible chars below which an SPA root is an empty shell
+    "dynamic_score": 70,         # Static-only score at which a page is called dynamic
+    "static_confidence": 75,
+    "dynamic_confidence": 85
+}
+
+def evaluate_static_tier(html, dom_stats, indicators, thresholds=None, frameworks=None):
+    """
+    Try to reach a verdict from the static HTML alone.
+    
+    :param dom_stats: extract_dom_stats result for html
+    :param frameworks: Text-detected frameworks, if already known (default: detect from html)
+    
+    :return: Dict with needs_selenium (True/False, or None when the browser is
+             needed to decide), confidence, score, frameworks, text_len and reason
+    """
+    limits = dict(STATIC_TIER_THRESHOLDS)
+    limits.update(thresholds or {})
+    
+    if frameworks is None:
+        frameworks = detect_frameworks_in_html(html)
+    text_len = len(dom_stats["text"])
+    score = calculate_selenium_need_score(len(html), len(html), frameworks, indicators, {})
+    
+    tier = {
+        "needs_selenium": None,
+        "confidence": 0,
+        "score": score,
+        "frameworks": frameworks,
+        "text_len": text_len,
+        "reason": None
+    }
+    
+    if "SPA root element detected" in indicators and text_len < limits["max_shell_text"]:
+        tier["needs_selenium"] = True
+        tier["confidence"] = limits["dynamic_confidence"]
+        tier["reason"] = "Static HTML is an empty application shell"
+    elif score >= limits["dynamic_score"]:
+        tier["needs_selenium"] = True
+        tier["confidence"] = limits["dynamic_confidence"]
+        tier["reason"] = "Static HTML shows strong framework and dynamic content signals"
+    elif score <= limits["max_static_score"] and text_len >= limits["min_static_text"]:
+        tier["needs_selenium"] = False
+        tier["confidence"] = limits["static_confidence"]
+        tier["reason"] = "Static HTML provides sufficient content for scraping"
+    
+    return tier
+
+def compare_content_quality(soup_requests, soup_selenium, url, similarity="sequence",
+                            similarity_max_chars=None):
+    """
+    Compare the actual useful content between requests and selenium.
+    
+    :param similarity: Name of the text similarity backend (see SIMILARITY_BACKENDS)
+    :param similarity_max_chars: Optional bound on the text length each backend compares
+    """
+    return compare_dom_stats(extract_dom_stats(soup_requests), extract_dom_stats(soup_selenium),
+                             similarity, similarity_max_chars)
+
+def compare_dom_stats(requests_stats, selenium_stats, similarity="sequence", similarity_max_chars=None,
+                      include_text=True):
+    """
+    Compare the useful content of two pages from their extract_dom_stats results.
+    
+    :param include_text: Also compute the text similarity (the most expensive part);
+                         see compare_dom_text
+    """
     analysis = {
         "text_diff_ratio": 0,
         "element_count_diff": 0,
@@ -247,204 +1128,2744 @@ def compare_content_quality(soup_requests, soup_selenium, url):
         "new_content_types": []
     }
     
-    try:
-        # Extract meaningful content
-        requests_text = extract_meaningful_content(soup_requests)
-        selenium_text = extract_meaningful_content(soup_selenium)
-        
-        # Calculate text similarity
-        similarity = difflib.SequenceMatcher(None, requests_text, selenium_text).ratio()
-        analysis["text_diff_ratio"] = 1 - similarity
-        
-        # Count important elements
-        important_tags = ['p', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'li', 'td', 'span', 'div']
-        
-        requests_elements = sum(len(soup_requests.find_all(tag)) for tag in important_tags)
-        selenium_elements = sum(len(soup_selenium.find_all(tag)) for tag in important_tags)
-        
-        if requests_elements > 0:
-            analysis["element_count_diff"] = (selenium_elements - requests_elements) / requests_elements
-        
-        # Check for important content missing in requests version
-        selenium_headings = [h.get_text().strip() for h in soup_selenium.find_all(['h1', 'h2', 'h3'])]
-        requests_headings = [h.get_text().strip() for h in soup_requests.find_all(['h1', 'h2', 'h3'])]
-        
-        missing_headings = set(selenium_headings) - set(requests_headings)
-        if len(missing_headings) > len(selenium_headings) * 0.3:  # More than 30% headings missing
-            analysis["important_content_missing"] = True
-        
-        # Check for new content types in Selenium version
-        selenium_forms = len(soup_selenium.find_all('form'))
-        requests_forms = len(soup_requests.find_all('form'))
-        if selenium_forms > requests_forms:
-            analysis["new_content_types"].append("forms")
-        
-        selenium_buttons = len(soup_selenium.find_all('button'))
-        requests_buttons = len(soup_requests.find_all('button'))
-        if selenium_buttons > requests_buttons * 1.5:
-            analysis["new_content_types"].append("interactive_elements")
-            
-    except Exception as e:
-        print(f"Error in content comparison: {e}")
+    try:
+        # Calculate text similarity
+        if include_text:
+            compare_dom_text(analysis, requests_stats, selenium_stats, similarity, similarity_max_chars)
+        
+        # Count important elements
+        requests_elements = requests_stats["important_elements"]
+        selenium_elements = selenium_stats["important_elements"]
+        
+        if requests_elements > 0:
+            analysis["element_count_diff"] = (selenium_elements - requests_elements) / requests_elements
+        
+        # Check for important content missing in requests version
+        selenium_headings = selenium_stats["headings"]
+        requests_headings = requests_stats["headings"]
+        
+        missing_headings = set(selenium_headings) - set(requests_headings)
+        if len(missing_headings) > len(selenium_headings) * 0.3:  # More than 30% headings missing
+            analysis["important_content_missing"] = True
+        
+        # Check for new content types in Selenium version
+        if selenium_stats["forms"] > requests_stats["forms"]:
+            analysis["new_content_types"].append("forms")
+        
+        if selenium_stats["buttons"] > requests_stats["buttons"] * 1.5:
+            analysis["new_content_types"].append("interactive_elements")
+            
+    except Exception as e:
+        print(f"Error in content comparison: {e}")
+    
+    return analysis
+
+def compare_dom_text(analysis, requests_stats, selenium_stats, similarity="sequence", similarity_max_chars=None):
+    """Add the text difference of two extract_dom_stats results to a compare_dom_stats analysis."""
+    started = time.perf_counter()
+    text_similarity_ratio = text_similarity(requests_stats["text"], selenium_stats["text"],
+                                            similarity, similarity_max_chars)
+    analysis["text_diff_ratio"] = 1 - text_similarity_ratio
+    analysis["similarity_method"] = similarity
+    analysis["similarity_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    return analysis
+
+IMPORTANT_TAGS = ['p', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'li', 'td', 'span', 'div']
+HEADING_TAGS = ('h1', 'h2', 'h3')
+NON_CONTENT_TAGS = ("script", "style", "meta", "link", "noscript")
+
+class DomStatsCollector:
+    """
+    Collects tag counts, headings, forms, buttons and visible text from a stream
+    of start/data/end parser events in a single traversal.
+    
+    The start/end/data/close methods follow the lxml parser target interface, so
+    an instance can be handed to lxml directly. Content inside NON_CONTENT_TAGS
+    is ignored, matching extract_meaningful_content.
+    """
+    
+    def __init__(self):
+        self.tag_counts = {}
+        self.text_parts = []
+        self.headings = []
+        self._open_headings = []
+        self._skipping = []
+    
+    def start(self, tag, attrs=None):
+        if self._skipping:
+            if tag == self._skipping[-1]:
+                self._skipping.append(tag)
+            return
+        if tag in NON_CONTENT_TAGS:
+            if tag not in ("meta", "link"):  # Void elements never get an end event
+                self._skipping.append(tag)
+            return
+        self.tag_counts[tag] = self.tag_counts.get(tag, 0) + 1
+        if tag in HEADING_TAGS:
+            self._open_headings.append((tag, []))
+    
+    def end(self, tag):
+        if self._skipping:
+            if tag == self._skipping[-1]:
+                self._skipping.pop()
+            return
+        if tag in HEADING_TAGS:
+            for position in range(len(self._open_headings) - 1, -1, -1):
+                if self._open_headings[position][0] == tag:
+                    _, parts = self._open_headings.pop(position)
+                    self.headings.append(''.join(parts).strip())
+                    break
+    
+    def data(self, text):
+        if self._skipping:
+            return
+        self.text_parts.append(text)
+        for _, parts in self._open_headings:
+            parts.append(text)
+    
+    def close(self):
+        # Headings left open by malformed markup still count
+        while self._open_headings:
+            _, parts = self._open_headings.pop()
+            self.headings.append(''.join(parts).strip())
+        
+        return {
+            "tag_counts": self.tag_counts,
+            "important_elements": sum(self.tag_counts.get(tag, 0) for tag in IMPORTANT_TAGS),
+            "headings": self.headings,
+            "forms": self.tag_counts.get('form', 0),
+            "buttons": self.tag_counts.get('button', 0),
+            "text": clean_text(''.join(self.text_parts))
+        }
+
+def _walk_soup(node, collector):
+    """Feed a BeautifulSoup tree to a DomStatsCollector."""
+    from bs4 import NavigableString, CData
+    from bs4.element import Tag
+    
+    stack = [iter(node.children)]
+    open_tags = [None]
+    while stack:
+        child = next(stack[-1], None)
+        if child is None:
+            stack.pop()
+            tag = open_tags.pop()
+            if tag is not None:
+                collector.end(tag)
+            continue
+        if isinstance(child, Tag):
+            collector.start(child.name, child.attrs)
+            stack.append(iter(child.children))
+            open_tags.append(child.name)
+        elif type(child) in (NavigableString, CData):
+            collector.data(str(child))
+
+def _stream_dom_stats(html):
+    """One-pass stats with the standard library parser, without building a tree."""
+    from html.parser import HTMLParser
+    
+    collector = DomStatsCollector()
+    
+    class StatsParser(HTMLParser):
+        def handle_starttag(self, tag, attrs):
+            collector.start(tag, attrs)
+        
+        def handle_startendtag(self, tag, attrs):
+            collector.start(tag, attrs)
+            collector.end(tag)
+        
+        def handle_endtag(self, tag):
+            collector.end(tag)
+        
+        def handle_data(self, data):
+            collector.data(data)
+    
+    parser = StatsParser(convert_charrefs=True)
+    parser.feed(html)
+    parser.close()
+    return collector.close()
+
+def _lxml_dom_stats(html):
+    """One-pass stats with lxml's C parser feeding the collector as a parser target."""
+    from lxml import etree
+    
+    collector = DomStatsCollector()
+    if not html.strip():
+        return collector.close()
+    parser = etree.HTMLParser(target=collector)
+    parser.feed(html)
+    return parser.close()
+
+def extract_dom_stats(source, backend="soup"):
+    """
+    Collect tag counts, headings, forms, buttons and visible text in one traversal.
+    
+    :param source: HTML string or an already-parsed BeautifulSoup tree
+    :param backend: How an HTML string is parsed: "soup" builds a BeautifulSoup tree
+                    with html.parser, "stream" uses the standard library parser without
+                    building a tree, "lxml" uses lxml without building a tree, and
+                    "auto" picks lxml when it is installed and "stream" otherwise
+    :return: Dict with tag_counts, important_elements, headings, forms, buttons and text
+    """
+    if not isinstance(source, str):
+        collector = DomStatsCollector()
+        _walk_soup(source, collector)
+        return collector.close()
+    
+    if backend == "auto":
+        try:
+            import lxml  # noqa: F401
+            backend = "lxml"
+        except ImportError:
+            backend = "stream"
+    
+    if backend == "lxml":
+        return _lxml_dom_stats(source)
+    if backend == "stream":
+        return _stream_dom_stats(source)
+    if backend == "soup":
+        from bs4 import BeautifulSoup
+        
+        return extract_dom_stats(BeautifulSoup(source, 'html.parser'))
+    raise ValueError(f"Unknown DOM stats backend: {backend}")
+
+def _bound_text(text, max_chars):
+    """Cut text down to max_chars by keeping evenly spaced windows, so the whole page stays represented."""
+    if not max_chars or len(text) <= max_chars:
+        return text
+    windows = 4
+    size = max_chars // windows
+    step = (len(text) - size) / (windows - 1)
+    return ' '.join(text[int(i * step):int(i * step) + size] for i in range(windows))
+
+def _word_shingles(text, k=3):
+    words = text.split()
+    if len(words) < k:
+        return {' '.join(words)} if words else set()
+    return {' '.join(words[i:i + k]) for i in range(len(words) - k + 1)}
+
+def sequence_similarity(a, b):
+    """Character-level difflib ratio. Quadratic in the worst case; bound it with max_chars."""
+    return difflib.SequenceMatcher(None, a, b).ratio()
+
+def shingle_jaccard_similarity(a, b, k=3):
+    """Jaccard similarity of word k-shingle sets. Linear in the text length."""
+    shingles_a, shingles_b = _word_shingles(a, k), _word_shingles(b, k)
+    if not shingles_a and not shingles_b:
+        return 1.0
+    return len(shingles_a & shingles_b) / len(shingles_a | shingles_b)
+
+def minhash_similarity(a, b, k=3, sketch_size=128):
+    """
+    Jaccard estimate from bottom-k MinHash sketches of word k-shingles.
+    
+    Each text is reduced to its sketch_size smallest shingle hashes, so the
+    comparison itself costs O(sketch_size) no matter how long the pages are.
+    """
+    import heapq
+    
+    def sketch(text):
+        hashes = {int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest(), 'big')
+                  for shingle in _word_shingles(text, k)}
+        return set(heapq.nsmallest(sketch_size, hashes))
+    
+    sketch_a, sketch_b = sketch(a), sketch(b)
+    if not sketch_a and not sketch_b:
+        return 1.0
+    union_sketch = set(heapq.nsmallest(sketch_size, sketch_a | sketch_b))
+    return len(union_sketch & sketch_a & sketch_b) / len(union_sketch)
+
+def ngram_histogram_similarity(a, b, n=3):
+    """Cosine similarity of character n-gram count histograms. Linear in the text length."""
+    from collections import Counter
+    import math
+    
+    histogram_a = Counter(a[i:i + n] for i in range(len(a) - n + 1))
+    histogram_b = Counter(b[i:i + n] for i in range(len(b) - n + 1))
+    if not histogram_a and not histogram_b:
+        return 1.0 if a == b else 0.0
+    dot = sum(count * histogram_b[gram] for gram, count in histogram_a.items() if gram in histogram_b)
+    norm = (math.sqrt(sum(c * c for c in histogram_a.values())) *
+            math.sqrt(sum(c * c for c in histogram_b.values())))
+    return dot / norm if norm else 0.0
+
+# Text similarity backends for compare_content_quality. "sequence" is the original
+# difflib ratio; the others are linear-time approximations of it.
+SIMILARITY_BACKENDS = {
+    "sequence": sequence_similarity,
+    "jaccard": shingle_jaccard_similarity,
+    "minhash": minhash_similarity,
+    "ngram": ngram_histogram_similarity
+}
+
+def text_similarity(a, b, method="sequence", max_chars=None):
+    """
+    Similarity ratio (0-1) between two texts using a SIMILARITY_BACKENDS entry.
+    
+    :param max_chars: Optional bound on the characters compared from each text,
+                      which caps the cost of every backend (including "sequence")
+    """
+    if method not in SIMILARITY_BACKENDS:
+        raise ValueError(f"Unknown similarity method: {method}")
+    return SIMILARITY_BACKENDS[method](_bound_text(a, max_chars), _bound_text(b, max_chars))
+
+def extract_meaningful_content(soup):
+    """Extract meaningful text content, excluding scripts, styles, etc."""
+    # Remove script and style elements
+    for script in soup(["script", "style", "meta", "link", "noscript"]):
+        script.decompose()
+    
+    # Get text and clean it
+    return clean_text(soup.get_text())
+
+def clean_text(text):
+    """Collapse extracted page text into single-spaced phrases."""
+    lines = (line.strip() for line in text.splitlines())
+    chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
+    return ' '.join(chunk for chunk in chunks if chunk)
+
+FRAMEWORK_WEIGHTS = {
+    'React': 35,
+    'Angular': 35,
+    'Vue': 35,
+    'Next.js': 30,
+    'Nuxt': 30,
+    'Svelte': 25,
+    'Ember': 25,
+    'jQuery': 15
+}
+
+def calculate_selenium_need_score(requests_len, selenium_len, frameworks, indicators, content_analysis):
+    """Calculate a score to determine if Selenium is needed (0-100)."""
+    score = 0
+    
+    # Framework scoring
+    for framework in frameworks:
+        score += FRAMEWORK_WEIGHTS.get(framework, 10)
+    
+    # Dynamic indicators scoring
+    score += len(indicators) * 8
+    
+    # Content analysis scoring
+    if content_analysis.get("text_diff_ratio", 0) > 0.3:  # 30% text difference
+        score += 25
+    
+    if content_analysis.get("element_count_diff", 0) > 0.5:  # 50% more elements
+        score += 20
+    
+    if content_analysis.get("important_content_missing", False):
+        score += 30
+    
+    score += len(content_analysis.get("new_content_types", [])) * 15
+    
+    # Length-based scoring (less weight than before)
+    if selenium_len > requests_len * 2:
+        score += 20
+    elif selenium_len > requests_len * 1.5:
+        score += 10
+    
+    # Cap the score at 100
+    return min(score, 100)
+
+# Most points each browser-side scoring stage can add to calculate_selenium_need_score
+SCORE_STAGE_MAX_POINTS = {
+    "dom_comparison": 15 * 2 + 20 + 30,  # new forms/interactive elements, element count, headings
+    "text_similarity": 25
+}
+
+def max_stage_points(stage):
+    if stage == "framework_detection":
+        # Every framework the probe or the HTML scan could report
+        names = set(FRAMEWORK_FINGERPRINTS) | {label for label, _, _ in FRAMEWORK_SIGNATURES}
+        return sum(FRAMEWORK_WEIGHTS.get(name, 10) for name in names)
+    return SCORE_STAGE_MAX_POINTS[stage]
+
+def score_bounds(requests_len, selenium_len, frameworks, indicators, content_analysis, pending=()):
+    """
+    Lowest and highest score calculate_selenium_need_score can still reach
+    while the scoring stages in pending have not run yet.
+    """
+    low = calculate_selenium_need_score(requests_len, selenium_len, frameworks, indicators, content_analysis)
+    high = min(100, low + sum(max_stage_points(stage) for stage in pending))
+    return low, high
+
+def verdict_settled(low, high):
+    """Whether every score in [low, high] gives the same needs_selenium verdict."""
+    return low > 50 or high <= 50
+
+def generate_reasons_for_selenium(frameworks, indicators, content_analysis):
+    """Generate human-readable reasons why Selenium is needed."""
+    reasons = []
+    
+    if frameworks:
+        reasons.append(f"JavaScript frameworks detected: {', '.join(frameworks)}")
+    
+    if indicators:
+        reasons.append(f"Dynamic content indicators: {', '.join(indicators)}")
+    
+    if content_analysis.get("text_diff_ratio", 0) > 0.3:
+        reasons.append("Significant content difference between static and dynamic versions")
+    
+    if content_analysis.get("important_content_missing", False):
+        reasons.append("Important content (headings, structure) missing in static version")
+    
+    if content_analysis.get("new_content_types"):
+        reasons.append(f"Additional interactive elements found: {', '.join(content_analysis['new_content_types'])}")
+    
+    if not reasons:
+        reasons.append("Content is significantly enhanced by JavaScript execution")
+    
+    return reasons
+
+# Fixed-order numeric description of the static HTML, recorded on every result
+# as result["static_features"] and used by SeleniumClassifier
+STATIC_FEATURE_NAMES = (
+    [f"indicator:{label}" for label in _INDICATOR_SCANNER.labels]
+    + [f"framework_tokens:{label}" for label in _FRAMEWORK_SCANNER.labels]
+    + ["log_html_bytes", "log_text_chars", "text_to_markup", "script_share", "log_script_tags",
+       "log_important_elements", "log_tags", "log_headings", "empty_shell"]
+)
+
+# Framework anchor literal -> label; the first signature listing a literal wins
+_FRAMEWORK_TOKEN_LABELS = {literal: label for label, literals, _ in reversed(FRAMEWORK_SIGNATURES)
+                           for literal in literals}
+_FRAMEWORK_TOKENS = re.compile('|'.join(re.escape(literal) for literal in
+                                        sorted(_FRAMEWORK_TOKEN_LABELS, key=len, reverse=True)))
+
+def _script_blocks(lowered):
+    """Number of <script> elements and characters of inline script in lowercased HTML."""
+    count = chars = 0
+    pos = lowered.find('<script')
+    while pos != -1:
+        open_end = lowered.find('>', pos)
+        if open_end == -1:
+            break
+        close = lowered.find('</script', open_end)
+        if close == -1:
+            close = len(lowered)
+        count += 1
+        chars += close - open_end - 1
+        pos = lowered.find('<script', close)
+    return count, chars
+
+def extract_static_features(html, dom_stats, indicators, html_lower=None):
+    """
+    Turn the static HTML signals into a vector ordered like STATIC_FEATURE_NAMES:
+    indicator hits, framework token counts, text-to-markup ratio, inline script
+    share, element counts and whether the page is an empty application shell.
+    Counts are log-scaled so one huge page does not dominate the model.
+    
+    :param dom_stats: extract_dom_stats result for html
+    :param indicators: Dynamic content indicator labels found in html
+    :param html_lower: html.lower(), if the caller already has it
+    """
+    import math
+    
+    lowered = html_lower if html_lower is not None else html.lower()
+    token_counts = dict.fromkeys(_FRAMEWORK_SCANNER.labels, 0)
+    for match in _FRAMEWORK_TOKENS.finditer(lowered):
+        token_counts[_FRAMEWORK_TOKEN_LABELS[match.group()]] += 1
+    script_tags, script_chars = _script_blocks(lowered)
+    
+    html_len = max(len(html), 1)
+    text_len = len(dom_stats["text"])
+    empty_shell = ("SPA root element detected" in indicators
+                   and text_len < STATIC_TIER_THRESHOLDS["max_shell_text"])
+    
+    features = [1.0 if label in indicators else 0.0 for label in _INDICATOR_SCANNER.labels]
+    features += [math.log1p(token_counts[label]) for label in _FRAMEWORK_SCANNER.labels]
+    features += [
+        math.log1p(len(html)),
+        math.log1p(text_len),
+        text_len / html_len,
+        script_chars / html_len,
+        math.log1p(script_tags),
+        math.log1p(dom_stats["important_elements"]),
+        math.log1p(sum(dom_stats["tag_counts"].values())),
+        math.log1p(len(dom_stats["headings"])),
+        1.0 if empty_shell else 0.0
+    ]
+    return [round(value, 6) for value in features]
+
+def _sigmoid(values):
+    import numpy as np
+    
+    return 1.0 / (1.0 + np.exp(-np.clip(values, -30, 30)))
+
+class SeleniumClassifier:
+    """
+    Logistic regression over STATIC_FEATURE_NAMES that predicts needs_selenium
+    from the static HTML alone, so confident pages can skip the browser.
+    
+    Features are standardized with the training mean and spread, and scoring
+    is vectorized with NumPy over whole chunks of feature rows. Models are
+    saved as JSON and refuse to load against a different feature layout.
+    """
+    
+    def __init__(self, weights=None, bias=0.0, mean=None, scale=None):
+        self.weights = weights
+        self.bias = bias
+        self.mean = mean
+        self.scale = scale
+    
+    def fit(self, features, labels, epochs=500, learning_rate=0.5, l2=0.001):
+        """
+        Train with full-batch gradient descent on the L2-regularized log loss.
+        
+        :param features: Rows of static feature vectors
+        :param labels: needs_selenium of each row (True/False)
+        :return: self
+        """
+        import numpy as np
+        
+        X = np.asarray(features, dtype=float)
+        y = np.asarray(labels, dtype=float)
+        self.mean = X.mean(axis=0)
+        self.scale = X.std(axis=0)
+        self.scale[self.scale == 0] = 1.0
+        Z = (X - self.mean) / self.scale
+        
+        weights = np.zeros(Z.shape[1])
+        bias = 0.0
+        for _ in range(epochs):
+            error = _sigmoid(Z @ weights + bias) - y
+            weights -= learning_rate * (Z.T @ error / len(y) + l2 * weights)
+            bias -= learning_rate * error.mean()
+        self.weights = weights
+        self.bias = float(bias)
+        return self
+    
+    def predict_proba(self, features):
+        """Probability that each row of features needs Selenium, as a NumPy array."""
+        import numpy as np
+        
+        if self.weights is None:
+            raise ValueError("SeleniumClassifier has not been trained")
+        X = np.atleast_2d(np.asarray(features, dtype=float))
+        if X.shape[1] != len(self.weights):
+            raise ValueError(f"Expected {len(self.weights)} features, got {X.shape[1]}")
+        return _sigmoid(((X - self.mean) / self.scale) @ self.weights + self.bias)
+    
+    def evaluate(self, features, labels, confidence=0.9):
+        """
+        Score held-out rows.
+        
+        :param confidence: Pre-screen confidence to report coverage for, as used by
+                           analyze_website(classifier_confidence=...)
+        :return: Dict with samples, accuracy, precision, recall, log_loss and, for the
+                 rows the pre-screen would decide at that confidence, their share and accuracy
+        """
+        import numpy as np
+        
+        y = np.asarray(labels, dtype=bool)
+        probabilities = self.predict_proba(features)
+        predicted = probabilities >= 0.5
+        true_positive = int(np.sum(predicted & y))
+        clipped = np.clip(probabilities, 1e-9, 1 - 1e-9)
+        confident = np.maximum(probabilities, 1 - probabilities) >= confidence
+        
+        return {
+            "samples": int(len(y)),
+            "accuracy": float(np.mean(predicted == y)),
+            "precision": true_positive / int(np.sum(predicted)) if predicted.any() else 0.0,
+            "recall": true_positive / int(np.sum(y)) if y.any() else 0.0,
+            "log_loss": float(-np.mean(y * np.log(clipped) + (~y) * np.log(1 - clipped))),
+            "confident_share": float(np.mean(confident)),
+            "confident_accuracy": float(np.mean(predicted[confident] == y[confident])) if confident.any() else 0.0
+        }
+    
+    def save(self, path):
+        """Write the model as JSON."""
+        model = {
+            "feature_names": STATIC_FEATURE_NAMES,
+            "weights": [float(value) for value in self.weights],
+            "bias": self.bias,
+            "mean": [float(value) for value in self.mean],
+            "scale": [float(value) for value in self.scale]
+        }
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(model, f, indent=2)
+    
+    @classmethod
+    def load(cls, path):
+        """Load a model written by save()."""
+        import numpy as np
+        
+        with open(path, encoding='utf-8') as f:
+            model = json.load(f)
+        if model.get("feature_names") != STATIC_FEATURE_NAMES:
+            raise ValueError(f"{path} was trained on a different feature layout; retrain it")
+        return cls(np.asarray(model["weights"]), model["bias"],
+                   np.asarray(model["mean"]), np.asarray(model["scale"]))
+
+def training_data_from_results(results):
+    """
+    Collect (features, labels) from finished results that were decided by a
+    full browser analysis and carry static_features.
+    
+    :param results: Iterable of result dicts, e.g. VerdictCache.iter_results()
+                    or read_jsonl_results(path)
+    """
+    features = []
+    labels = []
+    for result in results:
+        if result.get("error") or result.get("decided_by") != "browser":
+            continue
+        vector = result.get("static_features")
+        if not vector or len(vector) != len(STATIC_FEATURE_NAMES):
+            continue
+        features.append(vector)
+        labels.append(bool(result["needs_selenium"]))
+    return features, labels
+
+def train_classifier(results, test_fraction=0.2, seed=0, confidence=0.9, **fit_options):
+    """
+    Train a SeleniumClassifier offline from finished results and evaluate it on a held-out split.
+    
+    :param results: Iterable of result dicts (see training_data_from_results)
+    :param test_fraction: Share of rows held out for evaluation
+    :param confidence: Pre-screen confidence the evaluation reports coverage for
+    :return: Tuple of (classifier, evaluation dict with train_samples added)
+    """
+    import numpy as np
+    
+    features, labels = training_data_from_results(results)
+    if len(set(labels)) < 2:
+        raise ValueError("Training needs browser-decided results with both verdicts")
+    
+    X = np.asarray(features, dtype=float)
+    y = np.asarray(labels, dtype=bool)
+    order = np.random.default_rng(seed).permutation(len(y))
+    test_count = int(len(y) * test_fraction)
+    test, train = order[:test_count], order[test_count:]
+    
+    classifier = SeleniumClassifier().fit(X[train], y[train], **fit_options)
+    evaluation = classifier.evaluate(X[test], y[test], confidence) if test_count else {}
+    evaluation["train_samples"] = int(len(train))
+    return classifier, evaluation
+
+def classify_static_results(results, classifier, chunk_size=1024):
+    """
+    Score stored results by their static_features, a chunk of rows at a time.
+    
+    :return: Generator of (result, probability that the page needs Selenium);
+             results without static_features are skipped
+    """
+    chunk = []
+    for result in results:
+        if len(result.get("static_features") or ()) != len(STATIC_FEATURE_NAMES):
+            continue
+        chunk.append(result)
+        if len(chunk) >= chunk_size:
+            yield from zip(chunk, classifier.predict_proba([r["static_features"] for r in chunk]).tolist())
+            chunk = []
+    if chunk:
+        yield from zip(chunk, classifier.predict_proba([r["static_features"] for r in chunk]).tolist())
+
+# CDP Network.setBlockedURLs patterns for the resource-blocking profiles. The
+# analysis only needs the DOM and script execution, not what the page looks like.
+_IMAGE_PATTERNS = ["*.png*", "*.jpg*", "*.jpeg*", "*.gif*", "*.webp*", "*.avif*", "*.svg*", "*.ico*", "*.bmp*"]
+_FONT_PATTERNS = ["*.woff*", "*.woff2*", "*.ttf*", "*.otf*", "*.eot*"]
+_MEDIA_PATTERNS = ["*.mp4*", "*.webm*", "*.mp3*", "*.ogg*", "*.wav*", "*.m4a*", "*.m3u8*", "*.mov*"]
+_STYLESHEET_PATTERNS = ["*.css*"]
+_TRACKER_PATTERNS = [
+    "*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*", "*googlesyndication.com*",
+    "*adservice.google.*", "*connect.facebook.net*", "*hotjar.com*", "*segment.io*", "*segment.com/analytics*",
+    "*scorecardresearch.com*", "*quantserve.com*", "*criteo.com*", "*taboola.com*", "*outbrain.com*",
+    "*amazon-adsystem.com*", "*adnxs.com*", "*mixpanel.com*", "*newrelic.com*", "*nr-data.net*"
+]
+
+BLOCKING_PROFILES = {
+    # Images, fonts, media and analytics/ad hosts; layout-dependent scripts still see the CSS
+    "lean": _IMAGE_PATTERNS + _FONT_PATTERNS + _MEDIA_PATTERNS + _TRACKER_PATTERNS,
+    # Also drops stylesheets, which can change what lazy-loading scripts consider visible
+    "minimal": _IMAGE_PATTERNS + _FONT_PATTERNS + _MEDIA_PATTERNS + _TRACKER_PATTERNS + _STYLESHEET_PATTERNS
+}
+
+def resolve_blocking_profile(block_resources):
+    """
+    Turn a block_resources option into (profile name, URL patterns).
+    
+    :param block_resources: None, a BLOCKING_PROFILES name, or a list of URL patterns
+    """
+    if not block_resources:
+        return None, []
+    if isinstance(block_resources, str):
+        if block_resources not in BLOCKING_PROFILES:
+            raise ValueError(f"Unknown blocking profile: {block_resources}")
+        return block_resources, list(BLOCKING_PROFILES[block_resources])
+    return "custom", list(block_resources)
+
+def apply_resource_blocking(driver, patterns):
+    """Install (or, with no patterns, clear) CDP URL blocking on a driver; a no-op when unchanged."""
+    patterns = list(patterns)
+    if getattr(driver, "_sda_blocked_urls", []) == patterns:
+        return
+    driver.execute_cdp_cmd("Network.enable", {})
+    driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": patterns})
+    driver._sda_blocked_urls = patterns
+
+def drain_performance_log(driver):
+    """Return and clear the buffered Chrome performance log, or None when it is not enabled."""
+    try:
+        return driver.get_log("performance")
+    except Exception:
+        return None
+
+def summarize_network_log(entries):
+    """Count loaded and blocked requests and transferred bytes in performance log entries."""
+    from collections import Counter
+    
+    summary = {"requests": 0, "transferred_bytes": 0, "blocked_requests": 0}
+    blocked_by_type = Counter()
+    for entry in entries:
+        try:
+            message = json.loads(entry["message"])["message"]
+        except (KeyError, TypeError, ValueError):
+            continue
+        method = message.get("method")
+        params = message.get("params", {})
+        if method == "Network.loadingFinished":
+            summary["requests"] += 1
+            summary["transferred_bytes"] += int(params.get("encodedDataLength") or 0)
+        elif method == "Network.loadingFailed" and params.get("blockedReason"):
+            summary["blocked_requests"] += 1
+            blocked_by_type[params.get("type", "Other")] += 1
+    summary["blocked_by_type"] = dict(blocked_by_type)
+    return summary
+
+API_CALL_KINDS = ("json_api", "graphql", "html_fragment", "other")
+
+def classify_api_call(url, mime_type, post_data=None):
+    """Classify one XHR/fetch response as "json_api", "graphql", "html_fragment" or "other"."""
+    parts = urlparse(url)
+    mime_type = (mime_type or "").lower()
+    if ("graphql" in parts.path.lower()
+            or (post_data and '"query"' in post_data and '{' in post_data)
+            or any(key == "query" and value.lstrip().startswith(("{", "query", "mutation"))
+                   for key, value in parse_qsl(parts.query))):
+        return "graphql"
+    if "json" in mime_type:
+        return "json_api"
+    if mime_type in ("text/html", "application/xhtml+xml"):
+        return "html_fragment"
+    return "other"
+
+def classify_network_traffic(entries, page_url=None, max_calls=50):
+    """
+    Summarize the XHR/fetch traffic in Chrome performance log entries.
+    
+    Each call is classified with classify_api_call and reported with its method,
+    status, transferred and decoded sizes, and start time and duration (ms) from
+    the navigation start. A JSON or GraphQL call that returned 200 over GET (or
+    a GraphQL POST whose body was recorded) is marked replayable: plain HTTP
+    requests can fetch the data the page renders.
+    
+    :param page_url: URL of the analyzed page, for same_origin
+    :param max_calls: Most calls listed in api_calls, largest first (all are counted)
+    :return: Dict with counts per kind, api_calls, api_bytes, transferred_bytes,
+             dynamic_load_ms (navigation start to the last API response) and
+             replayable_endpoints
+    """
+    requests_seen = {}
+    navigation_start = None
+    transferred_bytes = 0
+    
+    for entry in entries:
+        try:
+            message = json.loads(entry["message"])["message"]
+        except (KeyError, TypeError, ValueError):
+            continue
+        method = message.get("method")
+        params = message.get("params", {})
+        request_id = params.get("requestId")
+        
+        if method == "Network.requestWillBeSent":
+            request = params.get("request", {})
+            if params.get("type") == "Document" and navigation_start is None:
+                navigation_start = params.get("timestamp")
+            requests_seen[request_id] = {
+                "url": request.get("url"),
+                "method": request.get("method", "GET"),
+                "post_data": request.get("postData"),
+                "type": params.get("type"),
+                "started": params.get("timestamp"),
+                "body_bytes": 0
+            }
+        elif request_id in requests_seen:
+            call = requests_seen[request_id]
+            if method == "Network.responseReceived":
+                response = params.get("response", {})
+                call["type"] = params.get("type") or call["type"]
+                call["status"] = response.get("status")
+                call["mime_type"] = response.get("mimeType")
+            elif method == "Network.dataReceived":
+                call["body_bytes"] += int(params.get("dataLength") or 0)
+            elif method == "Network.loadingFinished":
+                call["bytes"] = int(params.get("encodedDataLength") or 0)
+                call["finished"] = params.get("timestamp")
+                transferred_bytes += call["bytes"]
+            elif method == "Network.loadingFailed":
+                call["failed"] = params.get("errorText") or True
+    
+    if navigation_start is None:
+        starts = [call["started"] for call in requests_seen.values() if call.get("started") is not None]
+        navigation_start = min(starts) if starts else 0
+    page_origin = urlparse(page_url)[:2] if page_url else None
+    
+    counts = dict.fromkeys(API_CALL_KINDS, 0)
+    calls = []
+    for call in requests_seen.values():
+        if call["type"] not in ("XHR", "Fetch") or "status" not in call:
+            continue
+        kind = classify_api_call(call["url"], call.get("mime_type"), call["post_data"])
+        counts[kind] += 1
+        started_ms = (call["started"] - navigation_start) * 1000 if call.get("started") is not None else None
+        duration_ms = ((call["finished"] - call["started"]) * 1000
+                       if call.get("finished") is not None and call.get("started") is not None else None)
+        calls.append({
+            "url": call["url"],
+            "kind": kind,
+            "method": call["method"],
+            "status": call["status"],
+            "mime_type": call.get("mime_type"),
+            "bytes": call.get("bytes", 0),
+            "body_bytes": call["body_bytes"],
+            "started_ms": round(started_ms, 1) if started_ms is not None else None,
+            "duration_ms": round(duration_ms, 1) if duration_ms is not None else None,
+            "same_origin": page_origin is not None and urlparse(call["url"])[:2] == page_origin,
+            "replayable": (kind in ("json_api", "graphql") and call["status"] == 200 and not call.get("failed")
+                           and (call["method"] == "GET" or (kind == "graphql" and bool(call["post_data"]))))
+        })
+    
+    finishes = [call["started_ms"] + call["duration_ms"] for call in calls
+                if call["kind"] != "other" and call["started_ms"] is not None and call["duration_ms"] is not None]
+    calls.sort(key=lambda call: call["body_bytes"], reverse=True)
+    return {
+        "counts": counts,
+        "api_calls": calls[:max_calls],
+        "api_bytes": sum(call["bytes"] for call in calls if call["kind"] != "other"),
+        "transferred_bytes": transferred_bytes,
+        "dynamic_load_ms": round(max(finishes), 1) if finishes else 0,
+        "replayable_endpoints": sum(1 for call in calls if call["replayable"])
+    }
+
+def build_chrome_options(headless=True, performance_log=False, page_load_strategy=None):
+    """
+    Build the Chrome options used for every analysis session.
+    
+    :param performance_log: Record the DevTools performance log (network events)
+    :param page_load_strategy: Optional WebDriver page load strategy; with "none",
+                               get() returns at once and background tabs keep
+                               running at full speed (used by TabPool)
+    """
+    from selenium.webdriver.chrome.options import Options
+    
+    options = Options()
+    if headless:
+        options.add_argument("--headless")
+    options.add_argument("--disable-gpu")
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+    options.add_argument("--disable-blink-features=AutomationControlled")
+    options.add_experimental_option("excludeSwitches", ["enable-automation"])
+    options.add_experimental_option('useAutomationExtension', False)
+    if performance_log:
+        options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+    if page_load_strategy:
+        options.page_load_strategy = page_load_strategy
+    if page_load_strategy == "none":
+        options.add_argument("--disable-background-timer-throttling")
+        options.add_argument("--disable-backgrounding-occluded-windows")
+        options.add_argument("--disable-renderer-backgrounding")
+    return options
+
+def launch_chrome_driver(headless=True, performance_log=False, page_load_strategy=None):
+    """Start a new Chrome session configured for analysis."""
+    from selenium import webdriver
+    
+    driver = webdriver.Chrome(options=build_chrome_options(headless, performance_log, page_load_strategy))
+    driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
+    return driver
+
+def reset_driver(driver):
+    """Clear cookies and storage left behind by the previous URL and park the driver on a blank page."""
+    # Storage is per-origin, so it has to be cleared before leaving the page
+    driver.execute_script("""
+        try { window.localStorage.clear(); } catch (e) {}
+        try { window.sessionStorage.clear(); } catch (e) {}
+    """)
+    try:
+        driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+    except Exception:
+        driver.delete_all_cookies()
+    driver.get("about:blank")
+
+def release_driver(driver, driver_pool=None, failed=False):
+    """Return a driver to its pool, or quit it when it was launched for a single URL."""
+    if driver_pool is not None:
+        driver_pool.release(driver, failed=failed)
+        return
+    try:
+        driver.quit()
+    except Exception:
+        # A session that cannot quit cleanly still must not leave Chrome running
+        kill_driver(driver)
+
+# Chrome's own page load timeout, restored on pooled drivers after a budgeted URL
+DEFAULT_PAGE_LOAD_TIMEOUT = 300
+
+def kill_process_tree(pid):
+    """
+    Kill a process and all of its descendants (chromedriver and its Chrome processes).
+    
+    Uses psutil when installed, the /proc parent links on Linux, and taskkill on Windows.
+    
+    :return: Number of processes signalled
+    """
+    import os
+    import signal
+    
+    if os.name == 'nt':
+        import subprocess
+        subprocess.run(['taskkill', '/F', '/T', '/PID', str(pid)], capture_output=True)
+        return 1
+    
+    try:
+        import psutil
+    except ImportError:
+        psutil = None
+    
+    if psutil is not None:
+        try:
+            root = psutil.Process(pid)
+            tree = root.children(recursive=True) + [root]
+        except psutil.NoSuchProcess:
+            return 0
+        pids = [process.pid for process in tree]
+    else:
+        children = {}
+        if os.path.isdir('/proc'):
+            for entry in os.listdir('/proc'):
+                if not entry.isdigit():
+                    continue
+                try:
+                    with open(f'/proc/{entry}/stat') as f:
+                        parent = int(f.read().rsplit(')', 1)[1].split()[1])
+                except (OSError, ValueError, IndexError):
+                    continue
+                children.setdefault(parent, []).append(int(entry))
+        pids = [pid]
+        for current in pids:
+            pids.extend(children.get(current, []))
+    
+    # Children first, so none is re-parented and missed
+    killed = 0
+    for target in reversed(pids):
+        try:
+            os.kill(target, signal.SIGKILL)
+            killed += 1
+        except OSError:
+            pass
+    return killed
+
+def kill_driver(driver):
+    """Forcefully end a driver that may be blocked: a TabDriver's tab, or a whole Chrome session."""
+    if hasattr(driver, "kill"):
+        driver.kill()
+        return
+    process = getattr(getattr(driver, "service", None), "process", None)
+    if process is not None:
+        kill_process_tree(process.pid)
+
+class _Watch:
+    def __init__(self, driver, expires_at):
+        self.driver = driver
+        self.expires_at = expires_at
+        self.cancelled = False
+        self.killed = False
+
+class SessionWatchdog:
+    """
+    Background thread that kills drivers still in use past their deadline.
+    
+    A thread blocked in driver.get() cannot be cancelled, but killing the
+    browser makes the blocked WebDriver call fail, which frees the worker.
+    """
+    
+    def __init__(self):
+        self._entries = []
+        self._cond = threading.Condition()
+        self._thread = None
+        self._counter = 0
+        self.kills = 0
+    
+    def watch(self, driver, seconds):
+        """Kill driver after seconds unless cancel() is called first; returns a watch handle."""
+        import heapq
+        
+        watch = _Watch(driver, time.monotonic() + seconds)
+        with self._cond:
+            self._counter += 1
+            heapq.heappush(self._entries, (watch.expires_at, self._counter, watch))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        return watch
+    
+    def cancel(self, watch):
+        """Stop watching; returns whether the driver was already killed."""
+        with self._cond:
+            watch.cancelled = True
+            return watch.killed
+    
+    def _run(self):
+        import heapq
+        
+        while True:
+            with self._cond:
+                while self._entries and self._entries[0][2].cancelled:
+                    heapq.heappop(self._entries)
+                if not self._entries:
+                    self._cond.wait()
+                    continue
+                wait = self._entries[0][0] - time.monotonic()
+                if wait > 0:
+                    self._cond.wait(timeout=wait)
+                    continue
+                # Kill under the lock, so cancel() never returns while a kill is still under way
+                _, _, watch = heapq.heappop(self._entries)
+                watch.killed = True
+                self.kills += 1
+                try:
+                    kill_driver(watch.driver)
+                except Exception:
+                    pass
+
+SESSION_WATCHDOG = SessionWatchdog()
+
+class DriverPool:
+    """
+    Thread-safe pool of warm Chrome drivers shared across batch workers.
+    
+    Drivers are leased for one URL at a time and reset before they are handed
+    out again. A driver is recycled (quit and replaced on demand) after
+    ``max_uses`` leases, or when it stops responding after a failed analysis.
+    """
+    
+    def __init__(self, max_size=3, headless=True, max_uses=25, driver_factory=None, performance_log=False):
+        """
+        :param max_size: Maximum number of live drivers
+        :param headless: Launch drivers in headless mode
+        :param max_uses: Number of URLs a driver serves before it is recycled
+        :param driver_factory: Optional callable returning a new driver (default: launch_chrome_driver)
+        :param performance_log: Launch drivers with the DevTools performance log enabled
+        """
+        self.max_size = max_size
+        self.max_uses = max_uses
+        self.driver_factory = driver_factory or (lambda: launch_chrome_driver(headless, performance_log))
+        self._idle = []
+        self._uses = {}
+        self._size = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "launches": 0,
+            "launch_time_total": 0.0,
+            "recycled": 0,
+            "crashed": 0,
+        }
+    
+    def acquire(self):
+        """Lease a driver, launching a new one only when no warm driver is idle."""
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError("Driver pool is closed")
+                if self._idle:
+                    self._stats["hits"] += 1
+                    return self._idle.pop()
+                if self._size < self.max_size:
+                    self._size += 1
+                    self._stats["misses"] += 1
+                    break
+                self._cond.wait()
+        
+        # Launch outside the lock so other workers can keep leasing idle drivers
+        start = time.time()
+        try:
+            driver = self.driver_factory()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        
+        with self._cond:
+            self._stats["launches"] += 1
+            self._stats["launch_time_total"] += time.time() - start
+            self._uses[driver] = 0
+        return driver
+    
+    def release(self, driver, failed=False):
+        """Return a leased driver, resetting it for reuse or retiring it."""
+        with self._cond:
+            self._uses[driver] = self._uses.get(driver, 0) + 1
+            worn_out = self._uses[driver] >= self.max_uses
+            closed = self._closed
+        
+        retire_reason = None
+        if closed:
+            retire_reason = "closed"
+        elif failed and not self._is_alive(driver):
+            retire_reason = "crashed"
+        elif worn_out:
+            retire_reason = "recycled"
+        else:
+            try:
+                reset_driver(driver)
+            except Exception:
+                retire_reason = "crashed"
+        
+        if retire_reason:
+            try:
+                driver.quit()
+            except Exception:
+                pass
+        
+        with self._cond:
+            if retire_reason:
+                self._uses.pop(driver, None)
+                self._size -= 1
+                if retire_reason in self._stats:
+                    self._stats[retire_reason] += 1
+            else:
+                self._idle.append(driver)
+            self._cond.notify()
+    
+    def _is_alive(self, driver):
+        try:
+            driver.execute_script("return 1")
+            return True
+        except Exception:
+            return False
+    
+    def stats(self):
+        """Return pool hit/miss counters and launch-time statistics."""
+        with self._cond:
+            stats = dict(self._stats)
+            stats["live_drivers"] = self._size
+        leases = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / leases if leases else 0
+        stats["avg_launch_time"] = (stats["launch_time_total"] / stats["launches"]
+                                    if stats["launches"] else 0)
+        return stats
+    
+    def close(self):
+        """Quit all idle drivers; drivers still leased are quit when released."""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            for driver in idle:
+                self._uses.pop(driver, None)
+            self._cond.notify_all()
+        for driver in idle:
+            try:
+                driver.quit()
+            except Exception:
+                pass
+
+class TabDriver:
+    """
+    One isolated tab of a TabPool browser.
+    
+    Exposes the part of the WebDriver API the analysis uses. The browser has a
+    single WebDriver session, so every command switches it to this tab under
+    the pool's browser lock; page loads still run concurrently in the browser.
+    """
+    
+    def __init__(self, pool, handle, target_id, context_id):
+        self.pool = pool
+        self.handle = handle
+        self.target_id = target_id
+        self.context_id = context_id
+        self.leased_at = time.monotonic()
+        self.killed = False
+        self._log = []
+    
+    def _run(self, command):
+        return self.pool._run_in_tab(self, command)
+    
+    def get(self, url, timeout=10):
+        """Start loading url and return once the tab has left about:blank (the page loads on)."""
+        self._run(lambda browser: browser.get(url))
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self._run(lambda browser: browser.execute_script("return location.href")) != "about:blank":
+                return
+            time.sleep(0.05)
+    
+    @property
+    def page_source(self):
+        return self._run(lambda browser: browser.page_source)
+    
+    @property
+    def current_url(self):
+        return self._run(lambda browser: browser.current_url)
+    
+    def execute_script(self, script, *args):
+        return self._run(lambda browser: browser.execute_script(script, *args))
+    
+    def execute_cdp_cmd(self, cmd, cmd_args):
+        return self._run(lambda browser: browser.execute_cdp_cmd(cmd, cmd_args))
+    
+    def get_log(self, log_type):
+        """Entries of a browser log that belong to this tab (the browser-wide log is split per tab)."""
+        return self.pool._tab_log(self, log_type)
+    
+    def kill(self):
+        """Close the tab from outside the WebDriver session, even while a command on it hangs."""
+        if not self.killed:
+            self.pool._kill_tab(self)
+    
+    def quit(self):
+        self.pool.release(self)
+
+class TabPool:
+    """
+    Many concurrent renders in one long-lived Chrome process.
+    
+    Each lease gets a fresh tab in its own browser context (created over CDP
+    with Target.createBrowserContext / Target.createTarget), so cookies and
+    storage are isolated without resetting anything. The browser uses the
+    "none" page load strategy, so tabs load in parallel while commands for
+    other tabs are served. At most ``max_tabs`` tabs are open at once, and a
+    watchdog closes tabs leased for longer than ``tab_timeout`` seconds
+    through the DevTools HTTP endpoint, which works even while a command on
+    the hung tab is still blocking the WebDriver session.
+    
+    TabPool has the acquire/release interface of DriverPool and can be passed
+    anywhere a driver_pool is accepted.
+    """
+    
+    def __init__(self, max_tabs=8, headless=True, tab_timeout=60, max_uses=500,
+                 performance_log=False, browser_factory=None):
+        """
+        :param max_tabs: Maximum number of tabs open at once
+        :param headless: Launch the browser in headless mode
+        :param tab_timeout: Seconds a tab may stay leased before the watchdog closes it
+        :param max_uses: Tabs served before the browser is restarted (once it is idle)
+        :param performance_log: Launch the browser with the DevTools performance log enabled
+        :param browser_factory: Optional callable returning a new browser driver
+        """
+        self.max_tabs = max_tabs
+        self.tab_timeout = tab_timeout
+        self.max_uses = max_uses
+        self.browser_factory = browser_factory or (
+            lambda: launch_chrome_driver(headless, performance_log, page_load_strategy="none"))
+        
+        self._browser = None
+        self._current_handle = None
+        self._debugger_address = None
+        self._log_buffers = {}
+        self._served = 0
+        self._tabs = set()
+        self._opening = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._browser_lock = threading.RLock()
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "launches": 0,
+            "launch_time_total": 0.0,
+            "recycled": 0,
+            "crashed": 0,
+            "tabs_killed": 0,
+            "peak_tabs": 0,
+        }
+        
+        self._watchdog = threading.Thread(target=self._watch, daemon=True)
+        self._watchdog.start()
+    
+    def acquire(self):
+        """Open a new isolated tab, waiting while max_tabs are already open."""
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError("Tab pool is closed")
+                busy = len(self._tabs) + self._opening
+                # A browser due for a restart takes no new tabs until its open tabs finish
+                draining = self._served >= self.max_uses and busy > 0
+                if busy < self.max_tabs and not draining:
+                    self._opening += 1
+                    break
+                self._cond.wait()
+        
+        try:
+            tab = self._open_tab()
+        except Exception:
+            with self._cond:
+                self._opening -= 1
+                self._cond.notify_all()
+            raise
+        
+        with self._cond:
+            self._opening -= 1
+            self._tabs.add(tab)
+            self._served += 1
+            self._stats["peak_tabs"] = max(self._stats["peak_tabs"], len(self._tabs))
+        return tab
+    
+    def _open_tab(self):
+        with self._browser_lock:
+            launched = False
+            if self._browser is not None and self._served >= self.max_uses:
+                self._quit_browser()
+                self._stats["recycled"] += 1
+            if self._browser is None:
+                self._launch_browser()
+                launched = True
+            
+            try:
+                tab = self._create_tab()
+            except Exception:
+                if launched:
+                    raise
+                # The browser died under us; start a new one and try once more
+                self._quit_browser()
+                self._stats["crashed"] += 1
+                self._launch_browser()
+                launched = True
+                tab = self._create_tab()
+            
+            self._stats["misses" if launched else "hits"] += 1
+            return tab
+    
+    def _launch_browser(self):
+        start = time.time()
+        self._browser = self.browser_factory()
+        self._current_handle = None
+        self._served = 0
+        self._log_buffers = {}
+        try:
+            self._debugger_address = self._browser.capabilities.get(
+                "goog:chromeOptions", {}).get("debuggerAddress")
+        except Exception:
+            self._debugger_address = None
+        self._stats["launches"] += 1
+        self._stats["launch_time_total"] += time.time() - start
+    
+    def _quit_browser(self):
+        browser, self._browser = self._browser, None
+        self._current_handle = None
+        try:
+            browser.quit()
+        except Exception:
+            pass
+    
+    def _create_tab(self):
+        browser = self._browser
+        context_id = browser.execute_cdp_cmd("Target.createBrowserContext", {})["browserContextId"]
+        target_id = browser.execute_cdp_cmd(
+            "Target.createTarget", {"url": "about:blank", "browserContextId": context_id})["targetId"]
+        # ChromeDriver names windows after their DevTools target id
+        handle = next((handle for handle in browser.window_handles if handle.endswith(target_id)), target_id)
+        self._log_buffers[target_id] = []
+        return TabDriver(self, handle, target_id, context_id)
+    
+    def _run_in_tab(self, tab, command):
+        with self._browser_lock:
+            if tab.killed:
+                raise RuntimeError("Tab was closed by the watchdog")
+            if self._current_handle != tab.handle:
+                self._browser.switch_to.window(tab.handle)
+                self._current_handle = tab.handle
+            return command(self._browser)
+    
+    def _tab_log(self, tab, log_type):
+        with self._browser_lock:
+            for entry in self._browser.get_log(log_type):
+                try:
+                    target_id = json.loads(entry["message"]).get("webview")
+                except (KeyError, TypeError, ValueError):
+                    continue
+                buffer = self._log_buffers.get(target_id)
+                if buffer is not None:
+                    buffer.append(entry)
+            entries = self._log_buffers.get(tab.target_id, [])
+            self._log_buffers[tab.target_id] = []
+            return entries
+    
+    def release(self, tab, failed=False):
+        """Close a tab and dispose of its browser context."""
+        with self._browser_lock:
+            if self._browser is not None:
+                if not tab.killed:
+                    try:
+                        self._browser.execute_cdp_cmd("Target.closeTarget", {"targetId": tab.target_id})
+                    except Exception:
+                        pass
+                try:
+                    self._browser.execute_cdp_cmd("Target.disposeBrowserContext",
+                                                  {"browserContextId": tab.context_id})
+                except Exception:
+                    pass
+                if self._current_handle == tab.handle:
+                    self._current_handle = None
+                self._log_buffers.pop(tab.target_id, None)
+        tab.killed = True
+        
+        with self._cond:
+            self._tabs.discard(tab)
+            self._cond.notify_all()
+    
+    def _watch(self):
+        while True:
+            with self._cond:
+                if self._closed:
+                    return
+                self._cond.wait(timeout=min(1.0, self.tab_timeout / 4))
+                now = time.monotonic()
+                hung = [tab for tab in self._tabs
+                        if not tab.killed and now - tab.leased_at > self.tab_timeout]
+            for tab in hung:
+                self._kill_tab(tab)
+    
+    def _kill_tab(self, tab):
+        """Close a hung tab without the browser lock, which its blocked command may be holding."""
+        import requests
+        
+        tab.killed = True
+        address = self._debugger_address
+        if address:
+            try:
+                requests.get(f"http://{address}/json/close/{tab.target_id}", timeout=2)
+            except Exception:
+                pass
+        with self._cond:
+            self._stats["tabs_killed"] += 1
+    
+    def stats(self):
+        """Return lease counters in the same shape as DriverPool.stats()."""
+        with self._cond:
+            stats = dict(self._stats)
+            stats["open_tabs"] = len(self._tabs)
+            stats["live_drivers"] = 1 if self._browser is not None else 0
+        leases = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / leases if leases else 0
+        stats["avg_launch_time"] = (stats["launch_time_total"] / stats["launches"]
+                                    if stats["launches"] else 0)
+        return stats
+    
+    def close(self):
+        """Close the browser; tabs still leased fail on their next command."""
+        with self._cond:
+            self._closed = True
+            for tab in self._tabs:
+                tab.killed = True
+            self._cond.notify_all()
+        with self._browser_lock:
+            if self._browser is not None:
+                self._quit_browser()
+
+def normalize_url(url):
+    """Canonical form of a URL: lowercase scheme/host, no default port, fragment or query order."""
+    url = url.strip()
+    if not url.lower().startswith(('http://', 'https://')):
+        url = 'https://' + url
+    
+    parts = urlparse(url)
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    netloc = host
+    if parts.port and (scheme, parts.port) not in (('http', 80), ('https', 443)):
+        netloc = f"{host}:{parts.port}"
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunparse((scheme, netloc, parts.path or '/', parts.params, query, ''))
+
+def analysis_mode(result):
+    """
+    How thoroughly a result was decided: "full" (every browser stage ran),
+    "early_exit", "estimated" (static_early_exit), "static" (static tier),
+    "classifier" or "partial" (timed out).
+    """
+    decided_by = result.get("decided_by", "browser")
+    if result.get("timed_out") or decided_by == "timeout":
+        return "partial"
+    if decided_by == "classifier":
+        return "classifier"
+    if result.get("estimated"):
+        return "estimated"
+    if result.get("skipped_stages"):
+        return "early_exit"
+    if decided_by == "browser":
+        return "full"
+    return decided_by
+
+def accepted_analysis_modes(tiered=False, early_exit=False, classifier=None, static_early_exit=False):
+    """Analysis modes whose cached verdicts a run with these options may reuse."""
+    modes = {"full"}
+    if early_exit:
+        modes.add("early_exit")
+    if static_early_exit:
+        modes.add("estimated")
+    if tiered:
+        modes.add("static")
+    if classifier is not None:
+        modes.add("classifier")
+    return modes
+
+class VerdictCache:
+    """
+    On-disk (SQLite) cache of finished analysis results.
+    
+    Entries are keyed by normalized URL and indexed by a hash of the static
+    HTML, expire after ``ttl`` seconds and are evicted least-recently-used
+    once the cache holds more than ``max_entries`` results. Each entry records
+    its analysis_mode, so a run can refuse verdicts cheaper than it would have
+    produced itself. Results that ended in an error or timed out are never stored.
+    """
+    
+    def __init__(self, path="verdict_cache.db", ttl=24 * 3600, max_entries=100000):
+        """
+        :param path: SQLite database file
+        :param ttl: Seconds a cached verdict stays valid
+        :param max_entries: Maximum number of cached results before LRU eviction
+        """
+        import sqlite3
+        
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS verdicts (
+                url_key TEXT PRIMARY KEY,
+                content_hash TEXT,
+                result TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                analysis_mode TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_verdicts_content_hash ON verdicts (content_hash);
+            CREATE INDEX IF NOT EXISTS idx_verdicts_accessed_at ON verdicts (accessed_at);
+        """)
+        # Older caches lack the validator and mode columns; their rows get the mode from the result
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(verdicts)")}
+        for column in ("etag", "last_modified", "analysis_mode"):
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE verdicts ADD COLUMN {column} TEXT")
+        self._conn.commit()
+        self._stats = {"url_hits": 0, "content_hits": 0, "revalidated": 0, "misses": 0,
+                       "mode_misses": 0, "stores": 0, "evictions": 0}
+        self._puts_since_eviction = 0
+    
+    @staticmethod
+    def _accepts(accept, mode, result_json):
+        if accept is None:
+            return True
+        return (mode or analysis_mode(json.loads(result_json))) in accept
+    
+    def _load(self, row, source):
+        url_key, result_json, created_at = row[:3]
+        self._conn.execute("UPDATE verdicts SET accessed_at = ? WHERE url_key = ?", (time.time(), url_key))
+        self._conn.commit()
+        result = json.loads(result_json)
+        result["cache"] = source
+        result["cached_at"] = created_at
+        return result
+    
+    def get(self, url, accept=None):
+        """
+        Return the fresh cached result for url, or None.
+        
+        :param accept: Optional set of analysis modes to reuse (see accepted_analysis_modes);
+                       an entry decided more cheaply counts as a miss
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT url_key, result, created_at, analysis_mode FROM verdicts "
+                "WHERE url_key = ? AND created_at >= ?",
+                (normalize_url(url), time.time() - self.ttl)
+            ).fetchone()
+            if row is not None and not self._accepts(accept, row[3], row[1]):
+                self._stats["mode_misses"] += 1
+                row = None
+            if row is None:
+                self._stats["misses"] += 1
+                return None
+            self._stats["url_hits"] += 1
+            return self._load(row, "url")
+    
+    def get_by_content_hash(self, content_hash, accept=None):
+        """Return a fresh cached result whose static HTML had this hash (and whose mode is accepted), or None."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT url_key, result, created_at, analysis_mode FROM verdicts "
+                "WHERE content_hash = ? AND created_at >= ? ORDER BY created_at DESC",
+                (content_hash, time.time() - self.ttl)
+            ).fetchall()
+            for row in rows:
+                if self._accepts(accept, row[3], row[1]):
+                    self._stats["content_hits"] += 1
+                    return self._load(row, "content")
+            return None
+    
+    def lookup(self, url, accept=None):
+        """
+        Return the cached entry for url even if it has expired, for revalidation.
+        
+        :param accept: Optional set of analysis modes; other entries are treated as absent
+        :return: Dict with result, content_hash, etag, last_modified, analysis_mode and fresh, or None
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT result, content_hash, etag, last_modified, created_at, analysis_mode "
+                "FROM verdicts WHERE url_key = ?",
+                (normalize_url(url),)
+            ).fetchone()
+        if row is None:
+            return None
+        result_json, content_hash, etag, last_modified, created_at, mode = row
+        result = json.loads(result_json)
+        mode = mode or analysis_mode(result)
+        if accept is not None and mode not in accept:
+            return None
+        return {
+            "result": result,
+            "content_hash": content_hash,
+            "etag": etag,
+            "last_modified": last_modified,
+            "analysis_mode": mode,
+            "fresh": created_at >= time.time() - self.ttl
+        }
+    
+    def revalidated(self, url, result):
+        """Record that the server confirmed a cached result is still current and restart its TTL."""
+        self.put(url, result, result.get("content_hash"))
+        with self._lock:
+            self._stats["revalidated"] += 1
+        result = dict(result)
+        result["cache"] = "revalidated"
+        return result
+    
+    def put(self, url, result, content_hash=None):
+        """
+        Store a finished result with its analysis_mode; error and partial results are skipped.
+        
+        HTTP validators in result["http_validators"] (etag, last_modified) are kept
+        for conditional revalidation.
+        """
+        mode = analysis_mode(result)
+        if result.get("error") or mode == "partial":
+            return
+        stored = {key: value for key, value in result.items()
+                  if key not in ("cache", "cached_at", "processed_at", "batch_index")}
+        validators = result.get("http_validators") or {}
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO verdicts "
+                "(url_key, content_hash, result, created_at, accessed_at, etag, last_modified, analysis_mode) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (normalize_url(url), content_hash, json.dumps(stored, ensure_ascii=False), now, now,
+                 validators.get("etag"), validators.get("last_modified"), mode)
+            )
+            self._conn.commit()
+            self._stats["stores"] += 1
+            self._puts_since_eviction += 1
+            if self._puts_since_eviction >= 100:
+                self._evict()
+    
+    def _evict(self):
+        self._puts_since_eviction = 0
+        count = self._conn.execute("SELECT COUNT(*) FROM verdicts").fetchone()[0]
+        excess = count - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM verdicts WHERE url_key IN "
+                "(SELECT url_key FROM verdicts ORDER BY accessed_at ASC LIMIT ?)", (excess,)
+            )
+            self._conn.commit()
+            self._stats["evictions"] += excess
+    
+    def iter_results(self, page_size=1000):
+        """Yield every stored result, expired ones included (e.g. as classifier training data)."""
+        last_rowid = 0
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT rowid, result FROM verdicts WHERE rowid > ? ORDER BY rowid LIMIT ?",
+                    (last_rowid, page_size)
+                ).fetchall()
+            if not rows:
+                return
+            for rowid, result_json in rows:
+                yield json.loads(result_json)
+            last_rowid = rows[-1][0]
+    
+    def purge_expired(self):
+        """Delete expired entries and return how many were removed."""
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM verdicts WHERE created_at < ?", (time.time() - self.ttl,))
+            self._conn.commit()
+            return cursor.rowcount
+    
+    def clear(self):
+        """Delete every cached entry."""
+        with self._lock:
+            self._conn.execute("DELETE FROM verdicts")
+            self._conn.commit()
+    
+    def stats(self):
+        """Return hit/miss counters, the hit rate and the number of stored entries."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = self._conn.execute("SELECT COUNT(*) FROM verdicts").fetchone()[0]
+        lookups = stats["url_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["url_hits"] + stats["content_hits"]) / lookups if lookups else 0
+        return stats
+    
+    def close(self):
+        """Apply the size bound and close the database."""
+        with self._lock:
+            self._evict()
+            self._conn.close()
+
+def create_http_session(pool_size=10):
+    """Create a requests.Session whose keep-alive connection pool fits pool_size concurrent fetches."""
+    import requests
+    from requests.adapters import HTTPAdapter
+    
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers.update(DEFAULT_HEADERS)
+    return session
+
+RATE_LIMIT_STATUSES = (429, 503)
+
+def parse_retry_after(value):
+    """Seconds to wait according to a Retry-After header (delta-seconds or HTTP date), or None."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    
+    from email.utils import parsedate_to_datetime
+    from datetime import datetime, timezone
+    
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+def stage_kwargs(stage_function, options):
+    """Pick the entries of an analyze_website options dict that a stage function accepts."""
+    import inspect
+    
+    accepted = inspect.signature(stage_function).parameters
+    return {key: value for key, value in options.items() if key in accepted}
+
+def run_pipeline(urls, on_result, http_workers=16, browser_workers=3, queue_size=None,
+                 analysis_options=None, driver_pool=None):
+    """
+    Two-stage producer/consumer engine.
+    
+    A wide pool of HTTP workers runs analyze_static_stage over a shared keep-alive
+    session and feeds the URLs that still need a browser into a bounded queue,
+    which a small pool of browser workers drains with analyze_browser_stage.
+    When the browser stage falls behind, the full queue blocks the HTTP workers.
+    
+    :param urls: Iterable of cleaned URLs
+    :param on_result: Called as on_result(index, url, result, error) for every URL
+    :param http_workers: Number of concurrent static fetches
+    :param browser_workers: Number of concurrent browser renders
+    :param queue_size: Maximum URLs waiting for a browser (default: 2 x browser_workers)
+    
+    An exception raised by on_result stops the batch: no new URLs are started,
+    the workers wind down and the first such exception is re-raised.
+    """
+    import queue
+    
+    options = dict(analysis_options or {})
+    options.pop('session', None)
+    static_options = stage_kwargs(analyze_static_stage, options)
+    browser_options = stage_kwargs(analyze_browser_stage, options)
+    
+    session = create_http_session(pool_size=http_workers)
+    browser_queue = queue.Queue(maxsize=queue_size or browser_workers * 2)
+    url_iter = enumerate(urls)
+    url_lock = threading.Lock()
+    abort = threading.Event()
+    callback_errors = []
+    
+    def deliver(index, url, result, error):
+        # A failing callback must not kill its worker: with every browser worker gone the
+        # queue stops draining and the HTTP workers block in put() forever
+        if abort.is_set():
+            return
+        try:
+            on_result(index, url, result, error)
+        except Exception as e:
+            with url_lock:
+                callback_errors.append(e)
+            abort.set()
+    
+    def http_worker():
+        while not abort.is_set():
+            with url_lock:
+                item = next(url_iter, None)
+            if item is None:
+                return
+            index, url = item
+            try:
+                result, pending = analyze_static_stage(url, session=session, **static_options)
+            except Exception as e:
+                deliver(index, url, None, e)
+                continue
+            if pending is None:
+                deliver(index, url, result, None)
+                continue
+            while not abort.is_set():
+                try:
+                    browser_queue.put((index, url, result, pending), timeout=0.5)
+                    break
+                except queue.Full:
+                    continue
+    
+    def browser_worker():
+        while True:
+            item = browser_queue.get()
+            if item is None:
+                return
+            # After an abort, keep draining so no HTTP worker waits on a full queue
+            if abort.is_set():
+                continue
+            index, url, result, pending = item
+            try:
+                result = analyze_browser_stage(result, pending, driver_pool=driver_pool, **browser_options)
+            except Exception as e:
+                deliver(index, url, None, e)
+                continue
+            deliver(index, url, result, None)
+    
+    http_threads = [threading.Thread(target=http_worker, daemon=True) for _ in range(http_workers)]
+    browser_threads = [threading.Thread(target=browser_worker, daemon=True) for _ in range(browser_workers)]
+    for thread in http_threads + browser_threads:
+        thread.start()
+    
+    try:
+        for thread in http_threads:
+            thread.join()
+        for _ in browser_threads:
+            browser_queue.put(None)
+        for thread in browser_threads:
+            thread.join()
+    finally:
+        session.close()
+    
+    if callback_errors:
+        raise callback_errors[0]
+
+class HostScheduler:
+    """
+    Hands out batch URLs interleaved across hosts while staying polite to each.
+    
+    URLs are bucketed by host and served round-robin. A host never has more than
+    ``per_host_concurrency`` URLs in progress, consecutive starts on one host are
+    at least ``min_delay`` seconds apart, and a rate-limited URL pauses its host
+    for the Retry-After period before being retried. Each host also gets its own
+    keep-alive requests.Session so its TLS connections are reused.
+    
+    A host with nothing queued or in progress is forgotten (and its session
+    closed) once its delay has passed, so per-host state stays bounded by the
+    hosts currently in play rather than every host of the input.
+    """
+    
+    def __init__(self, urls, per_host_concurrency=2, min_delay=1.0, max_retries=2,
+                 default_backoff=10.0, max_backoff=300.0, max_buffered=10000, max_sessions=256):
+        """
+        :param urls: Iterable of cleaned URLs (read lazily, up to max_buffered at a time)
+        :param per_host_concurrency: Maximum URLs of one host in progress at once
+        :param min_delay: Minimum seconds between two starts on the same host
+        :param max_retries: Times a rate-limited URL is requeued before its result is kept
+        :param default_backoff: Pause for a rate-limited host that sent no Retry-After
+        :param max_backoff: Upper bound on any Retry-After pause
+        :param max_buffered: URLs read ahead of the workers to find other hosts
+        :param max_sessions: Per-host sessions kept open (least recently used are closed)
+        """
+        from collections import OrderedDict, deque
+        
+        self.per_host_concurrency = per_host_concurrency
+        self.min_delay = min_delay
+        self.max_retries = max_retries
+        self.default_backoff = default_backoff
+        self.max_backoff = max_backoff
+        self.max_buffered = max_buffered
+        self.max_sessions = max_sessions
+        
+        self._source = enumerate(urls)
+        self._exhausted = False
+        self._queues = {}       # host -> deque of (index, url, attempts)
+        self._ready = deque()   # round-robin order of hosts with queued URLs
+        self._active = {}
+        self._next_start = {}
+        self._idle = []         # heap of (next_start, host) for hosts that went idle
+        self._buffered = 0
+        self._in_progress = 0
+        self._sessions = OrderedDict()
+        self._condition = threading.Condition()
+        # Retired hosts can come back; count distinct ones by 8-byte digest only
+        self._seen_hosts = SeenUrls()
+        
+        self.hosts_seen = 0
+        self.retried = 0
+        self.throttle_waits = 0
+    
+    @staticmethod
+    def host_of(url):
+        return (urlparse(url).hostname or '').lower()
+    
+    def _fill(self):
+        while not self._exhausted and self._buffered < self.max_buffered:
+            item = next(self._source, None)
+            if item is None:
+                self._exhausted = True
+                return
+            index, url = item
+            self._enqueue(self.host_of(url), (index, url, 0))
+    
+    def _enqueue(self, host, entry, front=False):
+        from collections import deque
+        
+        queue = self._queues.get(host)
+        if queue is None:
+            queue = self._queues[host] = deque()
+            self._ready.append(host)
+            if host not in self._next_start:
+                self._next_start[host] = 0.0
+                self._active[host] = 0
+                if self._seen_hosts.add(f"https://{host}/"):
+                    self.hosts_seen += 1
+        if front:
+            queue.appendleft(entry)
+        else:
+            queue.append(entry)
+        self._buffered += 1
+    
+    def _next_ready(self, now):
+        """Pop the next URL of a host that may start now, or return the seconds until one may."""
+        wait = None
+        for _ in range(len(self._ready)):
+            host = self._ready[0]
+            self._ready.rotate(-1)
+            if self._active[host] >= self.per_host_concurrency:
+                continue
+            if now < self._next_start[host]:
+                delay = self._next_start[host] - now
+                wait = delay if wait is None else min(wait, delay)
+                continue
+            
+            queue = self._queues[host]
+            index, url, attempts = queue.popleft()
+            if not queue:
+                del self._queues[host]
+                self._ready.pop()
+            self._buffered -= 1
+            self._active[host] += 1
+            self._in_progress += 1
+            self._next_start[host] = now + self.min_delay
+            return (index, url, host, attempts), None
+        return None, wait
+    
+    def _retire_idle_hosts(self, now):
+        """Drop the state and session of idle hosts whose delay or backoff has passed."""
+        import heapq
+        
+        while self._idle and self._idle[0][0] <= now:
+            _, host = heapq.heappop(self._idle)
+            # Stale entry: the host got new URLs, or went idle again with a later delay
+            if host in self._queues or self._active.get(host, 1) or self._next_start[host] > now:
+                continue
+            del self._active[host]
+            del self._next_start[host]
+            session = self._sessions.pop(host, None)
+            if session is not None:
+                session.close()
+    
+    def acquire(self):
+        """
+        Block until a URL may start.
+        
+        :return: (index, url, host, attempts), or None once every URL is finished
+        """
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                self._retire_idle_hosts(now)
+                self._fill()
+                item, wait = self._next_ready(now)
+                if item is not None:
+                    return item
+                if self._exhausted and not self._buffered and not self._in_progress:
+                    return None
+                self.throttle_waits += 1
+                self._condition.wait(timeout=wait)
+    
+    def release(self, item, retry_after=None, rate_limited=False):
+        """
+        Mark an acquired URL finished.
+        
+        A rate-limited URL pauses its host for retry_after (or default_backoff)
+        seconds and is requeued, unless it has used up max_retries.
+        
+        :return: True if the URL was requeued and its result should be discarded
+        """
+        import heapq
+        
+        index, url, host, attempts = item
+        with self._condition:
+            self._active[host] -= 1
+            self._in_progress -= 1
+            requeue = False
+            if rate_limited or retry_after is not None:
+                pause = min(retry_after if retry_after is not None else self.default_backoff,
+                            self.max_backoff)
+                self._next_start[host] = max(self._next_start[host], time.monotonic() + pause)
+                if attempts < self.max_retries:
+                    self._enqueue(host, (index, url, attempts + 1), front=True)
+                    self.retried += 1
+                    requeue = True
+            if not self._active[host] and host not in self._queues:
+                heapq.heappush(self._idle, (self._next_start[host], host))
+            self._condition.notify_all()
+        return requeue
+    
+    def session_for(self, host):
+        """Keep-alive session for one host, sized to its concurrency limit."""
+        with self._condition:
+            session = self._sessions.get(host)
+            if session is not None:
+                self._sessions.move_to_end(host)
+                return session
+            session = self._sessions[host] = create_http_session(pool_size=self.per_host_concurrency)
+            
+            # Close the least recently used sessions of hosts with nothing in progress
+            for idle_host in list(self._sessions):
+                if len(self._sessions) <= self.max_sessions:
+                    break
+                if idle_host != host and not self._active.get(idle_host):
+                    self._sessions.pop(idle_host).close()
+            return session
+    
+    def stats(self):
+        with self._condition:
+            return {
+                "hosts": self.hosts_seen,
+                "retried": self.retried,
+                "throttle_waits": self.throttle_waits,
+                "open_sessions": len(self._sessions)
+            }
+    
+    def close(self):
+        with self._condition:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+
+def run_host_scheduled(urls, on_result, workers=3, per_host_concurrency=2, min_delay=1.0,
+                       max_retries=2, analysis_options=None, driver_pool=None):
+    """
+    Batch engine that runs analyze_website under a HostScheduler.
+    
+    :param urls: Iterable of cleaned URLs
+    :param on_result: Called as on_result(index, url, result, error) for every URL
+    :param workers: Number of concurrent analyses across all hosts
+    :return: HostScheduler.stats() after the run
+    """
+    options = dict(analysis_options or {})
+    options.pop('session', None)
+    scheduler = HostScheduler(urls, per_host_concurrency=per_host_concurrency,
+                              min_delay=min_delay, max_retries=max_retries)
+    
+    def worker():
+        while True:
+            item = scheduler.acquire()
+            if item is None:
+                return
+            index, url, host, attempts = item
+            try:
+                result = analyze_website(url, session=scheduler.session_for(host),
+                                         driver_pool=driver_pool, **options)
+            except Exception as e:
+                scheduler.release(item)
+                on_result(index, url, None, e)
+                continue
+            rate_limited = result.get("http_status") in RATE_LIMIT_STATUSES
+            if scheduler.release(item, result.get("retry_after"), rate_limited):
+                continue
+            on_result(index, url, result, None)
+    
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+    try:
+        for thread in threads:
+            thread.join()
+    finally:
+        scheduler.close()
+    return scheduler.stats()
+
+_ID_SEGMENT = re.compile(r'^\d+$')
+_HASH_SEGMENT = re.compile(r'^(?:[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}|(?=[a-f]*\d)[0-9a-f]{8,})$', re.I)
+_SLUG_SEGMENT = re.compile(r'^[a-z0-9]+(?:[-_][a-z0-9]+){2,}$', re.I)
+_TOKEN_SEGMENT = re.compile(r'^(?=.*\d)(?=.*[a-z])[a-z0-9_-]{6,}$', re.I)
+
+def _template_segment(segment):
+    stem, dot, extension = segment.rpartition('.')
+    if not dot or not extension.isalnum() or len(extension) > 5:
+        stem, extension = segment, ''
+    if _ID_SEGMENT.match(stem):
+        stem = '<id>'
+    elif _HASH_SEGMENT.match(stem):
+        stem = '<hash>'
+    elif _SLUG_SEGMENT.match(stem):
+        stem = '<slug>'
+    elif _TOKEN_SEGMENT.match(stem):
+        stem = '<token>'
+    return f"{stem}.{extension}" if extension else stem
+
+def infer_path_template(url):
+    """
+    Host plus path template of a URL, e.g. "shop.com/product/<id>" or
+    "site.com/news/<id>/<slug>". Numeric ids, hashes/UUIDs, multi-word slugs
+    and mixed letter-digit tokens become placeholders; query values are dropped
+    but query keys are kept.
+    """
+    parts = urlparse(normalize_url(url))
+    segments = [_template_segment(segment) for segment in parts.path.split('/')]
+    template = (parts.hostname or '') + '/'.join(segments)
+    if parts.query:
+        template += '?' + '&'.join(sorted({key for key, _ in parse_qsl(parts.query, keep_blank_values=True)}))
+    return template
+
+def cluster_urls(urls):
+    """Group (index, url) pairs by infer_path_template, keeping input order."""
+    clusters = {}
+    for index, url in enumerate(urls):
+        clusters.setdefault(infer_path_template(url), []).append((index, url))
+    return clusters
+
+def propagate_verdict(url, template, samples, cluster_size):
+    """Result for an unanalyzed URL that takes the agreeing verdict of its cluster's samples."""
+    frameworks = set(samples[0].get('frameworks_detected', []))
+    for sample in samples[1:]:
+        frameworks &= set(sample.get('frameworks_detected', []))
+    return {
+        "url": url,
+        "needs_selenium": samples[0]["needs_selenium"],
+        "confidence": min(sample.get("confidence", 0) for sample in samples),
+        "frameworks_detected": sorted(frameworks),
+        "reasons": [f"Same verdict as {len(samples)} analyzed URLs matching {template}"],
+        "decided_by": "cluster",
+        "propagated": True,
+        "cluster": {
+            "template": template,
+            "size": cluster_size,
+            "samples": [sample["url"] for sample in samples]
+        }
+    }
+
+def run_clustered(urls, run_batch, on_result, sample_size=3):
+    """
+    Analyze a sample of every URL template and propagate agreeing verdicts.
+    
+    Clusters no larger than sample_size are analyzed in full. For larger ones,
+    sample_size evenly spaced URLs are analyzed first; when they all succeed
+    without timing out and agree, the other URLs get that verdict with
+    result["propagated"] set, otherwise the whole cluster is escalated to full
+    analysis.
+    
+    :param urls: List of cleaned URLs
+    :param run_batch: Called as run_batch(urls, on_result) to analyze a list of URLs,
+                      with on_result(index, url, result, error) indexed into that list
+    :param on_result: Called as on_result(index, url, result, error) with the index into
+                      urls; must return the recorded result
+    :return: Dict with "clusters", "propagated" and "escalated" counts
+    """
+    clusters = cluster_urls(urls)
+    template_of = {}
+    sample_jobs = []
+    remaining = {}
+    for template, members in clusters.items():
+        for index, _ in members:
+            template_of[index] = template
+        if len(members) <= sample_size:
+            sample_jobs.extend(members)
+            continue
+        step = len(members) / sample_size
+        picks = {int(i * step) for i in range(sample_size)}
+        sample_jobs.extend(member for position, member in enumerate(members) if position in picks)
+        remaining[template] = [member for position, member in enumerate(members) if position not in picks]
+    
+    samples = {}
+    samples_lock = threading.Lock()
+    
+    def record_sample(position, url, result=None, error=None):
+        index = sample_jobs[position][0]
+        recorded = on_result(index, url, result, error)
+        with samples_lock:
+            samples.setdefault(template_of[index], []).append(recorded)
+        return recorded
+    
+    run_batch([url for _, url in sample_jobs], record_sample)
+    
+    escalate = []
+    propagated = 0
+    for template, members in remaining.items():
+        cluster_samples = samples.get(template, [])
+        verdicts = {sample["needs_selenium"] for sample in cluster_samples}
+        # A timed-out sample only has a guess from its static HTML; do not spread it
+        trusted = not any(sample.get("error") or analysis_mode(sample) == "partial" for sample in cluster_samples)
+        if len(verdicts) == 1 and trusted:
+            size = len(clusters[template])
+            for index, url in members:
+                on_result(index, url, propagate_verdict(url, template, cluster_samples, size), None)
+                propagated += 1
+        else:
+            escalate.extend(members)
+    
+    def record_escalated(position, url, result=None, error=None):
+        return on_result(escalate[position][0], url, result, error)
+    
+    if escalate:
+        run_batch([url for _, url in escalate], record_escalated)
     
-    return analysis
+    return {"clusters": len(clusters), "propagated": propagated, "escalated": len(escalate)}
 
-def extract_meaningful_content(soup):
-    """Extract meaningful text content, excluding scripts, styles, etc."""
-    # Remove script and style elements
-    for script in soup(["script", "style", "meta", "link", "noscript"]):
-        script.decompose()
+class JsonlResultSink:
+    """
+    JSON Lines writer for batch results.
     
-    # Get text and clean it
-    text = soup.get_text()
-    lines = (line.strip() for line in text.splitlines())
-    chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-    text = ' '.join(chunk for chunk in chunks if chunk)
+    Each result is written as one line the moment it completes and the file is
+    flushed every ``flush_every`` results, so a crashed run loses at most the
+    last few results.
+    """
+    
+    def __init__(self, path, flush_every=10, resume=False):
+        """
+        :param resume: Append to an existing file (after the results of an earlier,
+                       interrupted run) instead of truncating it
+        """
+        self.path = path
+        self.flush_every = flush_every
+        self._lock = threading.Lock()
+        self._pending = 0
+        # A crash can leave a partial last line, possibly cut inside a multibyte
+        # character; check the last byte so our first line starts on a fresh one
+        if resume:
+            try:
+                with open(path, 'rb+') as f:
+                    f.seek(0, 2)
+                    if f.tell() > 0:
+                        f.seek(-1, 2)
+                        if f.read(1) != b'\n':
+                            f.write(b'\n')
+            except FileNotFoundError:
+                pass
+        self._file = open(path, 'a' if resume else 'w', encoding='utf-8')
+    
+    def write(self, result):
+        line = json.dumps(result, ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + '\n')
+            self._pending += 1
+            if self._pending >= self.flush_every:
+                self._file.flush()
+                self._pending = 0
     
-    return text
+    def close(self):
+        with self._lock:
+            self._file.flush()
+            self._file.close()
 
-def calculate_selenium_need_score(requests_len, selenium_len, frameworks, indicators, content_analysis):
-    """Calculate a score to determine if Selenium is needed (0-100)."""
-    score = 0
+def read_jsonl_results(path):
+    """Yield results from a JSON Lines file, skipping lines a crash left incomplete."""
+    # Read bytes: a cut line can end inside a multibyte character, and json.loads
+    # reports that as a UnicodeDecodeError (a ValueError) for just that line
+    with open(path, 'rb') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+def iter_urls(source):
+    """
+    Lazily yield cleaned URLs from a file path, a comma-separated string or an iterable.
     
-    # Framework scoring
-    framework_weights = {
-        'React': 35,
-        'Angular': 35,
-        'Vue': 35,
-        'Next.js': 30,
-        'Nuxt': 30,
-        'Svelte': 25,
-        'Ember': 25,
-        'jQuery': 15
-    }
+    Files are read one line at a time, so the input can be arbitrarily large.
+    """
+    import os
     
-    for framework in frameworks:
-        score += framework_weights.get(framework, 10)
+    if isinstance(source, str) and os.path.isfile(source):
+        def lines():
+            with open(source, 'r') as f:
+                yield from f
+        raw_urls = lines()
+    elif isinstance(source, str):
+        raw_urls = source.split(',')
+    else:
+        raw_urls = source
     
-    # Dynamic indicators scoring
-    score += len(indicators) * 8
+    for url in raw_urls:
+        url = url.strip()
+        if not url:
+            continue
+        if not url.startswith(('http://', 'https://')):
+            url = 'https://' + url
+        yield url
+
+class SeenUrls:
+    """
+    Compact membership set of normalized URLs.
     
-    # Content analysis scoring
-    if content_analysis.get("text_diff_ratio", 0) > 0.3:  # 30% text difference
-        score += 25
+    Only an 8-byte BLAKE2b digest of each URL is kept (as an int), which is a
+    fraction of the size of the URL strings themselves.
+    """
     
-    if content_analysis.get("element_count_diff", 0) > 0.5:  # 50% more elements
-        score += 20
+    def __init__(self, urls=()):
+        self._digests = set()
+        for url in urls:
+            self.add(url)
     
-    if content_analysis.get("important_content_missing", False):
-        score += 30
+    @staticmethod
+    def _digest(url):
+        return int.from_bytes(hashlib.blake2b(normalize_url(url).encode('utf-8'), digest_size=8).digest(), 'big')
     
-    score += len(content_analysis.get("new_content_types", [])) * 15
+    def add(self, url):
+        """Add a URL; returns False if it was already present."""
+        digest = self._digest(url)
+        if digest in self._digests:
+            return False
+        self._digests.add(digest)
+        return True
     
-    # Length-based scoring (less weight than before)
-    if selenium_len > requests_len * 2:
-        score += 20
-    elif selenium_len > requests_len * 1.5:
-        score += 10
+    def __contains__(self, url):
+        return self._digest(url) in self._digests
     
-    # Cap the score at 100
-    return min(score, 100)
+    def __len__(self):
+        return len(self._digests)
 
-def generate_reasons_for_selenium(frameworks, indicators, content_analysis):
-    """Generate human-readable reasons why Selenium is needed."""
-    reasons = []
+def dedupe_urls(urls, seen=None):
+    """Yield each URL the first time its normalized form is seen."""
+    seen = SeenUrls() if seen is None else seen
+    for url in urls:
+        if seen.add(url):
+            yield url
+
+def load_completed_urls(path):
+    """SeenUrls of the URLs that already have a successful result in a JSON Lines output file."""
+    return SeenUrls(result['url'] for result in read_jsonl_results(path)
+                    if result.get('url') and not result.get('error'))
+
+class BatchSummary:
+    """Running counters for the end-of-batch summary, so results need not stay in memory."""
     
-    if frameworks:
-        reasons.append(f"JavaScript frameworks detected: {', '.join(frameworks)}")
+    def __init__(self):
+        from collections import Counter
+        
+        self.total = 0
+        self.needs_selenium = 0
+        self.confidence_total = 0.0
+        self.errors = 0
+        self.frameworks = Counter()
+        self.decided_by = Counter()
+        self.cache = Counter()
+        self.blocked_requests = 0
+        self.transferred_bytes = 0
+        self.early_exits = 0
+        self.timed_out = 0
+        self.api_pages = 0
+        self.replayable_pages = 0
+        self.truncated = 0
+        self.peak_page_bytes = 0
+        self._lock = threading.Lock()
     
-    if indicators:
-        reasons.append(f"Dynamic content indicators: {', '.join(indicators)}")
+    def add(self, result):
+        with self._lock:
+            self.total += 1
+            if result.get('needs_selenium', False):
+                self.needs_selenium += 1
+            self.confidence_total += result.get('confidence', 0)
+            if result.get('error'):
+                self.errors += 1
+            self.frameworks.update(result.get('frameworks_detected', []))
+            if result.get('decided_by'):
+                self.decided_by[result['decided_by']] += 1
+            if result.get('cache'):
+                self.cache[result['cache']] += 1
+            if result.get('skipped_stages') and not result.get('estimated'):
+                self.early_exits += 1
+            if result.get('timed_out'):
+                self.timed_out += 1
+            network = result.get('network') or {}
+            if any(network.get('counts', {}).get(kind) for kind in ("json_api", "graphql", "html_fragment")):
+                self.api_pages += 1
+            if network.get('replayable_endpoints'):
+                self.replayable_pages += 1
+            if result.get('requests_truncated') or result.get('selenium_truncated'):
+                self.truncated += 1
+            self.peak_page_bytes = max(self.peak_page_bytes,
+                                       (result.get('memory') or {}).get('peak_page_bytes', 0))
+            blocking = result.get('resource_blocking') or {}
+            self.blocked_requests += blocking.get('blocked_requests', 0)
+            self.transferred_bytes += blocking.get('transferred_bytes', 0)
     
-    if content_analysis.get("text_diff_ratio", 0) > 0.3:
-        reasons.append("Significant content difference between static and dynamic versions")
+    @property
+    def average_confidence(self):
+        return self.confidence_total / self.total if self.total else 0
+
+# Upper bounds (seconds) of the stage latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+class StageMetrics:
+    """Latency histograms of the per-stage timings recorded in result["timings"]."""
     
-    if content_analysis.get("important_content_missing", False):
-        reasons.append("Important content (headings, structure) missing in static version")
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._stages = {}
+        self._lock = threading.Lock()
     
-    if content_analysis.get("new_content_types"):
-        reasons.append(f"Additional interactive elements found: {', '.join(content_analysis['new_content_types'])}")
+    def observe(self, stage, seconds):
+        with self._lock:
+            histogram = self._stages.get(stage)
+            if histogram is None:
+                histogram = self._stages[stage] = {"counts": [0] * (len(self.buckets) + 1),
+                                                   "sum": 0.0, "count": 0}
+            position = len(self.buckets)
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    position = i
+                    break
+            histogram["counts"][position] += 1
+            histogram["sum"] += seconds
+            histogram["count"] += 1
     
-    if not reasons:
-        reasons.append("Content is significantly enhanced by JavaScript execution")
+    def observe_result(self, result):
+        for stage, ms in (result.get("timings") or {}).items():
+            self.observe(stage, ms / 1000)
     
-    return reasons
+    def quantile(self, stage, q):
+        """Upper bound of the bucket holding the q-quantile of a stage (inf past the last bucket)."""
+        with self._lock:
+            histogram = self._stages.get(stage)
+            if not histogram or not histogram["count"]:
+                return None
+            target = q * histogram["count"]
+            seen = 0
+            for bound, count in zip(self.buckets + (float('inf'),), histogram["counts"]):
+                seen += count
+                if seen >= target:
+                    return bound
+            return float('inf')
+    
+    def to_dict(self):
+        with self._lock:
+            stages = {}
+            for stage, histogram in self._stages.items():
+                cumulative = 0
+                buckets = {}
+                for bound, count in zip(self.buckets, histogram["counts"]):
+                    cumulative += count
+                    buckets[str(bound)] = cumulative
+                buckets["+Inf"] = histogram["count"]
+                stages[stage] = {
+                    "count": histogram["count"],
+                    "sum_seconds": round(histogram["sum"], 6),
+                    "mean_seconds": round(histogram["sum"] / histogram["count"], 6),
+                    "buckets": buckets
+                }
+            return stages
+    
+    def to_prometheus(self, metric="selenium_analyzer_stage_duration_seconds"):
+        """Render the histograms in the Prometheus text exposition format."""
+        lines = [f"# HELP {metric} Time spent in each analyze_website stage.",
+                 f"# TYPE {metric} histogram"]
+        for stage, data in sorted(self.to_dict().items()):
+            for bound, cumulative in data["buckets"].items():
+                lines.append(f'{metric}_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+            lines.append(f'{metric}_sum{{stage="{stage}"}} {data["sum_seconds"]}')
+            lines.append(f'{metric}_count{{stage="{stage}"}} {data["count"]}')
+        return "\n".join(lines) + "\n"
+    
+    def save(self, path):
+        """Write the histograms as JSON (.json) or in the Prometheus text format (anything else)."""
+        with open(path, 'w', encoding='utf-8') as f:
+            if path.lower().endswith('.json'):
+                json.dump(self.to_dict(), f, indent=2)
+            else:
+                f.write(self.to_prometheus())
 
-def batch_analyze_websites(urls, output_file=None, max_workers=3, progress_callback=None):
+def batch_analyze_websites(urls, output_file=None, max_workers=3, progress_callback=None,
+                           reuse_drivers=False, driver_pool=None, analysis_options=None,
+                           engine="threads", http_workers=16, queue_size=None,
+                           cache=None, force_refresh=False, revalidate=False,
+                           resume=False, collect_results=None, lazy_input=False,
+                           max_in_flight=None, per_host_concurrency=2, host_delay=1.0,
+                           metrics_file=None, block_resources=None, render_mode="drivers",
+                           cluster_sample=None, time_budget=None, capture_network=False):
     """
     Analyze multiple websites in batch with optional parallel processing.
     
     :param urls: List of URLs or path to file containing URLs
-    :param output_file: Optional path to save results as JSON/CSV
+    :param output_file: Optional path to save results as JSON/CSV, or as JSON Lines
+                        (.jsonl) streamed to disk as each URL completes
     :param max_workers: Number of parallel workers (default: 3)
     :param progress_callback: Optional callback function for progress updates
-    :return: List of analysis results
+    :param reuse_drivers: Share a pool of warm Chrome drivers across workers
+    :param driver_pool: Optional existing DriverPool or TabPool to use (implies reuse_drivers)
+    :param analysis_options: Optional dict of extra keyword arguments for analyze_website
+                             (e.g. {"wait_strategy": "adaptive", "wait_time": 15})
+    :param engine: "threads" runs each URL end to end in one worker; "pipeline" uses
+                   run_pipeline with separate HTTP and browser pools (max_workers
+                   then sets the number of browser workers); "hosts" interleaves
+                   URLs across hosts with run_host_scheduled
+    :param http_workers: Number of HTTP workers for the pipeline engine
+    :param queue_size: Bound on URLs waiting for a browser in the pipeline engine
+    :param cache: Optional VerdictCache, or path to its SQLite file, checked before
+                  each URL is fetched and updated with new verdicts
+    :param force_refresh: Re-analyze every URL even when a cached verdict exists
+    :param revalidate: Revalidate expired cache entries with conditional GETs
+    :param resume: With a .jsonl output_file, skip URLs that already have a successful
+                   result in it and append to it instead
+    :param collect_results: Keep results in memory and return them (default: True,
+                            except when streaming to a .jsonl output_file)
+    :param lazy_input: Read and deduplicate URLs on the fly instead of loading the whole
+                       input first; the total is then unknown and progress is shown as n/?
+    :param max_in_flight: Maximum URLs submitted to the thread engine but not yet
+                          finished (default: 4 x max_workers)
+    :param per_host_concurrency: Maximum URLs of one host in progress (hosts engine)
+    :param host_delay: Minimum seconds between starts on one host (hosts engine)
+    :param metrics_file: Optional path to export per-stage latency histograms to,
+                         as JSON (.json) or Prometheus text format (e.g. .prom)
+    :param block_resources: Resource-blocking profile for every browser render ("lean",
+                            "minimal" or a list of URL patterns)
+    :param render_mode: "drivers" gives each browser worker its own Chrome; "tabs" renders
+                        in isolated tabs of one shared Chrome (TabPool, max_workers tabs)
+    :param cluster_sample: Group URLs by host and path template, analyze this many URLs
+                           per template and give the rest the samples' verdict when they
+                           agree (see run_clustered); not available with lazy_input
+    :param time_budget: Hard per-URL limit in seconds (see analyze_website); hung browsers
+                        are killed and the URL gets a partial result
+    :param capture_network: Report each page's XHR/fetch traffic (see analyze_website); the
+                            summary counts pages whose data comes from replayable JSON APIs
+    :return: List of analysis results (empty when collect_results is False)
     """
     import concurrent.futures
     import csv
     import os
     from datetime import datetime
     
-    # Handle URLs input
-    if isinstance(urls, str) and os.path.isfile(urls):
-        with open(urls, 'r') as f:
-            url_list = [line.strip() for line in f if line.strip()]
-    elif isinstance(urls, str):
-        url_list = [url.strip() for url in urls.split(',') if url.strip()]
-    else:
-        url_list = urls
+    if cluster_sample and lazy_input:
+        raise ValueError("cluster_sample needs the whole URL list and cannot be used with lazy_input")
     
-    # Clean and validate URLs
-    clean_urls = []
-    for url in url_list:
-        url = url.strip()
-        if not url.startswith(('http://', 'https://')):
-            url = 'https://' + url
-        clean_urls.append(url)
+    stream_output = bool(output_file) and output_file.lower().endswith('.jsonl')
+    if collect_results is None:
+        collect_results = not stream_output
+    
+    completed = SeenUrls()
+    if resume and stream_output and os.path.isfile(output_file):
+        completed = load_completed_urls(output_file)
+    
+    skipped = 0
+    duplicates = 0
+    
+    if lazy_input:
+        # Stream URLs from the input, dropping duplicates and completed URLs as they arrive
+        def pending_urls():
+            nonlocal skipped, duplicates
+            seen = SeenUrls()
+            for url in iter_urls(urls):
+                if not seen.add(url):
+                    duplicates += 1
+                elif url in completed:
+                    skipped += 1
+                else:
+                    yield url
+        
+        url_source = pending_urls()
+        total_urls = None
+    else:
+        # Handle URLs input
+        clean_urls = list(iter_urls(urls))
+        if completed:
+            remaining = [url for url in clean_urls if url not in completed]
+            skipped = len(clean_urls) - len(remaining)
+            clean_urls = remaining
+        url_source = clean_urls
+        total_urls = len(clean_urls)
     
     results = []
-    total_urls = len(clean_urls)
+    summary = BatchSummary()
+    metrics = StageMetrics()
+    progress_total = total_urls if total_urls is not None else '?'
     
-    print(f"\n🚀 Starting batch analysis of {total_urls} websites...")
-    print(f"🔧 Using {max_workers} parallel workers")
+    if lazy_input:
+        print("\n🚀 Starting streaming batch analysis...")
+    else:
+        print(f"\n🚀 Starting batch analysis of {total_urls} websites...")
+    if skipped:
+        print(f"⏭️  Resuming: skipped {skipped} URLs already completed in {output_file}")
+    if engine == "pipeline":
+        print(f"🔧 Using {http_workers} HTTP workers and {max_workers} browser workers")
+    elif engine == "hosts":
+        print(f"🔧 Using {max_workers} workers, at most {per_host_concurrency} per host "
+              f"{host_delay:.1f}s apart")
+    else:
+        print(f"🔧 Using {max_workers} parallel workers")
     print("=" * 80)
     
-    def analyze_single_with_progress(url_index_tuple):
+    analysis_options = dict(analysis_options or {})
+    
+    owns_cache = isinstance(cache, str)
+    if owns_cache:
+        cache = VerdictCache(cache)
+    if cache is not None:
+        analysis_options.setdefault("cache", cache)
+        analysis_options.setdefault("force_refresh", force_refresh)
+        analysis_options.setdefault("revalidate", revalidate)
+    if block_resources:
+        analysis_options.setdefault("block_resources", block_resources)
+    if time_budget:
+        analysis_options.setdefault("time_budget", time_budget)
+    if capture_network:
+        analysis_options.setdefault("capture_network", capture_network)
+    time_budget = analysis_options.get("time_budget")
+    
+    owns_pool = (reuse_drivers or render_mode == "tabs") and driver_pool is None
+    if owns_pool:
+        performance_log = bool(analysis_options.get("block_resources") or analysis_options.get("capture_network"))
+        if render_mode == "tabs":
+            driver_pool = TabPool(max_tabs=max_workers, performance_log=performance_log)
+        else:
+            driver_pool = DriverPool(max_size=max_workers, performance_log=performance_log)
+    
+    sink = JsonlResultSink(output_file, resume=resume) if stream_output else None
+    host_stats = None
+    cluster_stats = None
+    
+    def record_result(index, url, result=None, error=None):
+        result = format_result(index, url, result, error)
+        summary.add(result)
+        metrics.observe_result(result)
+        if sink is not None:
+            sink.write(result)
+        if collect_results:
+            results.append(result)
+        return result
+    
+    def format_result(index, url, result, error):
+        if error is None:
+            try:
+                result['processed_at'] = datetime.now().isoformat()
+                result['batch_index'] = index + 1
+                
+                # Progress callback
+                if progress_callback:
+                    progress_callback(index + 1, total_urls, result)
+                else:
+                    status = "✅ YES" if result['needs_selenium'] else "❌ NO"
+                    print(f"[{index + 1:3d}/{progress_total}] {status} | {result['confidence']:3.0f}% | {url}")
+                
+                return result
+            except Exception as e:
+                error = e
+        
+        error_result = {
+            'url': url,
+            'needs_selenium': True,
+            'confidence': 0,
+            'error': str(error),
+            'processed_at': datetime.now().isoformat(),
+            'batch_index': index + 1
+        }
+        print(f"[{index + 1:3d}/{progress_total}] ❌ ERROR | {url} - {str(error)}")
+        return error_result
+    
+    def analyze_single_with_progress(url_index_tuple, on_result=record_result):
         url, index = url_index_tuple
         try:
-            result = analyze_website(url)
-            result['processed_at'] = datetime.now().isoformat()
-            result['batch_index'] = index + 1
-            
-            # Progress callback
-            if progress_callback:
-                progress_callback(index + 1, total_urls, result)
-            else:
-                status = "✅ YES" if result['needs_selenium'] else "❌ NO"
-                print(f"[{index + 1:3d}/{total_urls}] {status} | {result['confidence']:3.0f}% | {url}")
-            
-            return result
+            result = analyze_website(url, driver_pool=driver_pool, **analysis_options)
         except Exception as e:
-            error_result = {
-                'url': url,
-                'needs_selenium': True,
-                'confidence': 0,
-                'error': str(e),
-                'processed_at': datetime.now().isoformat(),
-                'batch_index': index + 1
-            }
-            print(f"[{index + 1:3d}/{total_urls}] ❌ ERROR | {url} - {str(e)}")
-            return error_result
+            return on_result(index, url, error=e)
+        return on_result(index, url, result)
     
-    # Process URLs with threading
-    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-        url_index_pairs = [(url, i) for i, url in enumerate(clean_urls)]
-        future_to_url = {executor.submit(analyze_single_with_progress, pair): pair[0] 
-                        for pair in url_index_pairs}
-        
-        for future in concurrent.futures.as_completed(future_to_url):
-            result = future.result()
-            results.append(result)
+    def run_engine(urls_to_run, on_result=record_result):
+        nonlocal host_stats
+        if engine == "pipeline":
+            # Process URLs with separate HTTP and browser stages
+            run_pipeline(urls_to_run, on_result, http_workers=http_workers,
+                         browser_workers=max_workers, queue_size=queue_size,
+                         analysis_options=analysis_options, driver_pool=driver_pool)
+        elif engine == "hosts":
+            # Interleave URLs across hosts with per-host limits and sessions
+            stats = run_host_scheduled(urls_to_run, on_result, workers=max_workers,
+                                       per_host_concurrency=per_host_concurrency,
+                                       min_delay=host_delay, analysis_options=analysis_options,
+                                       driver_pool=driver_pool)
+            if host_stats is None:
+                host_stats = stats
+            else:
+                host_stats["hosts"] = max(host_stats["hosts"], stats["hosts"])
+                host_stats["retried"] += stats["retried"]
+        else:
+            # Process URLs with threading, keeping a bounded number of URLs in flight
+            in_flight_limit = max_in_flight or max_workers * 4
+            with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+                in_flight = set()
+                for index, url in enumerate(urls_to_run):
+                    if len(in_flight) >= in_flight_limit:
+                        done, in_flight = concurrent.futures.wait(
+                            in_flight, return_when=concurrent.futures.FIRST_COMPLETED)
+                        for future in done:
+                            future.result()
+                    in_flight.add(executor.submit(analyze_single_with_progress, (url, index), on_result))
+                
+                for future in concurrent.futures.as_completed(in_flight):
+                    future.result()
+    
+    try:
+        if cluster_sample:
+            # Analyze a sample of each URL template and propagate agreeing verdicts
+            cluster_stats = run_clustered(url_source, run_engine, record_result, sample_size=cluster_sample)
+        else:
+            run_engine(url_source)
+    finally:
+        if sink is not None:
+            sink.close()
+        if owns_pool:
+            driver_pool.close()
+        if owns_cache:
+            cache.close()
     
     # Sort results by batch_index to maintain order
     results.sort(key=lambda x: x.get('batch_index', 0))
@@ -453,41 +3874,115 @@ def batch_analyze_websites(urls, output_file=None, max_workers=3, progress_callb
     print("📊 BATCH ANALYSIS SUMMARY")
     print("=" * 80)
     
-    selenium_needed = sum(1 for r in results if r.get('needs_selenium', False))
-    static_sufficient = total_urls - selenium_needed
-    avg_confidence = sum(r.get('confidence', 0) for r in results) / len(results) if results else 0
+    analyzed = summary.total
+    selenium_needed = summary.needs_selenium
+    static_sufficient = analyzed - selenium_needed
     
-    print(f"Total websites analyzed: {total_urls}")
-    print(f"✅ Need Selenium: {selenium_needed} ({selenium_needed/total_urls*100:.1f}%)")
-    print(f"❌ Static sufficient: {static_sufficient} ({static_sufficient/total_urls*100:.1f}%)")
-    print(f"📈 Average confidence: {avg_confidence:.1f}%")
+    print(f"Total websites analyzed: {analyzed}")
+    if lazy_input and (skipped or duplicates):
+        print(f"⏭️  Skipped {skipped} already completed and {duplicates} duplicate URLs")
+    if analyzed:
+        print(f"✅ Need Selenium: {selenium_needed} ({selenium_needed/analyzed*100:.1f}%)")
+        print(f"❌ Static sufficient: {static_sufficient} ({static_sufficient/analyzed*100:.1f}%)")
+    print(f"📈 Average confidence: {summary.average_confidence:.1f}%")
+    if summary.errors:
+        print(f"⚠️  Errors: {summary.errors}")
     
     # Framework statistics
-    all_frameworks = []
-    for r in results:
-        all_frameworks.extend(r.get('frameworks_detected', []))
-    
-    if all_frameworks:
-        from collections import Counter
-        framework_counts = Counter(all_frameworks)
+    if summary.frameworks:
         print(f"\n🔧 Most detected frameworks:")
-        for framework, count in framework_counts.most_common(5):
+        for framework, count in summary.frameworks.most_common(5):
             print(f"   • {framework}: {count} sites")
     
+    static_decided = summary.decided_by['static']
+    if static_decided:
+        print(f"⚡ Decided from static HTML: {static_decided} "
+              f"({static_decided/analyzed*100:.1f}%, browser launches avoided)")
+    
+    classifier_decided = summary.decided_by['classifier']
+    if classifier_decided:
+        print(f"🤖 Decided by the learned pre-screen: {classifier_decided} "
+              f"({classifier_decided/analyzed*100:.1f}%, browser launches avoided)")
+    
+    if summary.peak_page_bytes:
+        print(f"🧮 Largest page buffers held for one URL: {summary.peak_page_bytes / (1024 * 1024):.1f} MB"
+              + (f" ({summary.truncated} pages truncated)" if summary.truncated else ""))
+    
+    if cluster_stats is not None:
+        print(f"🧩 URL templates: {cluster_stats['clusters']} clusters, "
+              f"{cluster_stats['propagated']} verdicts propagated, "
+              f"{cluster_stats['escalated']} URLs escalated after disagreeing samples")
+    
+    if summary.early_exits:
+        print(f"⏩ Early exit: {summary.early_exits} verdicts settled before every stage ran")
+    
+    if summary.api_pages:
+        print(f"🔌 Network: {summary.api_pages} pages load content over XHR/fetch, "
+              f"{summary.replayable_pages} from JSON APIs plain HTTP requests can call directly")
+    
+    if summary.timed_out:
+        print(f"⏰ Timed out: {summary.timed_out} URLs ran out of their {time_budget}s budget "
+              f"(partial results, see timeout_stage)")
+    
+    if cache is not None:
+        url_hits = summary.cache['url']
+        content_hits = summary.cache['content']
+        revalidated = summary.cache['revalidated']
+        served = url_hits + content_hits + revalidated
+        print(f"\n💾 Cache: {url_hits} URL hits, {content_hits} content hits, "
+              f"{revalidated} revalidated ({served/analyzed*100 if analyzed else 0:.1f}% served from cache)")
+    
+    if analysis_options.get("block_resources"):
+        print(f"\n🧱 Resource blocking: {summary.blocked_requests} requests blocked, "
+              f"{summary.transferred_bytes / (1024 * 1024):.1f} MB transferred by the browser")
+    
+    stage_metrics = metrics.to_dict()
+    if stage_metrics:
+        print("\n⏱️  Stage timings (mean / p95 bucket):")
+        slowest = sorted(stage_metrics.items(), key=lambda item: item[1]["sum_seconds"], reverse=True)
+        for stage, data in slowest[:8]:
+            p95 = metrics.quantile(stage, 0.95)
+            p95_label = f"≤{p95*1000:.0f}ms" if p95 != float('inf') else f">{metrics.buckets[-1]*1000:.0f}ms"
+            print(f"   • {stage}: {data['mean_seconds']*1000:.1f}ms / {p95_label} ({data['count']} runs)")
+    
+    if host_stats is not None:
+        print(f"\n🌐 Hosts: {host_stats['hosts']}, {host_stats['retried']} URLs retried after rate limiting")
+    
+    if driver_pool is not None:
+        pool_stats = driver_pool.stats()
+        print(f"\n🚗 Driver pool: {pool_stats['launches']} launches "
+              f"(avg {pool_stats['avg_launch_time']:.1f}s), "
+              f"hit rate {pool_stats['hit_rate']*100:.1f}%, "
+              f"{pool_stats['recycled']} recycled, {pool_stats['crashed']} crashed")
+        if "tabs_killed" in pool_stats:
+            print(f"🗂️  Tabs: peak {pool_stats['peak_tabs']} open, "
+                  f"{pool_stats['tabs_killed']} closed by the watchdog")
+    
+    if metrics_file:
+        metrics.save(metrics_file)
+        print(f"📏 Stage metrics saved to: {metrics_file}")
+    
     # Save results if requested
-    if output_file:
+    if stream_output:
+        print(f"\n💾 Results streamed to: {output_file}")
+    elif output_file:
         save_results(results, output_file)
         print(f"\n💾 Results saved to: {output_file}")
     
     return results
 
 def save_results(results, output_file):
-    """Save analysis results to JSON or CSV file."""
+    """Save analysis results to JSON, JSON Lines or CSV file."""
     import json
     
     file_ext = output_file.lower().split('.')[-1]
     
-    if file_ext == 'json':
+    if file_ext == 'jsonl':
+        with open(output_file, 'w', encoding='utf-8') as f:
+            for result in results:
+                f.write(json.dumps(result, ensure_ascii=False) + '\n')
+    
+    elif file_ext == 'json':
         with open(output_file, 'w') as f:
             json.dump(results, f, indent=2, ensure_ascii=False)
     
@@ -503,7 +3998,7 @@ def save_results(results, output_file):
         ]
         
         with open(output_file, 'w', newline='', encoding='utf-8') as f:
-            writer = csv.DictWriter(f, fieldnames=fieldnames)
+            writer = csv.DictWriter(f, fieldnames=fieldnames, extrasaction='ignore')
             writer.writeheader()
             
             for result in results:
@@ -517,8 +4012,388 @@ def save_results(results, output_file):
         with open(output_file, 'w') as f:
             json.dump(results, f, indent=2, ensure_ascii=False)
 
+class SqliteWorkQueue:
+    """
+    Shared work queue of URLs in a SQLite database, for spreading one sweep over
+    several worker processes (or machines that share the database file).
+    
+    Workers lease tasks for ``lease_seconds`` and extend the lease with
+    heartbeats while they work. A task whose lease runs out (its worker died or
+    hung) is handed to the next worker that asks; after ``max_attempts`` leases
+    it is marked failed. Enqueueing and completing are idempotent, so a task is
+    processed at least once and duplicates are resolved when shards are merged.
+    """
+    
+    def __init__(self, path="work_queue.db", lease_seconds=120, max_attempts=3):
+        """
+        :param path: SQLite database file shared by all workers
+        :param lease_seconds: How long a lease lasts without a heartbeat
+        :param max_attempts: Leases a task gets before it is marked failed
+        """
+        import sqlite3
+        
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        # Autocommit, so lease() can hold the write lock with BEGIN IMMEDIATE
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=60, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS tasks (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                url_key TEXT NOT NULL UNIQUE,
+                url TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                worker TEXT,
+                lease_expires REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks (status, lease_expires);
+        """)
+    
+    def enqueue(self, urls, chunk_size=1000):
+        """Add URLs (a file path, comma-separated string or iterable); known URLs are skipped."""
+        added = 0
+        chunk = []
+        
+        def flush():
+            now = time.time()
+            with self._lock:
+                before = self._conn.total_changes
+                self._conn.execute("BEGIN")
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO tasks (url_key, url, updated_at) VALUES (?, ?, ?)",
+                    [(normalize_url(url), url, now) for url in chunk]
+                )
+                self._conn.execute("COMMIT")
+                return self._conn.total_changes - before
+        
+        for url in iter_urls(urls):
+            chunk.append(url)
+            if len(chunk) >= chunk_size:
+                added += flush()
+                chunk = []
+        if chunk:
+            added += flush()
+        return added
+    
+    def lease(self, worker_id, limit=1):
+        """
+        Lease up to limit tasks for worker_id, including tasks whose lease expired.
+        
+        :return: List of (task_id, url)
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "UPDATE tasks SET status = 'failed', error = 'Lease expired on every attempt', "
+                    "updated_at = ? WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?",
+                    (now, now, self.max_attempts)
+                )
+                rows = self._conn.execute(
+                    "SELECT id, url FROM tasks WHERE status = 'pending' "
+                    "OR (status = 'leased' AND lease_expires < ?) ORDER BY id LIMIT ?",
+                    (now, limit)
+                ).fetchall()
+                self._conn.executemany(
+                    "UPDATE tasks SET status = 'leased', worker = ?, lease_expires = ?, "
+                    "attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                    [(worker_id, now + self.lease_seconds, now, task_id) for task_id, _ in rows]
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return rows
+    
+    def heartbeat(self, worker_id, task_ids):
+        """Extend the leases worker_id still holds; returns how many were extended."""
+        if not task_ids:
+            return 0
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.executemany(
+                "UPDATE tasks SET lease_expires = ?, updated_at = ? "
+                "WHERE id = ? AND status = 'leased' AND worker = ?",
+                [(now + self.lease_seconds, now, task_id, worker_id) for task_id in task_ids]
+            )
+            return cursor.rowcount
+    
+    def complete(self, task_id, worker_id):
+        """Mark a task done, even if its lease moved on; False when it was already done."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE tasks SET status = 'done', worker = ?, lease_expires = NULL, error = NULL, "
+                "updated_at = ? WHERE id = ? AND status != 'done'",
+                (worker_id, time.time(), task_id)
+            )
+            return cursor.rowcount == 1
+    
+    def fail(self, task_id, worker_id, error):
+        """
+        Give a leased task back after an error.
+        
+        :return: "pending" when it will be retried, "failed" when it is out of attempts,
+                 or None when worker_id no longer held it
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                cursor = self._conn.execute(
+                    "UPDATE tasks SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                    "worker = NULL, lease_expires = NULL, error = ?, updated_at = ? "
+                    "WHERE id = ? AND status = 'leased' AND worker = ?",
+                    (self.max_attempts, str(error), time.time(), task_id, worker_id)
+                )
+                row = self._conn.execute("SELECT status FROM tasks WHERE id = ?", (task_id,)).fetchone()
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return row[0] if cursor.rowcount == 1 else None
+    
+    def requeue_expired(self):
+        """Put tasks with expired leases back to pending; returns how many."""
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE tasks SET status = 'pending', worker = NULL, lease_expires = NULL, updated_at = ? "
+                "WHERE status = 'leased' AND lease_expires < ? AND attempts < ?",
+                (now, now, self.max_attempts)
+            )
+            return cursor.rowcount
+    
+    def failed_tasks(self):
+        """Return (task_id, url, error) for every task marked failed, in enqueue order."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT id, url, error FROM tasks WHERE status = 'failed' ORDER BY id"
+            ).fetchall()
+    
+    def unfinished(self):
+        """Number of tasks that are pending or leased."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM tasks WHERE status IN ('pending', 'leased')"
+            ).fetchone()[0]
+    
+    def stats(self):
+        """Return task counts by status and the number of expired leases."""
+        with self._lock:
+            stats = {"pending": 0, "leased": 0, "done": 0, "failed": 0}
+            for status, count in self._conn.execute("SELECT status, COUNT(*) FROM tasks GROUP BY status"):
+                stats[status] = count
+            stats["expired_leases"] = self._conn.execute(
+                "SELECT COUNT(*) FROM tasks WHERE status = 'leased' AND lease_expires < ?", (time.time(),)
+            ).fetchone()[0]
+        return stats
+    
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+def run_queue_worker(queue_path, output_dir, worker_id=None, max_workers=3, lease_seconds=120,
+                     heartbeat_interval=None, poll_interval=2.0, analysis_options=None,
+                     driver_factory=None):
+    """
+    Drain a SqliteWorkQueue, appending results to this worker's own shard file.
+    
+    Up to max_workers URLs are leased and analyzed at a time, and a heartbeat
+    thread keeps their leases alive. Each result is flushed to
+    ``<output_dir>/shard-<worker_id>.jsonl`` before its task is marked done, so
+    a crash never loses a completed task. The worker exits once no task is
+    pending or leased.
+    
+    :param worker_id: Unique worker name (default: host name and process id)
+    :param heartbeat_interval: Seconds between lease extensions (default: a third of lease_seconds)
+    :param analysis_options: analyze_website options; must be picklable when the worker runs
+                             in another process, so pass the cache as a file path
+    :param driver_factory: Optional callable returning a new driver for this worker's DriverPool
+    :return: Dict with done, failed and retried counts
+    """
+    import concurrent.futures
+    import os
+    import socket
+    from datetime import datetime
+    
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    options = dict(analysis_options or {})
+    owns_cache = isinstance(options.get("cache"), str)
+    if owns_cache:
+        options["cache"] = VerdictCache(options["cache"])
+    
+    os.makedirs(output_dir, exist_ok=True)
+    work_queue = SqliteWorkQueue(queue_path, lease_seconds=lease_seconds)
+    # A restarted worker keeps its shard; the queue already counts those results as done
+    sink = JsonlResultSink(os.path.join(output_dir, f"shard-{worker_id}.jsonl"), flush_every=1, resume=True)
+    driver_pool = DriverPool(max_size=max_workers, driver_factory=driver_factory,
+                             performance_log=bool(options.get("block_resources") or options.get("capture_network")))
+    counts = {"done": 0, "failed": 0, "retried": 0}
+    held = set()
+    held_lock = threading.Lock()
+    stop = threading.Event()
+    
+    def heartbeat():
+        while not stop.wait(heartbeat_interval or lease_seconds / 3):
+            with held_lock:
+                task_ids = list(held)
+            work_queue.heartbeat(worker_id, task_ids)
+    
+    def analyze_task(task_id, url):
+        try:
+            result = analyze_website(url, driver_pool=driver_pool, **options)
+        except Exception as e:
+            status = work_queue.fail(task_id, worker_id, e)
+            if status == "failed":
+                sink.write({'url': url, 'needs_selenium': True, 'confidence': 0, 'error': str(e),
+                            'processed_at': datetime.now().isoformat(), 'task_id': task_id,
+                            'worker': worker_id})
+            with held_lock:
+                counts["failed" if status == "failed" else "retried"] += 1
+            print(f"[task {task_id}] ❌ ERROR | {url} - {e}")
+        else:
+            result['processed_at'] = datetime.now().isoformat()
+            result['task_id'] = task_id
+            result['worker'] = worker_id
+            sink.write(result)
+            work_queue.complete(task_id, worker_id)
+            with held_lock:
+                counts["done"] += 1
+            status = "✅ YES" if result['needs_selenium'] else "❌ NO"
+            print(f"[task {task_id}] {status} | {result['confidence']:3.0f}% | {url}")
+        finally:
+            with held_lock:
+                held.discard(task_id)
+    
+    heartbeat_thread = threading.Thread(target=heartbeat, daemon=True)
+    heartbeat_thread.start()
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            in_flight = set()
+            while True:
+                leased = work_queue.lease(worker_id, limit=max_workers - len(in_flight))
+                with held_lock:
+                    held.update(task_id for task_id, _ in leased)
+                for task_id, url in leased:
+                    in_flight.add(executor.submit(analyze_task, task_id, url))
+                
+                if in_flight:
+                    done, in_flight = concurrent.futures.wait(
+                        in_flight, timeout=poll_interval, return_when=concurrent.futures.FIRST_COMPLETED)
+                    for future in done:
+                        future.result()
+                elif work_queue.unfinished() == 0:
+                    break
+                else:
+                    # Other workers hold the remaining leases; wait in case one of them dies
+                    time.sleep(poll_interval)
+    finally:
+        stop.set()
+        heartbeat_thread.join()
+        sink.close()
+        driver_pool.close()
+        work_queue.close()
+        if owns_cache:
+            options["cache"].close()
+    
+    return counts
+
+def merge_shards(output_dir, output_file=None, queue_path=None):
+    """
+    Coordinator step: merge the worker shard files of output_dir into one result list.
+    
+    A URL analyzed more than once (a lease expired while its worker was still
+    busy) keeps its newest successful result. Results are ordered as they were
+    enqueued and renumbered in batch_index.
+    
+    :param output_file: Optional JSON, JSON Lines or CSV file to save the merged results to
+    :param queue_path: The sweep's SqliteWorkQueue file. Failed tasks without a result
+                       in any shard (every lease expired, so no worker wrote one) get
+                       an error row, and the output covers every enqueued URL
+    :return: List of merged results
+    """
+    import os
+    
+    latest = {}
+    for name in sorted(os.listdir(output_dir)):
+        if not (name.startswith('shard-') and name.endswith('.jsonl')):
+            continue
+        for result in read_jsonl_results(os.path.join(output_dir, name)):
+            key = normalize_url(result['url'])
+            rank = (not result.get('error'), result.get('processed_at', ''))
+            if key not in latest or rank > latest[key][0]:
+                latest[key] = (rank, result)
+    
+    if queue_path is not None:
+        work_queue = SqliteWorkQueue(queue_path)
+        try:
+            failed = work_queue.failed_tasks()
+        finally:
+            work_queue.close()
+        for task_id, url, error in failed:
+            key = normalize_url(url)
+            if key not in latest:
+                latest[key] = (None, {'url': url, 'needs_selenium': True, 'confidence': 0,
+                                      'error': error or "Task failed", 'task_id': task_id})
+    
+    results = sorted((result for _, result in latest.values()), key=lambda result: result.get('task_id', 0))
+    for position, result in enumerate(results, 1):
+        result['batch_index'] = position
+    
+    if output_file:
+        save_results(results, output_file)
+        print(f"💾 Merged {len(results)} results from {output_dir} into {output_file}")
+    return results
+
+def run_distributed(urls, queue_path, output_dir, output_file=None, processes=None, max_workers=3,
+                    lease_seconds=120, analysis_options=None, driver_factory=None):
+    """
+    Sharded batch on one machine: enqueue urls, run a process pool of queue
+    workers and merge their shards.
+    
+    Further machines can join the same sweep by running run_queue_worker against
+    the same queue and output directory, as long as they share a filesystem
+    with working SQLite locking.
+    
+    :param processes: Number of worker processes (default: CPU count)
+    :param max_workers: Concurrent URLs (Chrome drivers) per process
+    :return: Tuple of (merged results, queue stats)
+    """
+    import concurrent.futures
+    import multiprocessing
+    import os
+    
+    work_queue = SqliteWorkQueue(queue_path, lease_seconds=lease_seconds)
+    added = work_queue.enqueue(urls)
+    work_queue.close()
+    processes = processes or os.cpu_count() or 1
+    print(f"📥 Enqueued {added} new URLs; starting {processes} worker processes x {max_workers} workers")
+    
+    # Spawned processes start clean instead of inheriting this process's threads and drivers
+    context = multiprocessing.get_context("spawn")
+    with concurrent.futures.ProcessPoolExecutor(max_workers=processes, mp_context=context) as executor:
+        futures = [executor.submit(run_queue_worker, queue_path, output_dir, max_workers=max_workers,
+                                   lease_seconds=lease_seconds, analysis_options=analysis_options,
+                                   driver_factory=driver_factory)
+                   for _ in range(processes)]
+        for future in concurrent.futures.as_completed(futures):
+            future.result()
+    
+    work_queue = SqliteWorkQueue(queue_path, lease_seconds=lease_seconds)
+    stats = work_queue.stats()
+    work_queue.close()
+    print(f"🧱 Queue: {stats['done']} done, {stats['failed']} failed, {stats['pending'] + stats['leased']} unfinished")
+    return merge_shards(output_dir, output_file, queue_path=queue_path), stats
+
 def interactive_menu():
     """Interactive menu for different analysis modes."""
+    import os
+    
     print("\n🔹 SELENIUM DETECTION ANALYZER")
     print("=" * 50)
     print("Choose analysis mode:")
@@ -636,7 +4511,245 @@ def display_batch_summary(results):
     for result in static_sites:
         print(f"   • {result['url']} ({result.get('confidence', 0):.0f}%)")
 
+def run_static_only(urls, max_workers=8, output_file=None, analysis_options=None):
+    """
+    Decide URLs from their static HTML only, without ever starting a browser.
+    
+    The static tier (and the learned pre-screen, if a classifier is given) decides
+    what it can; the other URLs get decided_by "undecided" and keep the partial
+    static verdict, so they can be sent to a full analysis.
+    
+    :param urls: List of URLs, a comma-separated string or a path to a URL file
+    :param analysis_options: analyze_static_stage options; tiered defaults to True
+    :return: List of results in input order
+    """
+    import concurrent.futures
+    
+    options = dict(analysis_options or {})
+    options.setdefault("tiered", True)
+    options = stage_kwargs(analyze_static_stage, options)
+    url_list = list(iter_urls(urls))
+    session = create_http_session(pool_size=max_workers)
+    
+    def analyze_static(url):
+        try:
+            result, pending = analyze_static_stage(url, session=session, **options)
+        except Exception as e:
+            result, pending = {'url': url, 'needs_selenium': True, 'confidence': 0, 'error': str(e)}, None
+        if pending is not None:
+            result["decided_by"] = "undecided"
+            result["reasons"].append("Static HTML is inconclusive; run a full analysis to decide")
+        return result
+    
+    print(f"⚡ Static-only analysis of {len(url_list)} websites ({max_workers} workers, no browser)")
+    results = []
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for index, result in enumerate(executor.map(analyze_static, url_list)):
+                if result.get("error"):
+                    status = "❌ ERROR"
+                elif result.get("decided_by") == "undecided":
+                    status = "❔ ???"
+                else:
+                    status = "✅ YES" if result['needs_selenium'] else "❌ NO"
+                print(f"[{index + 1:3d}/{len(url_list)}] {status} | {result.get('confidence', 0):3.0f}% | {result['url']}")
+                result['batch_index'] = index + 1
+                results.append(result)
+    finally:
+        session.close()
+    
+    undecided = sum(1 for result in results if result.get("decided_by") == "undecided")
+    errors = sum(1 for result in results if result.get("error"))
+    print(f"\n📊 Decided statically: {len(results) - undecided - errors}/{len(results)}, "
+          f"{undecided} need a full analysis, {errors} errors")
+    if output_file:
+        save_results(results, output_file)
+        print(f"💾 Results saved to: {output_file}")
+    return results
+
+def _add_analysis_arguments(parser):
+    parser.add_argument('--wait-strategy', choices=['fixed', 'adaptive'], default='fixed',
+                        help='How long to wait for dynamic content (default: fixed)')
+    parser.add_argument('--wait-time', type=float, default=8,
+                        help='Seconds to wait (the ceiling for --wait-strategy adaptive; default: 8)')
+    parser.add_argument('--time-budget', type=float, help='Hard per-URL limit in seconds')
+    parser.add_argument('--tiered', action='store_true', help='Decide from static HTML when conclusive')
+    parser.add_argument('--early-exit', action='store_true', help='Skip scoring stages once the verdict is settled')
+    parser.add_argument('--static-early-exit', action='store_true',
+                        help='Skip the browser when the served HTML alone scores above 50 (an estimate)')
+    parser.add_argument('--cache', help='Verdict cache database file')
+    parser.add_argument('--block-resources', choices=list(BLOCKING_PROFILES),
+                        help='Resource-blocking profile for the browser')
+    parser.add_argument('--capture-network', action='store_true', help='Report XHR/fetch traffic and JSON APIs')
+    parser.add_argument('--max-bytes', type=int, help='Cap the HTTP body and rendered page size')
+    parser.add_argument('--dom-backend', choices=['soup', 'stream', 'lxml', 'auto'], default='soup',
+                        help='HTML parsing backend (default: soup)')
+    parser.add_argument('--similarity', choices=list(SIMILARITY_BACKENDS), default='sequence',
+                        help='Text similarity backend (default: sequence)')
+    parser.add_argument('--model', help='Trained pre-screen model (SeleniumClassifier JSON)')
+    parser.add_argument('--classifier-confidence', type=float, default=0.9,
+                        help='Probability the pre-screen needs to skip the browser (default: 0.9)')
+
+def _analysis_options(args):
+    """analyze_website options from parsed command-line arguments."""
+    options = {
+        "wait_strategy": args.wait_strategy,
+        "wait_time": args.wait_time,
+        "dom_backend": args.dom_backend,
+        "similarity": args.similarity
+    }
+    for name in ("time_budget", "tiered", "early_exit", "static_early_exit", "block_resources", "capture_network",
+                 "max_bytes"):
+        value = getattr(args, name)
+        if value:
+            options[name] = value
+    if args.model:
+        options["classifier"] = SeleniumClassifier.load(args.model)
+        options["classifier_confidence"] = args.classifier_confidence
+    return options
+
+def build_arg_parser():
+    """Command-line interface; without a subcommand the interactive menu runs."""
+    import argparse
+    
+    parser = argparse.ArgumentParser(
+        prog="selenium_test.py",
+        description="Determine whether websites need Selenium or plain HTTP requests are enough."
+    )
+    commands = parser.add_subparsers(dest="command", metavar="command")
+    
+    single = commands.add_parser("single", help="Analyze one website")
+    single.add_argument("url")
+    single.add_argument("--json", action="store_true", help="Print the full result as JSON")
+    _add_analysis_arguments(single)
+    
+    batch = commands.add_parser("batch", help="Analyze many websites")
+    batch.add_argument("source", help="File with one URL per line, or comma-separated URLs")
+    batch.add_argument("--workers", type=int, default=3, help="Parallel browser workers (default: 3)")
+    batch.add_argument("--output", help="Results file (.json, .jsonl or .csv)")
+    batch.add_argument("--engine", choices=["threads", "pipeline", "hosts"], default="threads")
+    batch.add_argument("--render-mode", choices=["drivers", "tabs"], default="drivers")
+    batch.add_argument("--reuse-drivers", action="store_true", help="Share a pool of warm Chrome drivers")
+    batch.add_argument("--resume", action="store_true", help="Skip URLs already in the .jsonl output")
+    batch.add_argument("--lazy-input", action="store_true", help="Stream the URL file instead of loading it")
+    batch.add_argument("--cluster-sample", type=int, help="Analyze N URLs per path template")
+    batch.add_argument("--metrics-file", help="Write stage latency histograms (.json or Prometheus)")
+    _add_analysis_arguments(batch)
+    
+    static = commands.add_parser("static", help="Decide from static HTML only, without a browser")
+    static.add_argument("source", help="File with one URL per line, or comma-separated URLs")
+    static.add_argument("--workers", type=int, default=8, help="Parallel HTTP fetches (default: 8)")
+    static.add_argument("--output", help="Results file (.json, .jsonl or .csv)")
+    static.add_argument("--cache", help="Verdict cache database file")
+    static.add_argument("--model", help="Trained pre-screen model (SeleniumClassifier JSON)")
+    static.add_argument("--classifier-confidence", type=float, default=0.9)
+    static.add_argument("--time-budget", type=float, help="Hard per-URL limit in seconds")
+    static.add_argument("--max-bytes", type=int, help="Cap the HTTP body size")
+    static.add_argument("--dom-backend", choices=["soup", "stream", "lxml", "auto"], default="auto")
+    
+    cache = commands.add_parser("cache", help="Inspect or maintain the verdict cache")
+    cache.add_argument("action", choices=["stats", "show", "purge", "clear"])
+    cache.add_argument("url", nargs="?", help="URL for show")
+    cache.add_argument("--cache", default="verdict_cache.db", help="Cache database file")
+    
+    worker = commands.add_parser("queue-worker", help="Drain a shared work queue into a shard file")
+    worker.add_argument("queue", help="SqliteWorkQueue database file")
+    worker.add_argument("output_dir", help="Directory for shard files")
+    worker.add_argument("--workers", type=int, default=3, help="Concurrent URLs in this worker")
+    worker.add_argument("--worker-id", help="Unique worker name (default: host name and pid)")
+    worker.add_argument("--lease-seconds", type=float, default=120)
+    _add_analysis_arguments(worker)
+    
+    merge = commands.add_parser("merge-shards", help="Merge worker shard files into one output")
+    merge.add_argument("output_dir")
+    merge.add_argument("output", help="Results file (.json, .jsonl or .csv)")
+    merge.add_argument("--queue", help="SqliteWorkQueue database file; adds error rows for failed tasks")
+    
+    commands.add_parser("menu", help="Interactive menu (the default)")
+    return parser
+
+def main(argv=None):
+    """Run the command line; returns the process exit status."""
+    args = build_arg_parser().parse_args(argv)
+    
+    if args.command in (None, "menu"):
+        interactive_menu()
+        return 0
+    
+    if args.command == "single":
+        options = _analysis_options(args)
+        cache = VerdictCache(args.cache) if args.cache else None
+        try:
+            url = next(iter_urls([args.url]))
+            result = analyze_website(url, cache=cache, **options)
+        finally:
+            if cache is not None:
+                cache.close()
+        if args.json:
+            print(json.dumps(result, indent=2, ensure_ascii=False))
+        else:
+            display_single_result(result)
+        return 1 if result.get("error") else 0
+    
+    if args.command == "batch":
+        batch_analyze_websites(args.source, args.output, max_workers=args.workers, engine=args.engine,
+                               render_mode=args.render_mode, reuse_drivers=args.reuse_drivers,
+                               resume=args.resume, lazy_input=args.lazy_input,
+                               cluster_sample=args.cluster_sample, metrics_file=args.metrics_file,
+                               cache=args.cache, analysis_options=_analysis_options(args))
+        return 0
+    
+    if args.command == "static":
+        options = {"dom_backend": args.dom_backend, "time_budget": args.time_budget, "max_bytes": args.max_bytes}
+        if args.model:
+            options["classifier"] = SeleniumClassifier.load(args.model)
+            options["classifier_confidence"] = args.classifier_confidence
+        cache = VerdictCache(args.cache) if args.cache else None
+        options["cache"] = cache
+        try:
+            results = run_static_only(args.source, max_workers=args.workers, output_file=args.output,
+                                      analysis_options=options)
+        finally:
+            if cache is not None:
+                cache.close()
+        return 1 if any(result.get("error") for result in results) else 0
+    
+    if args.command == "cache":
+        cache = VerdictCache(args.cache)
+        try:
+            if args.action == "stats":
+                for key, value in cache.stats().items():
+                    print(f"  • {key}: {value}")
+            elif args.action == "show":
+                if not args.url:
+                    print("❌ cache show needs a URL")
+                    return 2
+                entry = cache.lookup(next(iter_urls([args.url])))
+                if entry is None:
+                    print("❌ Not cached")
+                    return 1
+                print(json.dumps(entry, indent=2, ensure_ascii=False))
+            elif args.action == "purge":
+                print(f"🧹 Removed {cache.purge_expired()} expired entries")
+            else:
+                cache.clear()
+                print("🗑️  Cache cleared")
+        finally:
+            cache.close()
+        return 0
+    
+    if args.command == "queue-worker":
+        options = _analysis_options(args)
+        if args.cache:
+            options["cache"] = args.cache
+        run_queue_worker(args.queue, args.output_dir, worker_id=args.worker_id, max_workers=args.workers,
+                         lease_seconds=args.lease_seconds, analysis_options=options)
+        return 0
+    
+    if args.command == "merge-shards":
+        merge_shards(args.output_dir, args.output, queue_path=args.queue)
+        return 0
+
 # --- Main execution ---
 if __name__ == "__main__":
-    import os
-    interactive_menu()
\ No newline at end of file
+    sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,135 @@
+import importlib.util
+import json
+import os
+import random
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import selenium_test as analyzer
+
+HAS_NUMPY = importlib.util.find_spec("numpy") is not None
+
+def shell_page(rng):
+    scripts = "".join(f'<script src="/static/js/chunk.{rng.randrange(10 ** 6)}.js"></script>'
+                      for _ in range(rng.randint(1, 4)))
+    return (f'<html><head><title>App</title>{scripts}</head><body><div id="root"></div>'
+            f'<script>window.__STATE__ = {{"page": {rng.randint(1, 99)}}}; fetch("/api/items");</script>'
+            '</body></html>')
+
+def article_page(rng):
+    paragraphs = "".join(f"<p>Paragraph {i} of a plain server-rendered article with ordinary words.</p>"
+                         for i in range(rng.randint(20, 60)))
+    return (f"<html><head><title>Article</title></head><body><h1>Headline {rng.randint(1, 99)}</h1>"
+            f"<h2>Section</h2>{paragraphs}</body></html>")
+
+def static_features(html):
+    indicators = list(analyzer.scan_page_signatures(html)["indicators"])
+    return analyzer.extract_static_features(html, analyzer.extract_dom_stats(html, "stream"), indicators)
+
+def training_results(count=80, seed=7):
+    rng = random.Random(seed)
+    results = []
+    for i in range(count):
+        dynamic = i % 2 == 0
+        html = shell_page(rng) if dynamic else article_page(rng)
+        results.append({"url": f"https://example.com/{i}", "decided_by": "browser", "needs_selenium": dynamic,
+                        "static_features": static_features(html)})
+    # Neither errors nor verdicts reached without the browser are training labels
+    results.append({"url": "https://example.com/e", "decided_by": "browser", "needs_selenium": True,
+                    "error": "boom", "static_features": static_features(article_page(rng))})
+    results.append({"url": "https://example.com/s", "decided_by": "static", "needs_selenium": True,
+                    "static_features": static_features(article_page(rng))})
+    return results
+
+class FakeResponse:
+
+    def __init__(self, text):
+        self.text = text
+        self.status_code = 200
+        self.headers = {}
+
+    def raise_for_status(self):
+        pass
+
+    def close(self):
+        pass
+
+class FakeSession:
+
+    def __init__(self, html):
+        self.html = html
+
+    def get(self, url, **kwargs):
+        return FakeResponse(self.html)
+
+class TrainingDataTest(unittest.TestCase):
+
+    def test_only_browser_verdicts_are_used(self):
+        features, labels = analyzer.training_data_from_results(training_results(count=10))
+        self.assertEqual(len(features), 10)
+        self.assertEqual(labels, [i % 2 == 0 for i in range(10)])
+
+@unittest.skipUnless(HAS_NUMPY, "numpy is needed for SeleniumClassifier")
+class SeleniumClassifierTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "model.json")
+        self.classifier, self.evaluation = analyzer.train_classifier(training_results(), test_fraction=0.25)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_train_and_evaluate(self):
+        self.assertEqual(self.evaluation["train_samples"], 60)
+        self.assertEqual(self.evaluation["samples"], 20)
+        self.assertGreaterEqual(self.evaluation["accuracy"], 0.95)
+
+    def test_save_and_load_round_trip(self):
+        self.classifier.save(self.path)
+        loaded = analyzer.SeleniumClassifier.load(self.path)
+        rows = [static_features(shell_page(random.Random(1))), static_features(article_page(random.Random(2)))]
+        expected = self.classifier.predict_proba(rows).tolist()
+        for got, want in zip(loaded.predict_proba(rows).tolist(), expected):
+            self.assertAlmostEqual(got, want, places=12)
+        self.assertGreater(expected[0], 0.5)
+        self.assertLess(expected[1], 0.5)
+
+    def test_model_for_another_feature_layout_is_refused(self):
+        self.classifier.save(self.path)
+        with open(self.path, encoding="utf-8") as f:
+            model = json.load(f)
+        model["feature_names"] = model["feature_names"][:-1]
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump(model, f)
+        with self.assertRaises(ValueError):
+            analyzer.SeleniumClassifier.load(self.path)
+
+    def test_cli_maps_model_into_analysis_options(self):
+        self.classifier.save(self.path)
+        for command in (["batch", "urls.txt"], ["single", "https://example.com"]):
+            args = analyzer.build_arg_parser().parse_args(command + ["--model", self.path,
+                                                                     "--classifier-confidence", "0.8"])
+            options = analyzer._analysis_options(args)
+            self.assertIsInstance(options["classifier"], analyzer.SeleniumClassifier)
+            self.assertEqual(options["classifier_confidence"], 0.8)
+
+    @unittest.skipUnless(importlib.util.find_spec("requests"), "requests is needed for the static stage")
+    def test_confident_page_is_decided_by_the_classifier(self):
+        self.classifier.save(self.path)
+        classifier = analyzer.SeleniumClassifier.load(self.path)
+        html = shell_page(random.Random(3))
+        result, pending = analyzer.analyze_static_stage("https://example.com/app", session=FakeSession(html),
+                                                        dom_backend="stream", classifier=classifier,
+                                                        classifier_confidence=0.9)
+        self.assertIsNone(pending)
+        self.assertEqual(result["decided_by"], "classifier")
+        self.assertTrue(result["needs_selenium"])
+        self.assertGreaterEqual(result["classifier_probability"], 0.9)
+        self.assertEqual(analyzer.analysis_mode(result), "classifier")
+
+if __name__ == "__main__":
+    unittest.main()
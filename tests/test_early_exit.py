@@ -0,0 +1,102 @@
+import importlib.util
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import selenium_test as analyzer
+
+BROWSER_STAGES = ["framework_detection", "dom_comparison", "text_similarity"]
+
+NEXT_PAGE = ('<html><head><script src="/_next/static/chunks/react-dom.js"></script></head>'
+             '<body><div id="__next" data-reactroot=""><h1>Shop</h1></div></body></html>')
+
+PLAIN_PAGE = "<html><body><h1>Article</h1>" + "<p>Plain server-rendered text.</p>" * 40 + "</body></html>"
+
+class FakeResponse:
+
+    def __init__(self, text):
+        self.text = text
+        self.status_code = 200
+        self.headers = {}
+
+    def raise_for_status(self):
+        pass
+
+    def close(self):
+        pass
+
+class FakeSession:
+
+    def __init__(self, pages):
+        self.pages = pages
+
+    def get(self, url, **kwargs):
+        return FakeResponse(self.pages[url])
+
+class ScoreBoundsTest(unittest.TestCase):
+
+    def test_indicators_alone_never_settle(self):
+        indicators = sorted({label for label, _, _ in analyzer.INDICATOR_SIGNATURES})
+        low, high = analyzer.score_bounds(0, 0, [], indicators, {}, BROWSER_STAGES)
+        self.assertLessEqual(low, 50)
+        self.assertFalse(analyzer.verdict_settled(low, high))
+
+    def test_frameworks_add_up_past_50(self):
+        low, high = analyzer.score_bounds(0, 0, ["React", "Next.js"], [], {}, BROWSER_STAGES)
+        self.assertEqual(low, 65)
+        self.assertTrue(analyzer.verdict_settled(low, high))
+
+    def test_pending_stages_widen_the_range(self):
+        content = {"text_diff_ratio": 0.5}
+        low, high = analyzer.score_bounds(100, 150, ["jQuery"], ["Lazy loading detected"], content,
+                                          ["text_similarity"])
+        self.assertEqual(low, analyzer.calculate_selenium_need_score(100, 150, ["jQuery"],
+                                                                     ["Lazy loading detected"], content))
+        self.assertEqual(high, low + analyzer.SCORE_STAGE_MAX_POINTS["text_similarity"])
+
+@unittest.skipUnless(importlib.util.find_spec("requests") and importlib.util.find_spec("bs4"),
+                     "requests and beautifulsoup4 are needed for the static stage")
+class StaticStageEarlyExitTest(unittest.TestCase):
+
+    def analyze(self, url, **kwargs):
+        session = FakeSession({"https://shop.example/": NEXT_PAGE, "https://blog.example/": PLAIN_PAGE})
+        return analyzer.analyze_static_stage(url, session=session, **kwargs)
+
+    def test_estimate_skips_the_browser(self):
+        result, pending = self.analyze("https://shop.example/", static_early_exit=True)
+        self.assertIsNone(pending)
+        self.assertTrue(result["needs_selenium"])
+        self.assertTrue(result["estimated"])
+        self.assertEqual(result["skipped_stages"], ["browser"])
+        self.assertEqual(sorted(result["frameworks_detected"]), ["Next.js", "React"])
+        self.assertGreater(result["score_bounds"][0], 50)
+        self.assertEqual(result["confidence"], result["score_bounds"][0])
+        self.assertEqual(analyzer.analysis_mode(result), "estimated")
+
+    def test_early_exit_alone_still_renders(self):
+        # The served-HTML framework count is a guess about the rendered page, not a settled bound
+        result, pending = self.analyze("https://shop.example/", early_exit=True)
+        self.assertIsNotNone(pending)
+
+    def test_page_without_enough_signals_goes_to_the_browser(self):
+        result, pending = self.analyze("https://blog.example/", static_early_exit=True)
+        self.assertIsNotNone(pending)
+        self.assertNotIn("skipped_stages", result)
+
+    def test_off_by_default(self):
+        result, pending = self.analyze("https://shop.example/")
+        self.assertIsNotNone(pending)
+
+class EstimatedVerdictCacheTest(unittest.TestCase):
+
+    def test_early_exit_runs_do_not_reuse_estimates(self):
+        estimate = {"needs_selenium": True, "decided_by": "static", "estimated": True,
+                    "skipped_stages": ["browser"]}
+        self.assertEqual(analyzer.analysis_mode(estimate), "estimated")
+        self.assertNotIn("estimated", analyzer.accepted_analysis_modes(early_exit=True))
+        self.assertIn("estimated", analyzer.accepted_analysis_modes(static_early_exit=True))
+
+if __name__ == "__main__":
+    unittest.main()
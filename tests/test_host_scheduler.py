@@ -0,0 +1,137 @@
+import os
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import selenium_test as analyzer
+
+class HostSchedulerTest(unittest.TestCase):
+
+    def test_round_robin_across_hosts(self):
+        urls = ["https://a.com/1", "https://a.com/2", "https://a.com/3", "https://b.com/1", "https://c.com/1"]
+        scheduler = analyzer.HostScheduler(urls, per_host_concurrency=5, min_delay=0)
+        order = []
+        while True:
+            item = scheduler.acquire()
+            if item is None:
+                break
+            order.append(item[1])
+            scheduler.release(item)
+        self.assertEqual(order[:3], ["https://a.com/1", "https://b.com/1", "https://c.com/1"])
+        self.assertEqual(sorted(order), sorted(urls))
+        self.assertEqual(scheduler.hosts_seen, 3)
+
+    def test_per_host_concurrency_prefers_other_hosts(self):
+        scheduler = analyzer.HostScheduler(["https://a.com/1", "https://a.com/2", "https://b.com/1"],
+                                           per_host_concurrency=1, min_delay=0)
+        first = scheduler.acquire()
+        second = scheduler.acquire()
+        self.assertEqual((first[2], second[2]), ("a.com", "b.com"))
+        scheduler.release(first)
+        self.assertEqual(scheduler.acquire()[1], "https://a.com/2")
+
+    def test_min_delay_between_starts_on_one_host(self):
+        scheduler = analyzer.HostScheduler(["https://a.com/1", "https://a.com/2"], per_host_concurrency=2,
+                                           min_delay=0.2)
+        started = time.monotonic()
+        scheduler.acquire()
+        scheduler.acquire()
+        self.assertGreaterEqual(time.monotonic() - started, 0.18)
+        self.assertGreaterEqual(scheduler.throttle_waits, 1)
+
+    def test_rate_limited_url_is_retried_after_backoff(self):
+        scheduler = analyzer.HostScheduler(["https://a.com/1"], min_delay=0, max_retries=2)
+        item = scheduler.acquire()
+        self.assertTrue(scheduler.release(item, retry_after=0.2))
+        started = time.monotonic()
+        retry = scheduler.acquire()
+        self.assertGreaterEqual(time.monotonic() - started, 0.18)
+        self.assertEqual((retry[1], retry[3]), ("https://a.com/1", 1))
+        self.assertEqual(scheduler.retried, 1)
+
+    def test_default_and_max_backoff(self):
+        scheduler = analyzer.HostScheduler(["https://a.com/1"], min_delay=0, default_backoff=0.1, max_backoff=0.15)
+        scheduler.release(scheduler.acquire(), rate_limited=True)
+        started = time.monotonic()
+        item = scheduler.acquire()
+        self.assertGreaterEqual(time.monotonic() - started, 0.08)
+        scheduler.release(item, retry_after=3600)
+        started = time.monotonic()
+        scheduler.acquire()
+        self.assertLess(time.monotonic() - started, 1.0)
+
+    def test_retries_are_bounded(self):
+        scheduler = analyzer.HostScheduler(["https://a.com/1"], min_delay=0, max_retries=1)
+        self.assertTrue(scheduler.release(scheduler.acquire(), retry_after=0))
+        self.assertFalse(scheduler.release(scheduler.acquire(), retry_after=0))
+        self.assertIsNone(scheduler.acquire())
+
+    def test_reads_input_lazily(self):
+        consumed = []
+
+        def urls():
+            for i in range(100):
+                consumed.append(i)
+                yield f"https://host{i}.com/"
+
+        scheduler = analyzer.HostScheduler(urls(), min_delay=0, max_buffered=5)
+        scheduler.acquire()
+        self.assertLessEqual(len(consumed), 6)
+
+    def test_idle_hosts_are_forgotten(self):
+        closed = []
+
+        class FakeSession:
+            def __init__(self, host):
+                self.host = host
+
+            def close(self):
+                closed.append(self.host)
+
+        urls = (f"https://host{i}.com/" for i in range(500))
+        scheduler = analyzer.HostScheduler(urls, min_delay=0, max_buffered=10)
+        while True:
+            item = scheduler.acquire()
+            if item is None:
+                break
+            scheduler._sessions[item[2]] = FakeSession(item[2])
+            scheduler.release(item)
+        self.assertEqual(scheduler.hosts_seen, 500)
+        self.assertLessEqual(len(scheduler._next_start), 2)
+        self.assertLessEqual(len(scheduler._active), 2)
+        self.assertLessEqual(len(scheduler._sessions), 2)
+        self.assertGreaterEqual(len(closed), 498)
+
+    def test_backoff_outlives_an_idle_host(self):
+        # host a.com has nothing queued while paused, and its next URL arrives later
+        scheduler = analyzer.HostScheduler(iter(["https://a.com/1", "https://b.com/1", "https://a.com/2"]),
+                                           min_delay=0, max_retries=0, max_buffered=1)
+        started = time.monotonic()
+        scheduler.release(scheduler.acquire(), retry_after=0.3)
+        scheduler.release(scheduler.acquire())
+        item = scheduler.acquire()
+        self.assertEqual(item[1], "https://a.com/2")
+        self.assertGreaterEqual(time.monotonic() - started, 0.28)
+
+    def test_returning_host_is_counted_once(self):
+        scheduler = analyzer.HostScheduler(iter(["https://a.com/1", "https://b.com/1", "https://a.com/2"]),
+                                           min_delay=0, max_buffered=1)
+        while True:
+            item = scheduler.acquire()
+            if item is None:
+                break
+            scheduler.release(item)
+        self.assertEqual(scheduler.hosts_seen, 2)
+
+class ParseRetryAfterTest(unittest.TestCase):
+
+    def test_seconds_and_dates(self):
+        self.assertEqual(analyzer.parse_retry_after("120"), 120.0)
+        self.assertIsNone(analyzer.parse_retry_after(None))
+        self.assertIsNone(analyzer.parse_retry_after("soon"))
+        self.assertEqual(analyzer.parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT"), 0.0)
+
+if __name__ == "__main__":
+    unittest.main()
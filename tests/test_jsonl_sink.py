@@ -0,0 +1,78 @@
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import selenium_test as analyzer
+
+class JsonlResultSinkTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "results.jsonl")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, results, **kwargs):
+        sink = analyzer.JsonlResultSink(self.path, **kwargs)
+        for result in results:
+            sink.write(result)
+        sink.close()
+
+    def urls(self):
+        return [result["url"] for result in analyzer.read_jsonl_results(self.path)]
+
+    def test_new_run_replaces_previous_output(self):
+        self.write([{"url": "https://a.com"}, {"url": "https://b.com"}])
+        self.write([{"url": "https://a.com"}])
+        self.assertEqual(self.urls(), ["https://a.com"])
+
+    def test_resume_appends_after_existing_results(self):
+        self.write([{"url": "https://a.com"}])
+        self.write([{"url": "https://b.com"}], resume=True)
+        self.assertEqual(self.urls(), ["https://a.com", "https://b.com"])
+
+    def test_resume_starts_after_a_partial_last_line(self):
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"url": "https://a.com"}) + '\n{"url": "https://b.c')
+        self.write([{"url": "https://c.com"}], resume=True)
+        self.assertEqual(self.urls(), ["https://a.com", "https://c.com"])
+
+    def test_resume_after_a_line_cut_inside_a_multibyte_character(self):
+        with open(self.path, "wb") as f:
+            f.write(json.dumps({"url": "https://a.com", "title": "café"}, ensure_ascii=False).encode("utf-8")
+                    + b"\n" + '{"url": "https://b.com", "title": "café'.encode("utf-8")[:-1])
+        self.write([{"url": "https://c.com", "title": "déjà vu"}], resume=True)
+        results = list(analyzer.read_jsonl_results(self.path))
+        self.assertEqual([result["url"] for result in results], ["https://a.com", "https://c.com"])
+        self.assertEqual(results[1]["title"], "déjà vu")
+
+    def test_flush_every(self):
+        sink = analyzer.JsonlResultSink(self.path, flush_every=2)
+        sink.write({"url": "https://a.com"})
+        sink.write({"url": "https://b.com"})
+        self.assertEqual(self.urls(), ["https://a.com", "https://b.com"])
+        sink.close()
+
+class LoadCompletedUrlsTest(unittest.TestCase):
+
+    def test_only_successful_results_count_as_completed(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "results.jsonl")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(json.dumps({"url": "https://ok.com/", "needs_selenium": False}) + "\n")
+                f.write(json.dumps({"url": "https://failed.com/", "error": "timeout"}) + "\n")
+                f.write("{not json\n")
+            with open(path, "ab") as f:
+                f.write('{"url": "https://cut.com/", "title": "é'.encode("utf-8")[:-1])
+            completed = analyzer.load_completed_urls(path)
+            self.assertIn("https://ok.com/", completed)
+            self.assertNotIn("https://failed.com/", completed)
+            self.assertNotIn("https://cut.com/", completed)
+
+if __name__ == "__main__":
+    unittest.main()
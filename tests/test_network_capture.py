@@ -0,0 +1,137 @@
+import json
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import selenium_test as analyzer
+
+def log_entry(method, **params):
+    return {"message": json.dumps({"message": {"method": method, "params": params}})}
+
+def request_events(request_id, url, method="GET", post_data=None, resource_type="XHR", mime_type="application/json",
+                   status=200, started=10.0, finished=10.2, size=500, body_size=2000, failed=None):
+    request = {"url": url, "method": method}
+    if post_data is not None:
+        request["postData"] = post_data
+    events = [log_entry("Network.requestWillBeSent", requestId=request_id, request=request, type=resource_type,
+                        timestamp=started),
+              log_entry("Network.responseReceived", requestId=request_id, type=resource_type,
+                        response={"status": status, "mimeType": mime_type}),
+              log_entry("Network.dataReceived", requestId=request_id, dataLength=body_size)]
+    if failed:
+        events.append(log_entry("Network.loadingFailed", requestId=request_id, errorText=failed))
+    else:
+        events.append(log_entry("Network.loadingFinished", requestId=request_id, encodedDataLength=size,
+                                timestamp=finished))
+    return events
+
+def page_events(url="https://a.com/", started=9.5):
+    return request_events("page", url, resource_type="Document", mime_type="text/html", started=started,
+                          finished=started + 0.3, size=8000, body_size=30000)
+
+GRAPHQL_BODY = json.dumps({"query": "{ items { id title } }", "variables": {}})
+
+# name: (request_events keyword arguments, expected kind, expected replayable)
+CASES = {
+    "get_json_200": (dict(url="https://a.com/api/items"), "json_api", True),
+    "graphql_post_with_body": (dict(url="https://a.com/graphql", method="POST", post_data=GRAPHQL_BODY),
+                               "graphql", True),
+    "graphql_post_without_body": (dict(url="https://a.com/graphql", method="POST"), "graphql", False),
+    "graphql_body_on_a_plain_path": (dict(url="https://a.com/api", method="POST", post_data=GRAPHQL_BODY),
+                                     "graphql", True),
+    "graphql_get_query_string": (dict(url="https://a.com/api?query=%7B%20items%20%7B%20id%20%7D%20%7D"),
+                                 "graphql", True),
+    "json_post": (dict(url="https://a.com/api/items", method="POST", post_data='{"id": 1}'), "json_api", False),
+    "html_fragment": (dict(url="https://a.com/partials/cart", mime_type="text/html"), "html_fragment", False),
+    "json_404": (dict(url="https://a.com/api/items", status=404), "json_api", False),
+    "graphql_500": (dict(url="https://a.com/graphql", method="POST", post_data=GRAPHQL_BODY, status=500),
+                    "graphql", False),
+    "json_failed_after_headers": (dict(url="https://a.com/api/items", failed="net::ERR_ABORTED"), "json_api",
+                                  False),
+    "plain_text": (dict(url="https://a.com/robots.txt", mime_type="text/plain"), "other", False),
+}
+
+class ClassifyApiCallTest(unittest.TestCase):
+
+    def test_mime_types(self):
+        cases = {
+            ("https://a.com/api/items", "application/json"): "json_api",
+            ("https://a.com/api/items", "application/vnd.api+json; charset=utf-8"): "json_api",
+            ("https://a.com/partials/cart", "text/html"): "html_fragment",
+            ("https://a.com/partials/cart", "application/xhtml+xml"): "html_fragment",
+            ("https://a.com/logo.svg", "image/svg+xml"): "other",
+            ("https://a.com/ping", None): "other",
+        }
+        for (url, mime_type), kind in cases.items():
+            self.assertEqual(analyzer.classify_api_call(url, mime_type), kind, (url, mime_type))
+
+    def test_graphql_wins_over_the_mime_type(self):
+        self.assertEqual(analyzer.classify_api_call("https://a.com/GraphQL", "text/html"), "graphql")
+        self.assertEqual(analyzer.classify_api_call("https://a.com/api", "application/json", GRAPHQL_BODY),
+                         "graphql")
+        self.assertEqual(analyzer.classify_api_call("https://a.com/search?query=shoes", "application/json"),
+                         "json_api")
+
+class ClassifyNetworkTrafficTest(unittest.TestCase):
+
+    def test_cases(self):
+        for name, (kwargs, kind, replayable) in CASES.items():
+            with self.subTest(name):
+                traffic = analyzer.classify_network_traffic(page_events() + request_events("1", **kwargs),
+                                                            page_url="https://a.com/")
+                self.assertEqual(len(traffic["api_calls"]), 1)
+                call = traffic["api_calls"][0]
+                self.assertEqual(call["kind"], kind)
+                self.assertEqual(call["replayable"], replayable)
+                self.assertEqual(call["method"], kwargs.get("method", "GET"))
+                self.assertEqual(call["status"], kwargs.get("status", 200))
+                self.assertEqual(traffic["counts"][kind], 1)
+                self.assertEqual(sum(traffic["counts"].values()), 1)
+                self.assertEqual(traffic["replayable_endpoints"], int(replayable))
+
+    def test_only_xhr_and_fetch_are_listed(self):
+        entries = (page_events()
+                   + request_events("1", "https://a.com/app.js", resource_type="Script",
+                                    mime_type="application/javascript")
+                   + request_events("2", "https://a.com/api/items", resource_type="Fetch")
+                   + [log_entry("Network.requestWillBeSent", requestId="3", type="XHR", timestamp=10.0,
+                                request={"url": "https://a.com/api/pending", "method": "GET"})])
+        traffic = analyzer.classify_network_traffic(entries)
+        self.assertEqual([call["url"] for call in traffic["api_calls"]], ["https://a.com/api/items"])
+        self.assertEqual(traffic["transferred_bytes"], 8000 + 500 + 500)
+        self.assertEqual(traffic["api_bytes"], 500)
+
+    def test_timings_are_measured_from_the_navigation_start(self):
+        entries = (page_events(started=9.5)
+                   + request_events("1", "https://a.com/api/items", started=10.0, finished=10.25)
+                   + request_events("2", "https://a.com/api/more", started=10.5, finished=11.0)
+                   + request_events("3", "https://a.com/pixel", mime_type="image/gif", started=12.0, finished=13.0))
+        traffic = analyzer.classify_network_traffic(entries)
+        calls = {call["url"]: call for call in traffic["api_calls"]}
+        self.assertEqual(calls["https://a.com/api/items"]["started_ms"], 500.0)
+        self.assertEqual(calls["https://a.com/api/items"]["duration_ms"], 250.0)
+        # Calls classified as "other" do not extend the dynamic load time
+        self.assertEqual(traffic["dynamic_load_ms"], 1500.0)
+
+    def test_same_origin_and_largest_calls_first(self):
+        entries = (page_events()
+                   + request_events("1", "https://a.com/api/small", body_size=100)
+                   + request_events("2", "https://api.b.com/items", body_size=9000)
+                   + request_events("3", "https://a.com/api/medium", body_size=5000))
+        traffic = analyzer.classify_network_traffic(entries, page_url="https://a.com/shop", max_calls=2)
+        self.assertEqual([(call["url"], call["same_origin"]) for call in traffic["api_calls"]],
+                         [("https://api.b.com/items", False), ("https://a.com/api/medium", True)])
+        self.assertEqual(traffic["counts"]["json_api"], 3)
+        self.assertEqual(traffic["replayable_endpoints"], 3)
+
+    def test_malformed_entries_are_skipped(self):
+        entries = [{"message": "{not json"}, {}, None] + request_events("1", "https://a.com/api/items")
+        traffic = analyzer.classify_network_traffic(entries)
+        self.assertEqual(traffic["counts"]["json_api"], 1)
+        # Without a document request the first request starts the clock
+        self.assertEqual(traffic["api_calls"][0]["started_ms"], 0.0)
+
+if __name__ == "__main__":
+    unittest.main()
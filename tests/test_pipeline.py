@@ -0,0 +1,78 @@
+import os
+import sys
+import threading
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import selenium_test as analyzer
+
+class FakeSession:
+
+    def close(self):
+        pass
+
+def static_stage(url, session=None):
+    result = {"url": url, "needs_selenium": False, "confidence": 80}
+    # Even-numbered pages need the browser
+    return (result, {"indicators": []}) if int(url.rsplit("/", 1)[1]) % 2 == 0 else (result, None)
+
+def browser_stage(result, pending, driver_pool=None):
+    return dict(result, needs_selenium=True, decided_by="browser")
+
+class RunPipelineTest(unittest.TestCase):
+
+    def run_pipeline(self, urls, on_result, **kwargs):
+        outcome = {}
+
+        def target():
+            try:
+                analyzer.run_pipeline(urls, on_result, **kwargs)
+            except Exception as e:
+                outcome["error"] = e
+
+        with mock.patch.object(analyzer, "analyze_static_stage", static_stage), \
+                mock.patch.object(analyzer, "analyze_browser_stage", browser_stage), \
+                mock.patch.object(analyzer, "create_http_session", lambda pool_size: FakeSession()):
+            thread = threading.Thread(target=target, daemon=True)
+            thread.start()
+            thread.join(timeout=10)
+        self.assertFalse(thread.is_alive(), "run_pipeline hung")
+        return outcome.get("error")
+
+    def test_every_url_is_delivered(self):
+        urls = [f"https://a.com/{i}" for i in range(20)]
+        seen = {}
+        lock = threading.Lock()
+
+        def on_result(index, url, result, error):
+            with lock:
+                seen[index] = result["needs_selenium"]
+
+        self.assertIsNone(self.run_pipeline(urls, on_result, http_workers=4, browser_workers=2))
+        self.assertEqual(seen, {i: i % 2 == 0 for i in range(20)})
+
+    def test_failing_callback_in_the_browser_stage_does_not_hang(self):
+        urls = [f"https://a.com/{i * 2}" for i in range(50)]
+
+        def on_result(index, url, result, error):
+            raise RuntimeError("sink is full")
+
+        error = self.run_pipeline(urls, on_result, http_workers=8, browser_workers=2, queue_size=1)
+        self.assertIsInstance(error, RuntimeError)
+
+    def test_failing_callback_in_the_http_stage_stops_the_batch(self):
+        urls = [f"https://a.com/{i * 2 + 1}" for i in range(50)]
+        calls = []
+
+        def on_result(index, url, result, error):
+            calls.append(index)
+            raise ValueError("bad row")
+
+        error = self.run_pipeline(urls, on_result, http_workers=1, browser_workers=1)
+        self.assertIsInstance(error, ValueError)
+        self.assertEqual(len(calls), 1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import selenium_test as analyzer
+
+class ProbeDriver:
+    """Answers the quiescence probe from a scripted list of (inflight, idle_ms) states."""
+
+    def __init__(self, states, cdp=True):
+        self.states = list(states)
+        self.cdp_calls = []
+        self.scripts = []
+        if not cdp:
+            self.execute_cdp_cmd = None
+
+    def execute_cdp_cmd(self, cmd, cmd_args):
+        self.cdp_calls.append((cmd, cmd_args))
+        return {"identifier": "1"}
+
+    def execute_script(self, script, *args):
+        self.scripts.append(script)
+        if script == analyzer.QUIESCENCE_PROBE_SCRIPT:
+            return self.states.pop(0) if len(self.states) > 1 else self.states[0]
+        return None
+
+class InstallQuiescenceMonitorTest(unittest.TestCase):
+
+    def test_registers_monitor_for_new_documents_once(self):
+        driver = ProbeDriver([[0, 5000]])
+        self.assertTrue(analyzer.install_quiescence_monitor(driver))
+        self.assertTrue(analyzer.install_quiescence_monitor(driver))
+        self.assertEqual(driver.cdp_calls, [("Page.addScriptToEvaluateOnNewDocument",
+                                             {"source": analyzer.QUIESCENCE_MONITOR_SCRIPT})])
+
+    def test_driver_without_cdp_falls_back(self):
+        driver = ProbeDriver([[0, 5000]], cdp=False)
+        self.assertFalse(analyzer.install_quiescence_monitor(driver))
+        self.assertFalse(getattr(driver, "_sda_quiescence_monitor", False))
+
+    def test_monitor_script_is_valid_outside_a_function_body(self):
+        # addScriptToEvaluateOnNewDocument runs the source as a script, where return is a syntax error
+        self.assertNotIn("return", analyzer.QUIESCENCE_MONITOR_SCRIPT.split("window.fetch = function")[0])
+
+class WaitForDomQuiescenceTest(unittest.TestCase):
+
+    def test_waits_for_request_in_flight_without_dom_changes(self):
+        # A request started during page load is in flight while the DOM stays idle
+        driver = ProbeDriver([[1, 3000], [1, 3200], [0, 0], [0, 50], [0, 120]])
+        waited, ceiling_hit = analyzer.wait_for_dom_quiescence(driver, quiet_window=0.1, max_wait=5,
+                                                               poll_interval=0.01)
+        self.assertFalse(ceiling_hit)
+        self.assertEqual(driver.states, [[0, 120]])
+
+    def test_ceiling(self):
+        driver = ProbeDriver([[1, 0]])
+        waited, ceiling_hit = analyzer.wait_for_dom_quiescence(driver, quiet_window=0.1, max_wait=0.05,
+                                                               poll_interval=0.01)
+        self.assertTrue(ceiling_hit)
+        self.assertGreaterEqual(waited, 0.05)
+
+if __name__ == "__main__":
+    unittest.main()
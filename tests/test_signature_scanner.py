@@ -0,0 +1,104 @@
+import os
+import random
+import re
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import selenium_test as analyzer
+
+# The per-pattern regexes the scanner replaced (XMLHttpRequest never matched lowercased HTML)
+LEGACY_INDICATORS = {
+    "SPA root element detected": [r'<div[^>]*id=["\']root["\']', r'<div[^>]*id=["\']app["\']',
+                                  r'<div[^>]*id=["\']main["\']',
+                                  r'<div[^>]*class=["\'][^"\']*app[^"\']*["\']'],
+    "Loading indicators found": [r'loading\.\.\.', r'please wait', r'spinner', r'skeleton'],
+    "AJAX/API calls detected": [r'\.fetch\s*\(', r'axios\.', r'jquery.*ajax', r'api/.*endpoint'],
+    "Lazy loading detected": [r'data-src', r'lazy.*load', r'intersection.*observer'],
+    "Virtual/infinite scrolling detected": [r'virtual.*scroll', r'infinite.*scroll']
+}
+
+LEGACY_FRAMEWORKS = {
+    'React': [r'react', r'reactdom', r'jsx', r'data-reactroot'],
+    'Angular': [r'angular', r'@angular', r'ng-app', r'app-root'],
+    'Vue': [r'vue\.js', r'vuejs', r'v-if', r'v-for'],
+    'jQuery': [r'jquery', r'\$\('],
+    'Next.js': [r'next\.js', r'_next'],
+    'Nuxt': [r'nuxt', r'__nuxt'],
+    'Svelte': [r'svelte'],
+    'Ember': [r'ember']
+}
+
+TOKENS = ['<div', '<div ', '>', '"', "'", 'class=', 'id=', 'root', 'app', 'main', 'wrapper', ' ', '\n',
+          'lazy', 'load', 'api/', 'endpoint', 'jquery', 'ajax', '.fetch', '(', ' (', 'axios.',
+          'intersection', 'observer', 'virtual', 'infinite', 'scroll', 'data-src', 'spinner', 'x',
+          '<span', 'react', 'vue.js', '$(', '_next', 'nuxt', 'ember', 'app-root', 'loading...', 'LAZY']
+
+def legacy_labels(patterns, html):
+    html_lower = html.lower()
+    return {label for label, regexes in patterns.items()
+            if any(re.search(regex, html_lower) for regex in regexes)}
+
+class SignatureScannerParityTest(unittest.TestCase):
+
+    def assert_parity(self, html):
+        scan = analyzer.scan_page_signatures(html)
+        self.assertEqual(set(scan["indicators"]), legacy_labels(LEGACY_INDICATORS, html), repr(html))
+        self.assertEqual(set(scan["frameworks"]), legacy_labels(LEGACY_FRAMEWORKS, html), repr(html))
+        self.assertEqual(set(analyzer.analyze_html_indicators(html)), set(scan["indicators"]))
+
+    def test_known_pages(self):
+        pages = [
+            '<div id="root"></div>',
+            "<div class='main-app shell'>",
+            '<div data-x="1" id=\'app"></div>',
+            '<span class="app">x</span>',
+            '<div class="x">app"',
+            '<div title=">" class="app">',
+            "lazy\nload",
+            "lazy img load",
+            "load then lazy",
+            "window.fetch ('/x')",
+            "window.fetch",
+            "api/v1 endpoint",
+            "<script>jQuery.ajax({})</script>",
+            "infinite\nscroll virtual",
+            "",
+        ]
+        for html in pages:
+            self.assert_parity(html)
+
+    def test_randomized_parity(self):
+        rng = random.Random(20240501)
+        for _ in range(3000):
+            self.assert_parity("".join(rng.choice(TOKENS) for _ in range(rng.randint(1, 40))))
+
+    def test_first_hit_offsets(self):
+        html = '<p>x</p><div class="row"></div><div id="root"></div>'
+        scan = analyzer.scan_page_signatures(html)
+        self.assertEqual(scan["indicators"]["SPA root element detected"], html.index('<div id="root"'))
+
+class SignatureScannerScalingTest(unittest.TestCase):
+
+    def assert_fast(self, html, seconds=2.0):
+        started = time.perf_counter()
+        analyzer.scan_page_signatures(html)
+        self.assertLess(time.perf_counter() - started, seconds)
+
+    def test_repeated_common_anchor(self):
+        self.assert_fast("app " * 500_000)
+
+    def test_anchor_on_every_line(self):
+        self.assert_fast("<li>lazy item</li>\n" * 150_000)
+
+    def test_unclosed_div_tags(self):
+        self.assert_fast("<div " * 400_000)
+
+    def test_long_line_that_made_the_regexes_backtrack(self):
+        # lazy.*load took ~16 s on 200 KB of this with the old patterns
+        self.assert_fast("lazy " * 200_000)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import selenium_test as analyzer
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+class UrlDeadlineTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch.object(analyzer.time, "monotonic", self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_shares_cover_the_budget(self):
+        self.assertAlmostEqual(sum(analyzer.TIME_BUDGET_SHARES.values()), 1.0)
+
+    def test_stages_that_use_their_share_add_up_to_the_budget(self):
+        deadline = analyzer.UrlDeadline(10)
+        allotted = {}
+        for stage, share in analyzer.TIME_BUDGET_SHARES.items():
+            allotted[stage] = deadline.allot(stage)
+            self.assertAlmostEqual(allotted[stage], 10 * share)
+            self.clock.advance(allotted[stage])
+        self.assertAlmostEqual(sum(allotted.values()), 10)
+        self.assertTrue(deadline.expired())
+
+    def test_time_left_by_an_early_stage_goes_to_the_next(self):
+        deadline = analyzer.UrlDeadline(10)
+        self.assertAlmostEqual(deadline.allot("http_fetch"), 2.5)
+        self.clock.advance(0.5)
+        shares = analyzer.TIME_BUDGET_SHARES
+        later = 1 - shares["http_fetch"]
+        self.assertAlmostEqual(deadline.allot("page_load"), 9.5 * shares["page_load"] / later)
+        self.assertGreater(deadline.allot("page_load"), 10 * shares["page_load"])
+
+    def test_overrunning_stage_shrinks_the_rest(self):
+        deadline = analyzer.UrlDeadline(10)
+        self.clock.advance(6)
+        self.assertAlmostEqual(deadline.allot("page_load"), 4 * 0.35 / 0.75)
+
+    def test_default_caps_the_allotment(self):
+        deadline = analyzer.UrlDeadline(100)
+        self.assertEqual(deadline.allot("http_fetch", 15), 15)
+        # The last stage may use whatever is left
+        self.assertAlmostEqual(deadline.allot("processing"), 100)
+        self.assertAlmostEqual(deadline.allot("ready_state", 30), 25)
+
+    def test_paused_time_is_not_charged(self):
+        deadline = analyzer.UrlDeadline(10)
+        self.clock.advance(2)
+        deadline.pause()
+        self.clock.advance(30)
+        self.assertAlmostEqual(deadline.remaining(), 8)
+        deadline.resume()
+        self.clock.advance(1)
+        self.assertAlmostEqual(deadline.remaining(), 7)
+        self.assertAlmostEqual(deadline.elapsed(), 3)
+
+    def test_exhausted_budget_raises(self):
+        deadline = analyzer.UrlDeadline(1)
+        self.clock.advance(1.5)
+        with self.assertRaises(analyzer.UrlTimeout) as raised:
+            deadline.allot("dynamic_wait")
+        self.assertEqual(raised.exception.stage, "dynamic_wait")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,119 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import selenium_test as analyzer
+
+class InferPathTemplateTest(unittest.TestCase):
+
+    def test_placeholders(self):
+        cases = {
+            "https://shop.com/product/12345": "shop.com/product/<id>",
+            "https://site.com/news/2024/big-launch-event-today": "site.com/news/<id>/<slug>",
+            "https://cdn.com/f/3f2b8c1d9e7a": "cdn.com/f/<hash>",
+            "https://cdn.com/f/123e4567-e89b-12d3-a456-426614174000": "cdn.com/f/<hash>",
+            "https://x.com/u/user42abc": "x.com/u/<token>",
+            "https://shop.com/product/12345.html": "shop.com/product/<id>.html",
+            "https://shop.com/about": "shop.com/about",
+        }
+        for url, template in cases.items():
+            self.assertEqual(analyzer.infer_path_template(url), template, url)
+
+    def test_query_keys_are_kept_and_values_dropped(self):
+        self.assertEqual(analyzer.infer_path_template("https://shop.com/search?q=shoes&page=2"),
+                         analyzer.infer_path_template("https://shop.com/search?page=9&q=hats"))
+        self.assertNotEqual(analyzer.infer_path_template("https://shop.com/search?q=shoes"),
+                            analyzer.infer_path_template("https://shop.com/search?sort=price"))
+
+    def test_hosts_are_not_merged(self):
+        self.assertNotEqual(analyzer.infer_path_template("https://a.com/p/1"),
+                            analyzer.infer_path_template("https://b.com/p/1"))
+
+class ClusterUrlsTest(unittest.TestCase):
+
+    def test_groups_keep_input_order(self):
+        urls = ["https://a.com/p/1", "https://a.com/about", "https://a.com/p/2"]
+        clusters = analyzer.cluster_urls(urls)
+        self.assertEqual(clusters["a.com/p/<id>"], [(0, urls[0]), (2, urls[2])])
+        self.assertEqual(clusters["a.com/about"], [(1, urls[1])])
+
+class PropagateVerdictTest(unittest.TestCase):
+
+    def test_takes_the_most_cautious_confidence_and_shared_frameworks(self):
+        samples = [{"url": "https://a.com/p/1", "needs_selenium": True, "confidence": 90,
+                    "frameworks_detected": ["React", "jQuery"]},
+                   {"url": "https://a.com/p/2", "needs_selenium": True, "confidence": 70,
+                    "frameworks_detected": ["React"]}]
+        result = analyzer.propagate_verdict("https://a.com/p/3", "a.com/p/<id>", samples, 10)
+        self.assertTrue(result["needs_selenium"])
+        self.assertEqual(result["confidence"], 70)
+        self.assertEqual(result["frameworks_detected"], ["React"])
+        self.assertTrue(result["propagated"])
+        self.assertEqual(result["cluster"], {"template": "a.com/p/<id>", "size": 10,
+                                             "samples": ["https://a.com/p/1", "https://a.com/p/2"]})
+
+class RunClusteredTest(unittest.TestCase):
+
+    def run_clustered(self, urls, verdict, sample_size=3):
+        analyzed = []
+        recorded = {}
+
+        def run_batch(batch, on_result):
+            for position, url in enumerate(batch):
+                analyzed.append(url)
+                outcome = verdict(url)
+                if isinstance(outcome, Exception):
+                    on_result(position, url, None, outcome)
+                elif isinstance(outcome, dict):
+                    on_result(position, url, dict(outcome, url=url), None)
+                else:
+                    on_result(position, url, {"url": url, "needs_selenium": outcome, "confidence": 80}, None)
+
+        def on_result(index, url, result, error):
+            if error is not None:
+                result = {"url": url, "needs_selenium": True, "confidence": 0, "error": str(error)}
+            recorded[index] = result
+            return result
+
+        stats = analyzer.run_clustered(urls, run_batch, on_result, sample_size=sample_size)
+        return stats, analyzed, recorded
+
+    def test_agreeing_samples_are_propagated(self):
+        urls = [f"https://a.com/p/{i}" for i in range(10)] + ["https://a.com/about"]
+        stats, analyzed, recorded = self.run_clustered(urls, lambda url: True)
+        self.assertEqual(stats, {"clusters": 2, "propagated": 7, "escalated": 0})
+        self.assertEqual(len(analyzed), 4)
+        self.assertEqual(sorted(recorded), list(range(11)))
+        propagated = [result for result in recorded.values() if result.get("propagated")]
+        self.assertEqual(len(propagated), 7)
+        self.assertTrue(all(result["url"] not in analyzed for result in propagated))
+
+    def test_disagreeing_samples_escalate_the_cluster(self):
+        urls = [f"https://a.com/p/{i}" for i in range(6)]
+        stats, analyzed, recorded = self.run_clustered(urls, lambda url: url.endswith("/0"))
+        self.assertEqual(stats["escalated"], 3)
+        self.assertEqual(sorted(analyzed), sorted(urls))
+        self.assertFalse(any(result.get("propagated") for result in recorded.values()))
+
+    def test_failed_sample_escalates_the_cluster(self):
+        urls = [f"https://a.com/p/{i}" for i in range(6)]
+        stats, analyzed, recorded = self.run_clustered(
+            urls, lambda url: RuntimeError("boom") if url.endswith("/0") else False)
+        self.assertEqual(stats["propagated"], 0)
+        self.assertEqual(len(analyzed), 6)
+        self.assertEqual(sorted(recorded), list(range(6)))
+
+    def test_timed_out_sample_escalates_the_cluster(self):
+        urls = [f"https://a.com/p/{i}" for i in range(6)]
+        partial = {"needs_selenium": False, "confidence": 60, "decided_by": "timeout", "timed_out": True,
+                   "partial": True}
+        stats, analyzed, recorded = self.run_clustered(
+            urls, lambda url: partial if url.endswith("/0") else False)
+        self.assertEqual(stats["propagated"], 0)
+        self.assertEqual(stats["escalated"], 3)
+        self.assertEqual(sorted(analyzed), sorted(urls))
+
+if __name__ == "__main__":
+    unittest.main()
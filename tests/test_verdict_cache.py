@@ -0,0 +1,143 @@
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import selenium_test as analyzer
+
+def make_result(url, decided_by="browser", **extra):
+    result = {"url": url, "needs_selenium": True, "confidence": 80, "decided_by": decided_by,
+              "content_hash": "h-" + url}
+    result.update(extra)
+    return result
+
+class VerdictCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "verdicts.db")
+        self.caches = []
+
+    def tearDown(self):
+        for cache in self.caches:
+            try:
+                cache.close()
+            except Exception:
+                pass
+        self.tmp.cleanup()
+
+    def open_cache(self, **kwargs):
+        cache = analyzer.VerdictCache(self.path, **kwargs)
+        self.caches.append(cache)
+        return cache
+
+class ExpiryAndEvictionTest(VerdictCacheTestCase):
+
+    def test_fresh_hit_and_normalized_key(self):
+        cache = self.open_cache()
+        cache.put("https://EXAMPLE.com/a", make_result("https://example.com/a"), "h1")
+        hit = cache.get("https://example.com/a")
+        self.assertEqual(hit["cache"], "url")
+        self.assertEqual(cache.get_by_content_hash("h1")["cache"], "content")
+        self.assertEqual(cache.stats()["url_hits"], 1)
+
+    def test_expired_entries_miss_but_stay_available_for_revalidation(self):
+        cache = self.open_cache(ttl=-1)
+        cache.put("https://example.com/a", make_result("https://example.com/a"), "h1")
+        self.assertIsNone(cache.get("https://example.com/a"))
+        self.assertIsNone(cache.get_by_content_hash("h1"))
+        entry = cache.lookup("https://example.com/a")
+        self.assertFalse(entry["fresh"])
+        self.assertEqual(entry["content_hash"], "h1")
+        self.assertEqual(cache.purge_expired(), 1)
+        self.assertIsNone(cache.lookup("https://example.com/a"))
+
+    def test_revalidated_restarts_ttl(self):
+        cache = self.open_cache(ttl=3600)
+        result = make_result("https://example.com/a", http_validators={"etag": '"v1"', "last_modified": None})
+        revalidated = cache.revalidated("https://example.com/a", result)
+        self.assertEqual(revalidated["cache"], "revalidated")
+        self.assertEqual(cache.lookup("https://example.com/a")["etag"], '"v1"')
+        self.assertTrue(cache.lookup("https://example.com/a")["fresh"])
+        self.assertEqual(cache.stats()["revalidated"], 1)
+
+    def test_least_recently_used_entries_are_evicted(self):
+        cache = self.open_cache(max_entries=2)
+        for name in ("a", "b", "c"):
+            cache.put(f"https://example.com/{name}", make_result(f"https://example.com/{name}"))
+        cache.get("https://example.com/a")
+        cache.close()
+        cache = self.open_cache(max_entries=2)
+        self.assertIsNotNone(cache.lookup("https://example.com/a"))
+        self.assertIsNone(cache.lookup("https://example.com/b"))
+        self.assertIsNotNone(cache.lookup("https://example.com/c"))
+
+    def test_error_and_partial_results_are_not_stored(self):
+        cache = self.open_cache()
+        cache.put("https://example.com/e", make_result("https://example.com/e", error="boom"))
+        cache.put("https://example.com/t", make_result("https://example.com/t", decided_by="timeout",
+                                                       timed_out=True))
+        self.assertEqual(cache.stats()["entries"], 0)
+
+class AnalysisModeTest(VerdictCacheTestCase):
+
+    def test_analysis_mode(self):
+        self.assertEqual(analyzer.analysis_mode({"decided_by": "browser"}), "full")
+        self.assertEqual(analyzer.analysis_mode({}), "full")
+        self.assertEqual(analyzer.analysis_mode({"decided_by": "browser", "skipped_stages": ["text_similarity"]}),
+                         "early_exit")
+        self.assertEqual(analyzer.analysis_mode({"decided_by": "static"}), "static")
+        self.assertEqual(analyzer.analysis_mode({"decided_by": "classifier"}), "classifier")
+        self.assertEqual(analyzer.analysis_mode({"decided_by": "timeout", "timed_out": True}), "partial")
+
+    def test_full_run_does_not_reuse_cheaper_verdicts(self):
+        cache = self.open_cache()
+        cache.put("https://example.com/s", make_result("https://example.com/s", "static"), "hs")
+        cache.put("https://example.com/c", make_result("https://example.com/c", "classifier"), "hc")
+        full = analyzer.accepted_analysis_modes()
+        self.assertIsNone(cache.get("https://example.com/s", full))
+        self.assertIsNone(cache.get_by_content_hash("hc", full))
+        self.assertIsNone(cache.lookup("https://example.com/s", full))
+        self.assertEqual(cache.stats()["mode_misses"], 1)
+
+        tiered = analyzer.accepted_analysis_modes(tiered=True)
+        self.assertEqual(cache.get("https://example.com/s", tiered)["decided_by"], "static")
+        self.assertIsNone(cache.get("https://example.com/c", tiered))
+        with_classifier = analyzer.accepted_analysis_modes(classifier=object())
+        self.assertEqual(cache.get("https://example.com/c", with_classifier)["decided_by"], "classifier")
+
+    def test_cheaper_runs_reuse_full_verdicts(self):
+        cache = self.open_cache()
+        cache.put("https://example.com/f", make_result("https://example.com/f"))
+        for modes in (analyzer.accepted_analysis_modes(tiered=True),
+                      analyzer.accepted_analysis_modes(early_exit=True),
+                      analyzer.accepted_analysis_modes(classifier=object())):
+            self.assertIsNotNone(cache.get("https://example.com/f", modes))
+
+    def test_content_hash_skips_cheaper_entry_for_an_accepted_one(self):
+        cache = self.open_cache()
+        cache.put("https://example.com/full", make_result("https://example.com/full"), "same")
+        cache.put("https://example.com/static", make_result("https://example.com/static", "static"), "same")
+        hit = cache.get_by_content_hash("same", analyzer.accepted_analysis_modes())
+        self.assertEqual(hit["url"], "https://example.com/full")
+
+    def test_rows_from_before_the_mode_column_use_the_stored_result(self):
+        conn = sqlite3.connect(self.path)
+        conn.execute("CREATE TABLE verdicts (url_key TEXT PRIMARY KEY, content_hash TEXT, result TEXT NOT NULL, "
+                     "created_at REAL NOT NULL, accessed_at REAL NOT NULL)")
+        conn.execute("INSERT INTO verdicts VALUES (?, ?, ?, strftime('%s', 'now'), strftime('%s', 'now'))",
+                      (analyzer.normalize_url("https://example.com/old"), "h",
+                       json.dumps(make_result("https://example.com/old", "static"))))
+        conn.commit()
+        conn.close()
+
+        cache = self.open_cache()
+        self.assertIsNone(cache.get("https://example.com/old", analyzer.accepted_analysis_modes()))
+        self.assertIsNotNone(cache.get("https://example.com/old", analyzer.accepted_analysis_modes(tiered=True)))
+
+if __name__ == "__main__":
+    unittest.main()
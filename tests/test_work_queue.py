@@ -0,0 +1,169 @@
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import selenium_test as analyzer
+
+class WorkQueueTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "queue.db")
+        self.queues = []
+
+    def tearDown(self):
+        for work_queue in self.queues:
+            try:
+                work_queue.close()
+            except Exception:
+                pass
+        self.tmp.cleanup()
+
+    def open_queue(self, **kwargs):
+        work_queue = analyzer.SqliteWorkQueue(self.path, **kwargs)
+        self.queues.append(work_queue)
+        return work_queue
+
+class SqliteWorkQueueTest(WorkQueueTestCase):
+
+    def test_enqueue_skips_known_urls(self):
+        work_queue = self.open_queue()
+        self.assertEqual(work_queue.enqueue(["https://a.com/1", "https://a.com/2"]), 2)
+        self.assertEqual(work_queue.enqueue(["https://A.com/1", "https://a.com/3"]), 1)
+        self.assertEqual(work_queue.stats()["pending"], 3)
+
+    def test_leases_are_exclusive(self):
+        work_queue = self.open_queue()
+        work_queue.enqueue(["https://a.com/1", "https://a.com/2", "https://a.com/3"])
+        first = work_queue.lease("w1", limit=2)
+        second = work_queue.lease("w2", limit=2)
+        self.assertEqual([url for _, url in first], ["https://a.com/1", "https://a.com/2"])
+        self.assertEqual([url for _, url in second], ["https://a.com/3"])
+        self.assertEqual(work_queue.lease("w3"), [])
+        self.assertEqual(work_queue.unfinished(), 3)
+
+    def test_heartbeat_keeps_the_lease(self):
+        work_queue = self.open_queue(lease_seconds=0.2)
+        work_queue.enqueue(["https://a.com/1"])
+        task_id, _ = work_queue.lease("w1")[0]
+        time.sleep(0.12)
+        self.assertEqual(work_queue.heartbeat("w1", [task_id]), 1)
+        self.assertEqual(work_queue.heartbeat("w2", [task_id]), 0)
+        time.sleep(0.12)
+        self.assertEqual(work_queue.lease("w2"), [])
+
+    def test_expired_lease_is_handed_to_another_worker(self):
+        work_queue = self.open_queue(lease_seconds=0.05)
+        work_queue.enqueue(["https://a.com/1"])
+        task_id, _ = work_queue.lease("w1")[0]
+        time.sleep(0.1)
+        self.assertEqual(work_queue.stats()["expired_leases"], 1)
+        self.assertEqual(work_queue.requeue_expired(), 1)
+        self.assertEqual(work_queue.lease("w2"), [(task_id, "https://a.com/1")])
+        # The first worker lost the lease but its late result still completes the task
+        self.assertIsNone(work_queue.fail(task_id, "w1", "late"))
+        self.assertTrue(work_queue.complete(task_id, "w1"))
+        self.assertFalse(work_queue.complete(task_id, "w2"))
+        self.assertEqual(work_queue.unfinished(), 0)
+
+    def test_errors_are_retried_until_max_attempts(self):
+        work_queue = self.open_queue(max_attempts=2)
+        work_queue.enqueue(["https://a.com/1"])
+        task_id, _ = work_queue.lease("w1")[0]
+        self.assertEqual(work_queue.fail(task_id, "w1", "boom"), "pending")
+        work_queue.lease("w1")
+        self.assertEqual(work_queue.fail(task_id, "w1", "boom"), "failed")
+        self.assertEqual(work_queue.failed_tasks(), [(task_id, "https://a.com/1", "boom")])
+
+    def test_lease_expiring_on_every_attempt_fails_the_task(self):
+        work_queue = self.open_queue(lease_seconds=0.05, max_attempts=2)
+        work_queue.enqueue(["https://a.com/1"])
+        for _ in range(2):
+            self.assertEqual(len(work_queue.lease("w1")), 1)
+            time.sleep(0.1)
+        self.assertEqual(work_queue.requeue_expired(), 0)
+        self.assertEqual(work_queue.lease("w2"), [])
+        self.assertEqual(work_queue.stats()["failed"], 1)
+        self.assertEqual(work_queue.unfinished(), 0)
+
+    def test_failed_fail_leaves_no_open_transaction(self):
+        work_queue = self.open_queue()
+        work_queue.enqueue(["https://a.com/1", "https://a.com/2"])
+        task_id, _ = work_queue.lease("w1")[0]
+        conn = sqlite3.connect(self.path)
+        conn.execute("CREATE TRIGGER reject BEFORE UPDATE ON tasks WHEN NEW.error = 'reject' "
+                     "BEGIN SELECT RAISE(ABORT, 'rejected'); END")
+        conn.commit()
+        conn.close()
+        with self.assertRaises(sqlite3.DatabaseError):
+            work_queue.fail(task_id, "w1", "reject")
+        # Without a rollback the next BEGIN fails inside the still-open transaction
+        self.assertEqual(work_queue.fail(task_id, "w1", "boom"), "pending")
+        self.assertEqual(len(work_queue.lease("w1", limit=2)), 2)
+
+class MergeShardsTest(WorkQueueTestCase):
+
+    def write_shard(self, worker, results):
+        with open(os.path.join(self.tmp.name, f"shard-{worker}.jsonl"), "w", encoding="utf-8") as f:
+            for result in results:
+                f.write(json.dumps(result, ensure_ascii=False) + "\n")
+
+    def test_newest_successful_result_wins(self):
+        self.write_shard("w1", [{"url": "https://a.com/1", "needs_selenium": True, "task_id": 1,
+                                 "processed_at": "2024-01-01T00:00:02"}])
+        self.write_shard("w2", [{"url": "https://a.com/1", "needs_selenium": False, "task_id": 1,
+                                 "processed_at": "2024-01-01T00:00:01"},
+                                {"url": "https://a.com/1", "error": "boom", "task_id": 1,
+                                 "processed_at": "2024-01-01T00:00:03"}])
+        results = analyzer.merge_shards(self.tmp.name)
+        self.assertEqual(len(results), 1)
+        self.assertTrue(results[0]["needs_selenium"])
+        self.assertEqual(results[0]["batch_index"], 1)
+
+    def test_shard_cut_inside_a_multibyte_character(self):
+        # A worker killed mid-write leaves half of a non-ASCII character at the end of its shard
+        self.write_shard("w1", [{"url": "https://a.com/1", "title": "Crème", "needs_selenium": False,
+                                 "task_id": 1}])
+        with open(os.path.join(self.tmp.name, "shard-w1.jsonl"), "ab") as f:
+            f.write('{"url": "https://a.com/2", "title": "Crè'.encode("utf-8")[:-1])
+        self.write_shard("w2", [{"url": "https://a.com/2", "needs_selenium": True, "task_id": 2}])
+        results = analyzer.merge_shards(self.tmp.name)
+        self.assertEqual([result["url"] for result in results], ["https://a.com/1", "https://a.com/2"])
+        self.assertEqual(results[0]["title"], "Crème")
+
+    def test_failed_tasks_without_a_row_are_reported(self):
+        work_queue = self.open_queue(lease_seconds=0.05, max_attempts=1)
+        work_queue.enqueue(["https://a.com/1", "https://a.com/2"])
+        (done_id, _), (lost_id, _) = work_queue.lease("w1", limit=2)
+        work_queue.complete(done_id, "w1")
+        time.sleep(0.1)
+        work_queue.lease("w2")
+        work_queue.close()
+        self.write_shard("w1", [{"url": "https://a.com/1", "needs_selenium": False, "task_id": done_id}])
+
+        self.assertEqual(len(analyzer.merge_shards(self.tmp.name)), 1)
+        results = analyzer.merge_shards(self.tmp.name, queue_path=self.path)
+        self.assertEqual([result["url"] for result in results], ["https://a.com/1", "https://a.com/2"])
+        self.assertEqual(results[1]["task_id"], lost_id)
+        self.assertEqual(results[1]["error"], "Lease expired on every attempt")
+        self.assertEqual([result["batch_index"] for result in results], [1, 2])
+
+    def test_failed_task_with_a_row_is_not_duplicated(self):
+        work_queue = self.open_queue(max_attempts=1)
+        work_queue.enqueue(["https://a.com/1"])
+        task_id, _ = work_queue.lease("w1")[0]
+        work_queue.fail(task_id, "w1", "boom")
+        work_queue.close()
+        self.write_shard("w1", [{"url": "https://a.com/1", "needs_selenium": True, "error": "boom",
+                                 "task_id": task_id}])
+        results = analyzer.merge_shards(self.tmp.name, queue_path=self.path)
+        self.assertEqual(len(results), 1)
+
+if __name__ == "__main__":
+    unittest.main()